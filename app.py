@@ -1,29 +1,43 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
+from flask import Flask, Blueprint, current_app, render_template, request, jsonify, redirect, url_for, flash
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta, date, timezone
-from race_engine_bridge import RaceEngineBridge
+from datetime import datetime, timedelta, timezone
 import json
 import random
-import math
-from apscheduler.schedulers.background import BackgroundScheduler
-import pytz
+import os
+import socket
+import threading
+import time
+import atexit
+import heapq
+from dataclasses import asdict, replace
+from itertools import groupby
+from operator import attrgetter
+from sqlalchemy import bindparam
+from sqlalchemy.exc import IntegrityError
 from config import Config
 
-app = Flask(__name__, 
-    static_folder='static',
-    template_folder='templates'
+from models import (
+    db, User, Driver, Mechanic, Engineer, CarComponent, Upgrade, Training, Race,
+    QualifyingSession, RaceResult, LiveEvent, TyreType, RaceStrategy,
+    StrategySegment, WeatherForecast, WeatherChange, ChampionshipStandings, Test, QualifyingStage,
+    TeamStanding, RaceSettlement, CacheGeneration, SchedulerLease, upsert_insert
 )
-app.config.from_object(Config)
-db = SQLAlchemy(app)
+from finance import FinanceSystem, PayrollSystem, finance_bp
+from sim import (
+    CarInput, ComponentInput, ComponentTimeModel, QualifyingEntry, QualifyingSimulation, RaceInput,
+    StrategyInput, StrategySegmentInput, WeatherPoint, WeatherTimeModel,
+    partition_grid, simulate_divisions
+)
+
+# Rutas generales; las de finanzas son el blueprint de finance.py
+main_bp = Blueprint('main', __name__)
 
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'main.login'
 
 # CONTEXT PROCESSOR PARA INYECTAR 'now' EN TODAS LAS PLANTILLAS
-@app.context_processor
+@main_bp.app_context_processor
 def utility_processor():
     def get_tyre_badge_color(tyre_type):
         colors = {
@@ -45,359 +59,6 @@ def utility_processor():
         'get_tyre_display_name': get_tyre_display_name
     }
     
-def format_lap_time(seconds):
-    """Convierte segundos a formato minutos:segundos.milisegundos"""
-    if not seconds or seconds <= 0:
-        return "0:00.000"
-    
-    minutes = int(seconds // 60)
-    remaining_seconds = seconds % 60
-    return f"{minutes}:{remaining_seconds:06.3f}"
-
-# Modelos de la base de datos
-class User(UserMixin, db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(120), nullable=False)
-    team_name = db.Column(db.String(100), nullable=False)
-    money = db.Column(db.Float, default=Config.STARTING_MONEY)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    drivers = db.relationship('Driver', backref='team', lazy=True)
-    mechanics = db.relationship('Mechanic', backref='team', lazy=True)
-    engineers = db.relationship('Engineer', backref='team', lazy=True)
-    car_components = db.relationship('CarComponent', backref='team', lazy=True)
-    test_sessions = db.relationship('TestSession', backref='team', lazy=True)
-    race_strategies = db.relationship('RaceStrategy', backref='team', lazy=True)
-
-class Driver(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    date_of_birth = db.Column(db.Date, nullable=False)
-    age = db.Column(db.Integer, nullable=False)
-    salary = db.Column(db.Float, nullable=False)
-    skill = db.Column(db.Integer, default=50)
-    experience = db.Column(db.Integer, default=50)
-    aggression = db.Column(db.Integer, default=50)
-    consistency = db.Column(db.Integer, default=50)
-    growth_potential = db.Column(db.Integer, default=50)
-    team_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    market_available = db.Column(db.Boolean, default=True)
-    last_trained = db.Column(db.Date)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    @property
-    def is_retired(self):
-        """Verifica si el piloto debe jubilarse (más de 40 años)"""
-        today = date.today()
-        age = today.year - self.date_of_birth.year - (
-            (today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day)
-        )
-        return age >= 40
-
-class Mechanic(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    date_of_birth = db.Column(db.Date, nullable=False)
-    age = db.Column(db.Integer, nullable=False)
-    salary = db.Column(db.Float, nullable=False)
-    pit_stop_skill = db.Column(db.Integer, default=50)
-    reliability_skill = db.Column(db.Integer, default=50)
-    growth_potential = db.Column(db.Integer, default=50)
-    team_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    market_available = db.Column(db.Boolean, default=True)
-    last_trained = db.Column(db.Date)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    @property
-    def is_retired(self):
-        """Verifica si el mecánico debe jubilarse (más de 65 años)"""
-        today = date.today()
-        age = today.year - self.date_of_birth.year - (
-            (today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day)
-        )
-        return age >= 65
-
-class Engineer(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    date_of_birth = db.Column(db.Date, nullable=False)
-    age = db.Column(db.Integer, nullable=False)
-    salary = db.Column(db.Float, nullable=False)
-    innovation = db.Column(db.Integer, default=50)
-    development_speed = db.Column(db.Integer, default=50)
-    growth_potential = db.Column(db.Integer, default=50)
-    team_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    market_available = db.Column(db.Boolean, default=True)
-    last_trained = db.Column(db.Date)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    @property
-    def is_retired(self):
-        """Verifica si el ingeniero debe jubilarse (más de 70 años)"""
-        today = date.today()
-        age = today.year - self.date_of_birth.year - (
-            (today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day)
-        )
-        return age >= 70
-
-class CarComponent(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    component_type = db.Column(db.String(20), nullable=False)
-    strength = db.Column(db.Integer, default=50)
-    reliability = db.Column(db.Integer, default=50)
-    upgrade_progress = db.Column(db.Integer, default=0)
-    upgrade_ends_at = db.Column(db.DateTime)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-class Upgrade(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    component_type = db.Column(db.String(20), nullable=False)
-    level = db.Column(db.Integer, nullable=False)  # 1, 2, 3
-    weeks = db.Column(db.Integer, nullable=False)  # 1, 2, 3
-    total_cost = db.Column(db.Float, nullable=False)
-    start_date = db.Column(db.DateTime, nullable=False)
-    end_date = db.Column(db.DateTime, nullable=False)
-    completed = db.Column(db.Boolean, default=False)
-    
-    @property
-    def progress(self):
-        if self.completed:
-            return 100
-            
-        total_seconds = (self.end_date - self.start_date).total_seconds()
-        elapsed_seconds = (datetime.utcnow() - self.start_date).total_seconds()
-        
-        if total_seconds <= 0:
-            return 100
-            
-        progress = min(100, (elapsed_seconds / total_seconds) * 100)
-        return progress
-    
-    @property
-    def remaining_days(self):
-        if self.completed:
-            return 0
-            
-        remaining_seconds = (self.end_date - datetime.utcnow()).total_seconds()
-        remaining_days = max(0, remaining_seconds / (24 * 3600))
-        return int(remaining_days) + 1  # +1 para redondear hacia arriba
-        
-class Training(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    staff_type = db.Column(db.String(20), nullable=False)  # driver, mechanic, engineer
-    staff_id = db.Column(db.Integer, nullable=False)  # ID del piloto/mecánico/ingeniero
-    attribute = db.Column(db.String(30), nullable=False)  # atributo a mejorar
-    level = db.Column(db.Integer, nullable=False)  # 1, 2, 3
-    weeks = db.Column(db.Integer, nullable=False)  # 1, 2, 3
-    total_cost = db.Column(db.Float, nullable=False)
-    start_date = db.Column(db.DateTime, nullable=False)
-    end_date = db.Column(db.DateTime, nullable=False)
-    completed = db.Column(db.Boolean, default=False)
-    
-    @property
-    def progress(self):
-        if self.completed:
-            return 100
-            
-        total_seconds = (self.end_date - self.start_date).total_seconds()
-        elapsed_seconds = (datetime.utcnow() - self.start_date).total_seconds()
-        
-        if total_seconds <= 0:
-            return 100
-            
-        progress = min(100, (elapsed_seconds / total_seconds) * 100)
-        return progress
-    
-    @property
-    def remaining_days(self):
-        if self.completed:
-            return 0
-            
-        remaining_seconds = (self.end_date - datetime.utcnow()).total_seconds()
-        remaining_days = max(0, remaining_seconds / (24 * 3600))
-        return int(remaining_days) + 1  # +1 para redondear hacia arriba
-
-class Circuit(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    country = db.Column(db.String(50), nullable=False)
-    timezone = db.Column(db.String(50), nullable=False)
-    laps = db.Column(db.Integer, nullable=False)
-
-class Race(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    circuit_id = db.Column(db.Integer, db.ForeignKey('circuit.id'), nullable=False)
-    round_number = db.Column(db.Integer, nullable=False)
-    season_year = db.Column(db.Integer, nullable=False)
-    test_session = db.Column(db.DateTime, nullable=False)
-    qualifying_session = db.Column(db.DateTime, nullable=False)
-    sprint_session = db.Column(db.DateTime)
-    race_session = db.Column(db.DateTime, nullable=False)
-    
-    circuit = db.relationship('Circuit', backref='races')
-    live_events = db.relationship('LiveEvent', backref='race', lazy=True)  # AÑADE ESTA LÍNEA
-    
-class QualifyingSession(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
-    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
-    tyre_choice = db.Column(db.String(20), nullable=False)  # soft, medium, hard, wet, extreme_wet
-    q1_time = db.Column(db.Float)  # Tiempo en Q1
-    q2_time = db.Column(db.Float)  # Tiempo en Q2  
-    q3_time = db.Column(db.Float)  # Tiempo en Q3
-    final_position = db.Column(db.Integer)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    race = db.relationship('Race', backref='qualifying_sessions')
-    team = db.relationship('User', backref='qualifying_sessions')
-    driver = db.relationship('Driver', backref='qualifying_sessions')
-
-class RaceResult(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
-    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
-    position = db.Column(db.Integer)
-    points = db.Column(db.Integer, default=0)
-    tyre_usage = db.Column(db.Integer, default=0)
-    pit_stops = db.Column(db.Integer, default=0)
-    fastest_lap = db.Column(db.Boolean, default=False)
-    dnf = db.Column(db.Boolean, default=False)
-    dnf_reason = db.Column(db.String(50))
-
-class LiveEvent(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
-    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
-    lap = db.Column(db.Integer, nullable=False)
-    event_type = db.Column(db.String(50), nullable=False)
-    description = db.Column(db.Text, nullable=False)
-    session_type = db.Column(db.String(20), nullable=False, default='race')  # 'qualifying' o 'race'
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-# Nuevos modelos para el sistema de tests
-class TyreType(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(20), nullable=False)  # soft, medium, hard, wet, extreme_wet
-    dry_performance = db.Column(db.Integer, nullable=False)
-    wet_performance = db.Column(db.Integer, nullable=False)
-    durability = db.Column(db.Integer, nullable=False)
-    warmup_time = db.Column(db.Integer, nullable=False)  # en segundos
-
-class TestSession(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
-    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    # Relaciones
-    driver = db.relationship('Driver')
-    race = db.relationship('Race')
-
-class TestLap(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    test_session_id = db.Column(db.Integer, db.ForeignKey('test_session.id'), nullable=False)
-    lap_number = db.Column(db.Integer, nullable=False)
-    tyre_type = db.Column(db.String(20), nullable=False)
-    lap_time = db.Column(db.Float, nullable=False)  # tiempo en segundos
-    tyre_wear = db.Column(db.Integer, nullable=False)  # desgaste de 0-100
-    track_condition = db.Column(db.String(20), nullable=False)  # dry, wet, heavy_rain
-    
-    test_session = db.relationship('TestSession', backref='laps')
-
-class RaceStrategy(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
-    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
-    strategy_name = db.Column(db.String(100), nullable=False)
-    total_pit_stops = db.Column(db.Integer, nullable=False)
-    starting_tyre = db.Column(db.String(20), default='soft')
-    rain_strategy = db.Column(db.String(20), default='continue')  # continue, pit_wet, pit_extreme, next_pit
-    heavy_rain_strategy = db.Column(db.String(20), default='continue')  # continue, pit_extreme, immediate_pit
-    dry_strategy = db.Column(db.String(20), default='continue')  # continue, pit_soft, pit_medium, next_pit
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    driver = db.relationship('Driver')
-    race = db.relationship('Race')
-
-class StrategySegment(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    strategy_id = db.Column(db.Integer, db.ForeignKey('race_strategy.id'), nullable=False)
-    segment_order = db.Column(db.Integer, nullable=False)
-    tyre_type = db.Column(db.String(20), nullable=False)
-    laps_planned = db.Column(db.Integer, nullable=False)
-    
-    strategy = db.relationship('RaceStrategy', backref='segments')
-    
-# Añadir después de los modelos existentes en app.py
-
-class WeatherForecast(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
-    session_type = db.Column(db.String(20), nullable=False)  # test, qualifying, race
-    forecast_time = db.Column(db.DateTime, nullable=False)
-    condition = db.Column(db.String(20), nullable=False)  # dry, light_rain, heavy_rain
-    probability = db.Column(db.Float, nullable=False)  # 0-1
-    
-    race = db.relationship('Race', backref='weather_forecasts')
-    
-# Añadir después del modelo WeatherForecast en app.py
-
-class WeatherChange(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
-    session_type = db.Column(db.String(20), nullable=False)  # test, qualifying, race
-    change_lap = db.Column(db.Integer, nullable=False)  # vuelta en la que cambia el tiempo
-    from_condition = db.Column(db.String(20), nullable=False)  # condición anterior
-    to_condition = db.Column(db.String(20), nullable=False)  # nueva condición
-    probability = db.Column(db.Float, nullable=False)  # 0-1
-    
-    race = db.relationship('Race', backref='weather_changes')
-
-class ChampionshipStandings(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
-    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
-    points = db.Column(db.Integer, default=0)
-    position = db.Column(db.Integer)
-    fastest_lap = db.Column(db.Boolean, default=False)
-    dnf = db.Column(db.Boolean, default=False)
-    
-    team = db.relationship('User', backref='championship_results')
-    driver = db.relationship('Driver', backref='championship_results')
-    race = db.relationship('Race', backref='championship_results')
-    
-class Test(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
-    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
-    initial_tyre = db.Column(db.String(20), nullable=False)
-    track_condition = db.Column(db.String(20), nullable=False)
-    total_laps = db.Column(db.Integer, nullable=False)
-    best_lap = db.Column(db.Float, nullable=False)
-    avg_lap = db.Column(db.Float, nullable=False)
-    incidents = db.Column(db.Integer, default=0)
-    pit_stops = db.Column(db.Integer, default=0)
-    total_time_lost = db.Column(db.Float, default=0.0)
-    lap_data = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    # Relaciones - Asegúrate de que estén así
-    team = db.relationship('User', backref='tests')
-    driver = db.relationship('Driver', backref='tests')
-    race = db.relationship('Race', backref='tests')
-
 class TestCleanupSystem:
     @staticmethod
     def cleanup_old_tests():
@@ -419,6 +80,8 @@ class TestCleanupSystem:
                 print(f"✅ Tests eliminados automáticamente para la carrera {race.circuit.name}: {race_tests_deleted} tests")
             
             db.session.commit()
+            if deleted_count:
+                invalidate_tests_leaderboard()
             return deleted_count
             
         except Exception as e:
@@ -445,102 +108,6 @@ class TestCleanupSystem:
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-# Funciones de cálculo de salarios (para usar en el mercado)
-def calculate_driver_salary(age, skill, experience, aggression, consistency, growth_potential):
-    """Calcula el salario del piloto basado en sus atributos"""
-    # Base salary por ser piloto de F1
-    base_salary = 500000
-    
-    # Factores de ajuste
-    age_factor = 1.0
-    if age <= 25:
-        age_factor = 0.7  # Jóvenes ganan menos
-    elif age <= 30:
-        age_factor = 1.0  # Edad óptima
-    elif age <= 35:
-        age_factor = 1.2  # Experimentados
-    else:
-        age_factor = 1.5  # Veteranos muy valorados
-    
-    # Habilidad y experiencia son los factores más importantes
-    skill_factor = skill / 50.0  # 50 es el promedio
-    experience_factor = experience / 50.0
-    
-    # Factores secundarios
-    consistency_factor = consistency / 50.0
-    growth_factor = growth_potential / 50.0
-    
-    # La agresión puede ser positiva o negativa dependiendo del nivel
-    aggression_factor = 1.0
-    if aggression < 50:
-        aggression_factor = 0.9  # Muy conservador
-    elif aggression > 80:
-        aggression_factor = 1.1  # Muy agresivo (arriesgado pero puede dar resultados)
-    
-    # Cálculo final del salario
-    salary = base_salary * age_factor * skill_factor * experience_factor * consistency_factor * growth_factor * aggression_factor
-    
-    # Ajustar rango razonable para pilotos de F1
-    salary = max(200000, min(15000000, salary))
-    
-    return int(salary)
-
-def calculate_mechanic_salary(age, pit_stop_skill, reliability_skill, growth_potential):
-    """Calcula el salario del mecánico basado en sus atributos"""
-    base_salary = 80000
-    
-    # Factores de ajuste
-    age_factor = 1.0
-    if age <= 30:
-        age_factor = 0.8  # Jóvenes ganan menos
-    elif age <= 45:
-        age_factor = 1.0  # Edad óptima
-    elif age <= 55:
-        age_factor = 1.3  # Experimentados muy valorados
-    else:
-        age_factor = 1.5  # Veteranos con mucha experiencia
-    
-    # Habilidades principales
-    pit_skill_factor = pit_stop_skill / 50.0
-    reliability_factor = reliability_skill / 50.0
-    growth_factor = growth_potential / 50.0
-    
-    # Cálculo final
-    salary = base_salary * age_factor * pit_skill_factor * reliability_factor * growth_factor
-    
-    # Ajustar rango razonable para mecánicos de F1
-    salary = max(50000, min(400000, salary))
-    
-    return int(salary)
-
-def calculate_engineer_salary(age, innovation, development_speed, growth_potential):
-    """Calcula el salario del ingeniero basado en sus atributos"""
-    base_salary = 120000
-    
-    # Factores de ajuste
-    age_factor = 1.0
-    if age <= 35:
-        age_factor = 0.8  # Jóvenes ganan menos
-    elif age <= 50:
-        age_factor = 1.0  # Edad óptima
-    elif age <= 65:
-        age_factor = 1.4  # Experimentados muy valorados
-    else:
-        age_factor = 1.6  # Veteranos con mucha experiencia
-    
-    # Habilidades principales
-    innovation_factor = innovation / 50.0
-    development_factor = development_speed / 50.0
-    growth_factor = growth_potential / 50.0
-    
-    # Cálculo final
-    salary = base_salary * age_factor * innovation_factor * development_factor * growth_factor
-    
-    # Ajustar rango razonable para ingenieros de F1
-    salary = max(80000, min(600000, salary))
-    
-    return int(salary)
-
 # Sistema del juego
 class RaceSimulator:
     @staticmethod
@@ -558,27 +125,22 @@ class RaceSimulator:
 
     @staticmethod
     def simulate_qualifying(race_id):
-        teams = User.query.filter(User.drivers.any()).all()
-        results = []
-        
-        for team in teams:
-            for driver in team.drivers:
-                base_time = 90 + random.random() * 10
-                driver_skill = (driver.skill + driver.experience) / 2
-                car_performance = sum(comp.strength for comp in team.car_components) / 4
-                
-                final_time = base_time - (driver_skill / 100 * 5) - (car_performance / 100 * 3) + (random.random() * 2 - 1)
-                
-                results.append({
-                    'team_id': team.id,
-                    'driver_id': driver.id,
-                    'driver_name': driver.name,
-                    'team_name': team.team_name,
-                    'time': final_time
-                })
-        
-        results.sort(key=lambda x: x['time'])
-        return results
+        """Clasificación rápida sin guardar nada, con el motor único de clasificación"""
+        picks = db.session.query(Driver.team_id, Driver.id).filter(
+            Driver.team_id.isnot(None)
+        ).order_by(Driver.team_id, Driver.id).all()
+        entries = build_qualifying_entries([(team_id, driver_id, 'soft') for team_id, driver_id in picks])
+        output = QualifyingSimulation(entries, current_app.config['QUALIFYING_KNOCKOUT'], ComponentTimeModel()).run()
+        return [
+            {
+                'team_id': result.team_id,
+                'driver_id': result.driver_id,
+                'driver_name': result.driver_name,
+                'team_name': result.team_name,
+                'time': result.best_time
+            }
+            for result in output.results
+        ]
 
     @staticmethod
     def simulate_race(race_id):
@@ -671,7 +233,8 @@ class RaceSimulator:
             # Pequeña pausa para simular tiempo real
             # db.session.commit()  # Comentado para evitar múltiples commits
         
-        # Guardar resultados en la base de datos
+        # Guardar resultados en la base de datos, bajo una versión nueva
+        version = RaceResultsSystem.next_version(race_id)
         for result in results:
             standing = ChampionshipStandings(
                 team_id=result['team_id'],
@@ -680,7 +243,8 @@ class RaceSimulator:
                 points=result['points'],
                 position=result['position'],
                 fastest_lap=result.get('fastest_lap', False),
-                dnf=result['dnf']
+                dnf=result['dnf'],
+                version=version
             )
             db.session.add(standing)
             
@@ -697,6 +261,7 @@ class RaceSimulator:
                 db.session.add(event)
                 events.append(event)
         
+        RaceResultsSystem.publish(race_id, version)
         db.session.commit()
         return events
 
@@ -717,118 +282,278 @@ POINTS_SYSTEM = {
 }
 FASTEST_LAP_POINT = 1
 
-class FinancialTransaction(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    transaction_type = db.Column(db.String(20), nullable=False)  # income, expense
-    category = db.Column(db.String(50), nullable=False)  # salary, upgrade, training, sponsorship, race_prize, etc.
-    amount = db.Column(db.Float, nullable=False)
-    description = db.Column(db.String(200), nullable=False)
-    balance_after = db.Column(db.Float, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    team = db.relationship('User', backref='financial_transactions')
-
-class Budget(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    category = db.Column(db.String(50), nullable=False)
-    allocated_amount = db.Column(db.Float, nullable=False)
-    spent_amount = db.Column(db.Float, default=0.0)
-    month = db.Column(db.Integer, nullable=False)  # 1-12
-    year = db.Column(db.Integer, nullable=False)
-    
-    team = db.relationship('User', backref='budgets')
-
-class FinanceSystem:
+# Tablas de puntos por división (ligas grandes partidas en varias carreras).
+# Las divisiones más allá de la última tabla usan la última.
+DIVISION_POINTS = (
+    tuple(POINTS_SYSTEM[position] for position in sorted(POINTS_SYSTEM)),
+    (10, 8, 6, 5, 4, 3, 2, 1),
+    (5, 4, 3, 2, 1),
+)
+
+# Premios en metálico por posición final (los abandonos no cobran)
+PRIZE_MONEY = {
+    1: 3000000, 2: 2200000, 3: 1800000, 4: 1400000, 5: 1200000,
+    6: 1000000, 7: 850000, 8: 700000, 9: 550000, 10: 400000
+}
+PRIZE_MONEY_PARTICIPATION = 150000  # Fuera de los puntos pero con la carrera terminada
+
+def calculate_prize_money(position, dnf):
+    """Premio en metálico de un piloto según su posición final"""
+    if dnf or not position:
+        return 0
+    return PRIZE_MONEY.get(position, PRIZE_MONEY_PARTICIPATION)
+
+class RaceResultsSystem:
+    """Resultados de carrera versionados (RaceResult y ChampionshipStandings).
+    
+    Cada guardado inserta sus filas bajo una versión nueva y la publica al final
+    en Race.results_version con un único UPDATE. Los lectores filtran por la
+    versión publicada: ven la anterior completa o la nueva completa, nunca una
+    carrera vacía. Las versiones reemplazadas se borran después, en segundo plano.
+    """
+    @staticmethod
+    def published(model):
+        """Condición SQL: filas de `model` que pertenecen a la versión publicada de su carrera"""
+        return model.version == db.select(Race.results_version).where(
+            Race.id == model.race_id
+        ).correlate_except(Race).scalar_subquery()
+
     @staticmethod
-    def get_financial_summary(team_id, months=6):
-        """Obtiene un resumen financiero de los últimos meses"""
-        cutoff_date = datetime.utcnow() - timedelta(days=30*months)
-        
-        # Consultas separadas para ingresos y gastos
-        income_data = db.session.query(
-            db.func.strftime('%Y-%m', FinancialTransaction.created_at).label('month'),
-            db.func.sum(FinancialTransaction.amount).label('amount')
-        ).filter(
-            FinancialTransaction.team_id == team_id,
-            FinancialTransaction.transaction_type == 'income',
-            FinancialTransaction.created_at >= cutoff_date
-        ).group_by('month').all()
-        
-        expense_data = db.session.query(
-            db.func.strftime('%Y-%m', FinancialTransaction.created_at).label('month'),
-            db.func.sum(FinancialTransaction.amount).label('amount')
-        ).filter(
-            FinancialTransaction.team_id == team_id,
-            FinancialTransaction.transaction_type == 'expense',
-            FinancialTransaction.created_at >= cutoff_date
-        ).group_by('month').all()
-        
-        # Convertir a diccionarios para fácil acceso
-        income_dict = {item.month: item.amount or 0 for item in income_data}
-        expense_dict = {item.month: item.amount or 0 for item in expense_data}
-        
-        # Combinar todos los meses únicos
-        all_months = sorted(set(list(income_dict.keys()) + list(expense_dict.keys())))
-        
-        monthly_data = []
-        for month in all_months:
-            monthly_data.append({
-                'month': month,
-                'income': income_dict.get(month, 0),
-                'expenses': expense_dict.get(month, 0)
+    def next_version(race_id):
+        """Versión libre para un nuevo guardado: mayor que la publicada y que cualquier fila existente"""
+        latest = db.session.query(db.func.max(ChampionshipStandings.version)).filter_by(race_id=race_id).scalar()
+        published = db.session.query(Race.results_version).filter_by(id=race_id).scalar()
+        return max(latest or 0, published or 0) + 1
+
+    @staticmethod
+    def publish(race_id, version):
+        """Apunta la carrera a `version` sin retroceder nunca a una anterior (sin commit)"""
+        table = Race.__table__
+        db.session.execute(table.update().where(
+            table.c.id == race_id,
+            db.or_(table.c.results_version.is_(None), table.c.results_version < version)
+        ).values(results_version=version))
+
+    @staticmethod
+    def collect_old_versions():
+        """Borra las filas de versiones ya reemplazadas. Devuelve cuántas borró"""
+        deleted = 0
+        for model in (ChampionshipStandings, RaceResult):
+            superseded = model.version < db.select(Race.results_version).where(
+                Race.id == model.race_id
+            ).correlate_except(Race).scalar_subquery()
+            # La versión liquidada se conserva hasta liquidar la nueva: hace falta para anularla
+            settled = db.select(RaceSettlement.version).where(
+                RaceSettlement.race_id == model.race_id
+            ).correlate_except(RaceSettlement).scalar_subquery()
+            deleted += model.query.filter(
+                superseded, db.or_(settled.is_(None), model.version != settled)
+            ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+class SettlementSystem:
+    STANDING_FIELDS = ('points', 'races_entered', 'wins', 'podiums', 'prize_money')
+
+    @staticmethod
+    def team_totals(race_id, version):
+        """Puntos, participaciones, victorias, podios y premios por equipo de una versión de resultados"""
+        team_totals = {}
+        for result in ChampionshipStandings.query.filter_by(race_id=race_id, version=version).all():
+            totals = team_totals.setdefault(result.team_id, {
+                'points': 0, 'races_entered': 0, 'wins': 0, 'podiums': 0, 'prize_money': 0, 'positions': []
             })
-        
-        # Totales por categoría
-        category_totals = db.session.query(
-            FinancialTransaction.category,
-            FinancialTransaction.transaction_type,
-            db.func.sum(FinancialTransaction.amount).label('total')
-        ).filter(
-            FinancialTransaction.team_id == team_id,
-            FinancialTransaction.created_at >= cutoff_date
-        ).group_by(FinancialTransaction.category, FinancialTransaction.transaction_type).all()
-        
-        return {
-            'monthly_data': monthly_data,
-            'category_totals': category_totals
+            totals['points'] += result.points or 0
+            totals['races_entered'] += 1
+            if not result.dnf and result.position:
+                totals['wins'] += 1 if result.position == 1 else 0
+                totals['podiums'] += 1 if result.position <= 3 else 0
+                totals['positions'].append(result.position)
+            totals['prize_money'] += calculate_prize_money(result.position, result.dnf)
+        return team_totals
+
+    @staticmethod
+    def settle_race(race_id):
+        """Liquida la versión publicada de una carrera: premios en metálico y clasificación acumulada.
+
+        RaceSettlement guarda qué versión de resultados está liquidada. Si la
+        carrera se vuelve a simular y se publica otra versión, en el mismo commit
+        se anulan los premios de la anterior con asientos de signo contrario, se
+        suma a TeamStanding la diferencia entre ambas versiones y se pagan los
+        premios nuevos. Si la versión publicada ya está liquidada no hace nada.
+        """
+        race = Race.query.get(race_id)
+        if not race or race.results_version is None:
+            return None
+        version = race.results_version
+        settlement = RaceSettlement.query.filter_by(race_id=race_id).first()
+        if settlement and settlement.version >= version:
+            return None
+
+        new_totals = SettlementSystem.team_totals(race_id, version)
+        if not new_totals:
+            return None
+        old_totals = SettlementSystem.team_totals(race_id, settlement.version) if settlement else {}
+        if settlement and not settlement.total_prize:
+            # Liquidada sin premios (p. ej. carreras anteriores a la liquidación): no hay nada que anular
+            for totals in old_totals.values():
+                totals['prize_money'] = 0
+
+        postings = [{
+            'team_id': team_id,
+            'transaction_type': 'expense',
+            'category': 'race_prize',
+            'amount': totals['prize_money'],
+            'description': f'Anulación premios GP {race.circuit.name} (resultados v{settlement.version})'
+        } for team_id, totals in old_totals.items() if totals['prize_money'] > 0]
+        prizes = [{
+            'team_id': team_id,
+            'transaction_type': 'income',
+            'category': 'race_prize',
+            'amount': totals['prize_money'],
+            'description': f'Premios GP {race.circuit.name} (' +
+                           ', '.join(f'P{position}' for position in sorted(totals['positions'])) + ')'
+        } for team_id, totals in new_totals.items() if totals['prize_money'] > 0]
+        postings += prizes
+
+        now = datetime.utcnow()
+        standing_deltas = [dict(
+            {field: new_totals.get(team_id, {}).get(field, 0) - old_totals.get(team_id, {}).get(field, 0)
+             for field in SettlementSystem.STANDING_FIELDS},
+            team_id=team_id, updated_at=now
+        ) for team_id in new_totals.keys() | old_totals.keys()]
+
+        summary = {
+            'version': version,
+            'teams_paid': len(prizes),
+            'total_prize': sum(posting['amount'] for posting in prizes)
         }
+        try:
+            # Reclamar la liquidación antes de escribir: si otro proceso se adelanta,
+            # el UPDATE condicional no toca filas o el INSERT choca con la clave única
+            if settlement:
+                claimed = RaceSettlement.query.filter_by(
+                    id=settlement.id, version=settlement.version
+                ).update(summary)
+                if not claimed:
+                    db.session.rollback()
+                    return None
+            else:
+                settlement = RaceSettlement(race_id=race_id, **summary)
+                db.session.add(settlement)
+                db.session.flush()
+
+            FinanceSystem.post_transactions(postings)
+
+            table = TeamStanding.__table__
+            insert = upsert_insert(table)
+            increments = {field: table.c[field] + insert.excluded[field] for field in SettlementSystem.STANDING_FIELDS}
+            db.session.execute(insert.on_conflict_do_update(
+                index_elements=['team_id'],
+                set_=dict(increments, updated_at=insert.excluded.updated_at)
+            ), standing_deltas)
+            db.session.commit()
+            invalidate_dashboard(fragment='standings')
+        except IntegrityError:
+            db.session.rollback()
+            return None
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error liquidando la carrera {race_id}: {str(e)}")
+            return None
+
+        print(f"🏆 Carrera {race_id} liquidada (v{version}): {settlement.teams_paid} equipos, €{settlement.total_prize:,.0f} en premios")
+        return settlement
 
     @staticmethod
-    def record_transaction(team_id, transaction_type, category, amount, description):
-        """Registra una transacción financiera"""
-        user = User.query.get(team_id)
-        if not user:
-            return False
-            
-        # Actualizar el saldo del usuario según el tipo de transacción
-        if transaction_type == 'income':
-            user.money += amount
-        elif transaction_type == 'expense':
-            user.money -= amount
-        
-        transaction = FinancialTransaction(
-            team_id=team_id,
-            transaction_type=transaction_type,
-            category=category,
-            amount=amount,
-            description=description,
-            balance_after=user.money
+    def pending_races():
+        """Carreras cuya versión publicada de resultados aún no se ha liquidado"""
+        has_results = Race.results_version.isnot(None)
+        already_settled = db.exists().where(
+            RaceSettlement.race_id == Race.id,
+            RaceSettlement.version >= Race.results_version
         )
-        
-        db.session.add(transaction)
-        db.session.commit()
-        return True
+        return Race.query.filter(has_results, ~already_settled).order_by(Race.race_session).all()
+
+# Estado compartido entre procesos (varios workers detrás de Waitress)
+CACHE_SYNC_INTERVAL = 2  # segundos máximos que un proceso tarda en ver una invalidación ajena
+
+class SharedCache:
+    """Caché local de cada proceso con invalidación compartida vía base de datos.
+
+    Los valores viven en memoria del proceso (solo datos planos). Invalidar
+    borra lo local y sube la versión del espacio en CacheGeneration; el resto
+    de procesos lo detectan en su siguiente lectura (como mucho
+    CACHE_SYNC_INTERVAL segundos después) y vacían su copia.
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.entries = {}  # clave -> (caduca_en o None, valor)
+        self.version = None
+        self.checked_at = None
+
+    def _sync(self):
+        now = datetime.utcnow()
+        if self.checked_at and (now - self.checked_at).total_seconds() < CACHE_SYNC_INTERVAL:
+            return
+        table = CacheGeneration.__table__
+        try:
+            with db.engine.connect() as conn:
+                version = conn.execute(
+                    db.select(table.c.version).where(table.c.namespace == self.namespace)
+                ).scalar() or 0
+        except Exception as e:
+            # Sin tabla o sin conexión: no arriesgarse a servir datos viejos
+            print(f"⚠️ No se pudo sincronizar la caché {self.namespace}: {str(e)}")
+            self.entries.clear()
+            return
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+        self.checked_at = now
+
+    def get(self, key):
+        self._sync()
+        cached = self.entries.get(key)
+        if cached is None:
+            return None
+        expires_at, value = cached
+        if expires_at is not None and expires_at <= datetime.utcnow():
+            self.entries.pop(key, None)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        self._sync()
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl) if ttl is not None else None
+        self.entries[key] = (expires_at, value)
+
+    def invalidate(self, match=None):
+        """Borra las claves que cumplan match (todas si es None) y avisa al resto"""
+        for key in list(self.entries.keys()):
+            if match is None or match(key):
+                self.entries.pop(key, None)
+
+        table = CacheGeneration.__table__
+        try:
+            with db.engine.begin() as conn:
+                bumped = conn.execute(
+                    table.update().where(table.c.namespace == self.namespace).values(version=table.c.version + 1)
+                ).rowcount
+                if not bumped:
+                    conn.execute(table.insert().values(namespace=self.namespace, version=1))
+        except Exception as e:
+            print(f"⚠️ No se pudo propagar la invalidación de {self.namespace}: {str(e)}")
 
 # Rutas de la aplicación
-@app.route('/')
+@main_bp.route('/')
 def index():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     return render_template('index.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@main_bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
@@ -868,11 +593,11 @@ def register():
         db.session.commit()
         
         login_user(user)
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@main_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
@@ -881,28 +606,128 @@ def login():
         user = User.query.filter_by(username=username).first()
         if user and check_password_hash(user.password_hash, password):
             login_user(user)
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         
         return render_template('login.html', error='Credenciales inválidas')
     
     return render_template('login.html')
 
-@app.route('/logout')
+@main_bp.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
+
+# Caché de fragmentos del dashboard: clave (fragmento, equipo). Solo datos
+# planos (dicts/listas), nunca objetos ORM, para no arrastrar sesiones cerradas.
+DASHBOARD_NEXT_EVENT_TTL = 30  # segundos
+DASHBOARD_STANDINGS_TTL = 60
+DASHBOARD_ROSTER_TTL = 30
+
+dashboard_cache = SharedCache('dashboard')
+
+def invalidate_dashboard(team_id=None, fragment=None):
+    """Invalida fragmentos del dashboard (de un equipo, de un tipo o todos)"""
+    dashboard_cache.invalidate(lambda key: (fragment is None or key[0] == fragment) and
+                                           (team_id is None or key[1] == team_id))
+
+class DashboardSystem:
+    @staticmethod
+    def _cached(fragment, team_id, ttl, loader):
+        """Devuelve el fragmento cacheado o lo recalcula si ha caducado"""
+        cached = dashboard_cache.get((fragment, team_id))
+        if cached is not None:
+            return cached
+
+        value = loader()
+        if isinstance(value, dict) and value.get('session_datetime'):
+            # El próximo evento deja de serlo en cuanto empieza
+            ttl = min(ttl, max(0, (value['session_datetime'] - datetime.utcnow()).total_seconds()))
+        dashboard_cache.set((fragment, team_id), value, ttl)
+        return value
+
+    @staticmethod
+    def load_next_event():
+        """Próxima sesión del calendario con un MIN sobre la unión de horarios indexados"""
+        now = datetime.utcnow()
+        branches = [
+            db.select(
+                Race.id.label('race_id'),
+                db.literal(session_type).label('session_type'),
+                column.label('session_datetime')
+            ).where(column > now).order_by(column).limit(1).subquery()
+            for session_type, column in (
+                ('test', Race.test_session),
+                ('qualifying', Race.qualifying_session),
+                ('race', Race.race_session)
+            )
+        ]
+        sessions = db.union_all(*[db.select(branch) for branch in branches]).subquery()
+        row = db.session.query(sessions).order_by(sessions.c.session_datetime).first()
+        if not row:
+            return None
+
+        race = Race.query.get(row.race_id)
+        return {
+            'race_id': row.race_id,
+            'circuit': {'name': race.circuit.name, 'country': race.circuit.country},
+            'session_type': row.session_type,
+            'session_datetime': row.session_datetime
+        }
+
+    @staticmethod
+    def load_standings(team_id):
+        """Posición del equipo desde la clasificación materializada (TeamStanding)"""
+        standing = TeamStanding.query.filter_by(team_id=team_id).first()
+        leader_points = db.session.query(db.func.max(TeamStanding.points)).scalar()
+        if not standing:
+            return {'team_standings': None,
+                    'leader_standings': {'total_points': leader_points} if leader_points is not None else None}
+
+        teams_ahead = TeamStanding.query.filter(TeamStanding.points > standing.points).count()
+        return {
+            'team_standings': {
+                'position': teams_ahead + 1,
+                'total_points': standing.points,
+                'races_entered': standing.races_entered
+            },
+            'leader_standings': {'total_points': leader_points}
+        }
+
+    @staticmethod
+    def load_roster(team_id):
+        """Plantilla y componentes del equipo como datos planos"""
+        def staff_rows(model, *fields):
+            return [dict(zip(('id',) + fields, row)) for row in db.session.query(
+                model.id, *[getattr(model, field) for field in fields]
+            ).filter(model.team_id == team_id).order_by(model.id).all()]
+
+        return {
+            'drivers': staff_rows(Driver, 'name', 'skill', 'experience'),
+            'mechanics': staff_rows(Mechanic, 'name'),
+            'engineers': staff_rows(Engineer, 'name'),
+            'car_components': staff_rows(CarComponent, 'component_type', 'strength', 'reliability')
+        }
+
+    @staticmethod
+    def get_summary(user):
+        """Resumen del dashboard; los fragmentos costosos salen de la caché"""
+        summary = {
+            'money': user.money,
+            'next_event': DashboardSystem._cached(
+                'next_event', None, DASHBOARD_NEXT_EVENT_TTL, DashboardSystem.load_next_event),
+            'roster': DashboardSystem._cached(
+                'roster', user.id, DASHBOARD_ROSTER_TTL, lambda: DashboardSystem.load_roster(user.id))
+        }
+        summary.update(DashboardSystem._cached(
+            'standings', user.id, DASHBOARD_STANDINGS_TTL, lambda: DashboardSystem.load_standings(user.id)))
+        return summary
 
-@app.route('/dashboard')
+@main_bp.route('/dashboard')
 @login_required
 def dashboard():
-    team_info = {
-        'money': current_user.money,
-        'drivers': current_user.drivers,
-        'mechanics': current_user.mechanics,
-        'engineers': current_user.engineers,
-        'car_components': current_user.car_components
-    }
+    summary = DashboardSystem.get_summary(current_user)
+    team_info = dict(summary['roster'], money=summary['money'])
     
     # Obtener mejora activa
     active_upgrade = Upgrade.query.filter_by(
@@ -916,84 +741,229 @@ def dashboard():
         completed=False
     ).first()
     
-    # Obtener posición en el campeonato del equipo
-    team_standings_result = db.session.query(
-        User.team_name,
-        db.func.sum(ChampionshipStandings.points).label('total_points'),
-        db.func.count(ChampionshipStandings.id).label('races_entered')
-    ).join(ChampionshipStandings, User.id == ChampionshipStandings.team_id
-    ).group_by(User.id, User.team_name
-    ).order_by(db.desc('total_points')).all()
-    
-    # Encontrar la posición del equipo actual
-    team_standings = None
-    leader_standings = None
-    
-    for i, standing in enumerate(team_standings_result):
-        if standing.team_name == current_user.team_name:
-            team_standings = {
-                'position': i + 1,
-                'total_points': standing.total_points or 0,
-                'races_entered': standing.races_entered or 0
-            }
-        
-        # Guardar también el líder para calcular diferencia
-        if i == 0:
-            leader_standings = {
-                'total_points': standing.total_points or 0
-            }
-    
-    # Encontrar el próximo evento
-    now = datetime.utcnow()
-    next_event = None
-    
-    # Buscar en todas las carreras
-    races = Race.query.all()
-    for race in races:
-        sessions = [
-            ('test', race.test_session),
-            ('qualifying', race.qualifying_session), 
-            ('race', race.race_session)
-        ]
-        
-        for session_type, session_time in sessions:
-            if session_time > now:
-                if not next_event or session_time < next_event['session_datetime']:
-                    next_event = {
-                        'race_id': race.id,
-                        'circuit': race.circuit,
-                        'session_type': session_type,
-                        'session_datetime': session_time
-                    }
-    
     return render_template('dashboard.html', 
                          team=team_info, 
-                         next_event=next_event,
+                         next_event=summary['next_event'],
                          active_upgrade=active_upgrade,
                          active_training=active_training,
-                         team_standings=team_standings,
-                         leader_standings=leader_standings)
+                         team_standings=summary['team_standings'],
+                         leader_standings=summary['leader_standings'])
+
+@main_bp.route('/api/dashboard/summary')
+@login_required
+def api_dashboard_summary():
+    """API con el resumen del dashboard (mismos fragmentos cacheados)"""
+    summary = DashboardSystem.get_summary(current_user)
+    next_event = summary['next_event']
+    roster = summary['roster']
+    
+    return jsonify({
+        'money': summary['money'],
+        'team_standings': summary['team_standings'],
+        'leader_standings': summary['leader_standings'],
+        'next_event': dict(next_event, session_datetime=next_event['session_datetime'].isoformat()) if next_event else None,
+        'staff': {
+            'drivers': len(roster['drivers']),
+            'mechanics': len(roster['mechanics']),
+            'engineers': len(roster['engineers']),
+            'car_components': len(roster['car_components'])
+        }
+    })
 
-@app.route('/team')
+@main_bp.route('/team')
 @login_required
 def team_management():
     from datetime import datetime
     current_date = datetime.utcnow()
     return render_template('team.html', team=current_user, current_date=current_date)
 
-@app.route('/market')
+# Configuración de búsqueda del mercado: filtros por rango y ordenaciones por tipo
+MARKET_PAGE_SIZE = 30
+MARKET_MAX_PAGE_SIZE = 100
+
+MARKET_SEARCH = {
+    'driver': {
+        'model': Driver,
+        'fields': ('skill', 'experience', 'aggression', 'consistency', 'growth_potential'),
+        'sorts': {
+            'value': ('value_score', True),
+            'skill': ('skill', True),
+            'experience': ('experience', True),
+            'consistency': ('consistency', True),
+            'salary': ('salary', False),
+            'salary-desc': ('salary', True),
+            'age': ('age', False),
+            'age-desc': ('age', True)
+        }
+    },
+    'mechanic': {
+        'model': Mechanic,
+        'fields': ('pit_stop_skill', 'reliability_skill', 'growth_potential'),
+        'sorts': {
+            'value': ('value_score', True),
+            'pit_stop': ('pit_stop_skill', True),
+            'reliability': ('reliability_skill', True),
+            'salary': ('salary', False),
+            'salary-desc': ('salary', True),
+            'age': ('age', False),
+            'age-desc': ('age', True)
+        }
+    },
+    'engineer': {
+        'model': Engineer,
+        'fields': ('innovation', 'development_speed', 'growth_potential'),
+        'sorts': {
+            'value': ('value_score', True),
+            'innovation': ('innovation', True),
+            'development': ('development_speed', True),
+            'salary': ('salary', False),
+            'salary-desc': ('salary', True),
+            'age': ('age', False),
+            'age-desc': ('age', True)
+        }
+    }
+}
+
+def search_market(staff_type, filters=None, sort='value', search=None, cursor=None, limit=MARKET_PAGE_SIZE):
+    """Busca personal disponible en el mercado con paginación por cursor (keyset)
+    
+    Args:
+        staff_type: 'driver', 'mechanic' o 'engineer'
+        filters: diccionario {'min_<campo>': valor, 'max_<campo>': valor}
+        sort: clave de ordenación de MARKET_SEARCH
+        search: texto a buscar en el nombre
+        cursor: (valor_ordenación, id) del último elemento de la página anterior
+        limit: tamaño de página
+    
+    Returns:
+        (lista de modelos, cursor de la siguiente página o None)
+    """
+    config = MARKET_SEARCH[staff_type]
+    model = config['model']
+    sort_field, descending = config['sorts'].get(sort, config['sorts']['value'])
+    sort_column = getattr(model, sort_field)
+    
+    query = model.query.filter(model.market_available == True)
+    
+    # Filtros por rango sobre atributos, edad, salario y valor
+    for field in config['fields'] + ('age', 'salary', 'value_score'):
+        column = getattr(model, field)
+        min_value = (filters or {}).get(f'min_{field}')
+        max_value = (filters or {}).get(f'max_{field}')
+        if min_value is not None:
+            query = query.filter(column >= min_value)
+        if max_value is not None:
+            query = query.filter(column <= max_value)
+    
+    if search:
+        # autoescape: '%' y '_' del texto buscado son literales, no comodines de LIKE
+        query = query.filter(model.name.icontains(search, autoescape=True))
+    
+    # Keyset: continuar justo después del último elemento devuelto
+    if cursor is not None:
+        cursor_value, cursor_id = cursor
+        if descending:
+            query = query.filter(db.or_(
+                sort_column < cursor_value,
+                db.and_(sort_column == cursor_value, model.id < cursor_id)
+            ))
+        else:
+            query = query.filter(db.or_(
+                sort_column > cursor_value,
+                db.and_(sort_column == cursor_value, model.id > cursor_id)
+            ))
+    
+    if descending:
+        query = query.order_by(sort_column.desc(), model.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), model.id.asc())
+    
+    items = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = (getattr(last, sort_field), last.id)
+    
+    return items, next_cursor
+
+def serialize_market_item(staff_type, staff):
+    """Convierte un miembro del personal en un diccionario para la API del mercado"""
+    data = {
+        'id': staff.id,
+        'type': staff_type,
+        'name': staff.name,
+        'age': staff.age,
+        'salary': staff.salary,
+        'value_score': staff.value_score or 0
+    }
+    for field in MARKET_SEARCH[staff_type]['fields']:
+        data[field] = getattr(staff, field)
+    return data
+
+def encode_market_cursor(cursor):
+    return f'{cursor[0]}|{cursor[1]}' if cursor else None
+
+def decode_market_cursor(raw_cursor):
+    try:
+        value, staff_id = raw_cursor.rsplit('|', 1)
+        return float(value), int(staff_id)
+    except (AttributeError, ValueError):
+        return None
+
+@main_bp.route('/market')
 @login_required
 def market():
-    available_drivers = Driver.query.filter_by(market_available=True).all()
-    available_mechanics = Mechanic.query.filter_by(market_available=True).all()
-    available_engineers = Engineer.query.filter_by(market_available=True).all()
+    # Solo la primera página de cada tipo; el resto se carga desde /api/market
+    market_pages = {}
+    market_totals = {}
+    for staff_type, config in MARKET_SEARCH.items():
+        items, next_cursor = search_market(staff_type)
+        market_pages[staff_type] = (items, encode_market_cursor(next_cursor))
+        market_totals[staff_type] = config['model'].query.filter_by(market_available=True).count()
     
     return render_template('market.html', 
-                         drivers=available_drivers,
-                         mechanics=available_mechanics,
-                         engineers=available_engineers)
+                         drivers=market_pages['driver'][0],
+                         mechanics=market_pages['mechanic'][0],
+                         engineers=market_pages['engineer'][0],
+                         next_cursors={t: page[1] for t, page in market_pages.items()},
+                         market_totals=market_totals)
+
+@main_bp.route('/api/market')
+@login_required
+def api_market():
+    """API de búsqueda del mercado con filtros, ordenación y paginación por cursor"""
+    staff_type = request.args.get('type', 'driver')
+    if staff_type not in MARKET_SEARCH:
+        return jsonify({'success': False, 'message': 'Tipo de personal no válido'}), 400
+    
+    config = MARKET_SEARCH[staff_type]
+    filters = {}
+    for field in config['fields'] + ('age', 'salary', 'value_score'):
+        for bound in ('min', 'max'):
+            value = request.args.get(f'{bound}_{field}', type=float)
+            if value is not None:
+                filters[f'{bound}_{field}'] = value
+    
+    limit = min(max(request.args.get('limit', MARKET_PAGE_SIZE, type=int), 1), MARKET_MAX_PAGE_SIZE)
+    cursor = decode_market_cursor(request.args.get('cursor'))
+    
+    items, next_cursor = search_market(
+        staff_type,
+        filters=filters,
+        sort=request.args.get('sort', 'value'),
+        search=request.args.get('q', '').strip() or None,
+        cursor=cursor,
+        limit=limit
+    )
+    
+    return jsonify({
+        'items': [serialize_market_item(staff_type, item) for item in items],
+        'next_cursor': encode_market_cursor(next_cursor),
+        'has_next': next_cursor is not None
+    })
 
-@app.route('/buy/driver/<int:driver_id>')
+@main_bp.route('/buy/driver/<int:driver_id>')
 @login_required
 def buy_driver(driver_id):
     if len(current_user.drivers) >= Config.MAX_DRIVERS:
@@ -1017,11 +987,13 @@ def buy_driver(driver_id):
         )
         
         db.session.commit()
+        
+        invalidate_dashboard(current_user.id, 'roster')
         return jsonify({'success': True, 'message': 'Piloto comprado'})
     
     return jsonify({'success': False, 'message': 'Error en la compra'})
 
-@app.route('/buy/mechanic/<int:mechanic_id>')
+@main_bp.route('/buy/mechanic/<int:mechanic_id>')
 @login_required
 def buy_mechanic(mechanic_id):
     if len(current_user.mechanics) >= Config.MAX_MECHANICS:
@@ -1042,11 +1014,13 @@ def buy_mechanic(mechanic_id):
         )
         
         db.session.commit()
+        
+        invalidate_dashboard(current_user.id, 'roster')
         return jsonify({'success': True, 'message': 'Mecánico contratado'})
     
     return jsonify({'success': False, 'message': 'Error en la contratación'})
 
-@app.route('/buy/engineer/<int:engineer_id>')
+@main_bp.route('/buy/engineer/<int:engineer_id>')
 @login_required
 def buy_engineer(engineer_id):
     if len(current_user.engineers) >= Config.MAX_ENGINEERS:
@@ -1067,13 +1041,15 @@ def buy_engineer(engineer_id):
         )
         
         db.session.commit()
+        
+        invalidate_dashboard(current_user.id, 'roster')
         return jsonify({'success': True, 'message': 'Ingeniero contratado'})
     
     return jsonify({'success': False, 'message': 'Error en la contratación'})
 
 # Modificar las rutas de despido en app.py
 
-@app.route('/fire/driver/<int:driver_id>')
+@main_bp.route('/fire/driver/<int:driver_id>')
 @login_required
 def fire_driver(driver_id):
     driver = Driver.query.get(driver_id)
@@ -1092,14 +1068,23 @@ def fire_driver(driver_id):
                 'message': f'No tienes suficiente dinero para pagar la indemnización (€{severance_payment:,.0f})'
             })
         
-        # Aplicar el pago
-        current_user.money -= severance_payment
+        # Aplicar el pago a través del libro contable (misma transacción que el despido)
+        FinanceSystem.record_transaction(
+            current_user.id,
+            'expense',
+            'severance',
+            severance_payment,
+            f'Indemnización - {driver.name}'
+        )
         
         # Despedir al piloto
         driver.team_id = None
         driver.market_available = True
+        driver.refresh_value_score()  # Vuelve al mercado con sus atributos actuales
         
         db.session.commit()
+        
+        invalidate_dashboard(current_user.id, 'roster')
         return jsonify({
             'success': True, 
             'message': f'Piloto despedido. Indemnización pagada: €{severance_payment:,.0f}'
@@ -1107,7 +1092,7 @@ def fire_driver(driver_id):
     
     return jsonify({'success': False, 'message': 'Error al despedir'})
 
-@app.route('/fire/mechanic/<int:mechanic_id>')
+@main_bp.route('/fire/mechanic/<int:mechanic_id>')
 @login_required
 def fire_mechanic(mechanic_id):
     mechanic = Mechanic.query.get(mechanic_id)
@@ -1126,14 +1111,23 @@ def fire_mechanic(mechanic_id):
                 'message': f'No tienes suficiente dinero para pagar la indemnización (€{severance_payment:,.0f})'
             })
         
-        # Aplicar el pago
-        current_user.money -= severance_payment
+        # Aplicar el pago a través del libro contable (misma transacción que el despido)
+        FinanceSystem.record_transaction(
+            current_user.id,
+            'expense',
+            'severance',
+            severance_payment,
+            f'Indemnización - {mechanic.name}'
+        )
         
         # Despedir al mecánico
         mechanic.team_id = None
         mechanic.market_available = True
+        mechanic.refresh_value_score()  # Vuelve al mercado con sus atributos actuales
         
         db.session.commit()
+        
+        invalidate_dashboard(current_user.id, 'roster')
         return jsonify({
             'success': True, 
             'message': f'Mecánico despedido. Indemnización pagada: €{severance_payment:,.0f}'
@@ -1141,7 +1135,7 @@ def fire_mechanic(mechanic_id):
     
     return jsonify({'success': False, 'message': 'Error al despedir'})
 
-@app.route('/fire/engineer/<int:engineer_id>')
+@main_bp.route('/fire/engineer/<int:engineer_id>')
 @login_required
 def fire_engineer(engineer_id):
     engineer = Engineer.query.get(engineer_id)
@@ -1160,14 +1154,23 @@ def fire_engineer(engineer_id):
                 'message': f'No tienes suficiente dinero para pagar la indemnización (€{severance_payment:,.0f})'
             })
         
-        # Aplicar el pago
-        current_user.money -= severance_payment
+        # Aplicar el pago a través del libro contable (misma transacción que el despido)
+        FinanceSystem.record_transaction(
+            current_user.id,
+            'expense',
+            'severance',
+            severance_payment,
+            f'Indemnización - {engineer.name}'
+        )
         
         # Despedir al ingeniero
         engineer.team_id = None
         engineer.market_available = True
+        engineer.refresh_value_score()  # Vuelve al mercado con sus atributos actuales
         
         db.session.commit()
+        
+        invalidate_dashboard(current_user.id, 'roster')
         return jsonify({
             'success': True, 
             'message': f'Ingeniero despedido. Indemnización pagada: €{severance_payment:,.0f}'
@@ -1175,7 +1178,7 @@ def fire_engineer(engineer_id):
     
     return jsonify({'success': False, 'message': 'Error al despedir'})
 
-@app.route('/upgrades')
+@main_bp.route('/upgrades')
 @login_required
 def upgrades():
     # Obtener mejora activa
@@ -1194,7 +1197,7 @@ def upgrades():
                          active_upgrade=active_upgrade,
                          upgrade_history=upgrade_history)
 
-@app.route('/start_upgrade', methods=['POST'])
+@main_bp.route('/start_upgrade', methods=['POST'])
 @login_required
 def start_upgrade():
     try:
@@ -1253,7 +1256,9 @@ def start_upgrade():
         )
         
         db.session.add(upgrade)
+        note_pending_due(current_user, upgrade.end_date)
         db.session.commit()
+        schedule_due_completion(upgrade.end_date)
         
         return jsonify({
             'success': True,
@@ -1265,7 +1270,7 @@ def start_upgrade():
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Error al iniciar mejora: {str(e)}'})
 
-@app.route('/complete_upgrade/<int:upgrade_id>', methods=['POST'])
+@main_bp.route('/complete_upgrade/<int:upgrade_id>', methods=['POST'])
 @login_required
 def complete_upgrade(upgrade_id):
     upgrade = Upgrade.query.get_or_404(upgrade_id)
@@ -1273,36 +1278,24 @@ def complete_upgrade(upgrade_id):
     # Verificar permisos
     if upgrade.team_id != current_user.id:
         flash('No autorizado', 'danger')
-        return redirect(url_for('upgrades'))
+        return redirect(url_for('main.upgrades'))
     
     # Verificar si la mejora está completa
     if upgrade.progress < 100:
         flash('La mejora aún no está completa', 'warning')
-        return redirect(url_for('upgrades'))
-    
-    # Aplicar mejora al componente
-    component = CarComponent.query.filter_by(
-        team_id=current_user.id,
-        component_type=upgrade.component_type
-    ).first()
-    
-    if component:
-        # Calcular mejoras basadas en el nivel
-        strength_improvement = upgrade.level * 5  # +5, +10, +15
-        reliability_improvement = upgrade.level * 3  # +3, +6, +9
-        
-        component.strength = min(100, component.strength + strength_improvement)
-        component.reliability = min(100, component.reliability + reliability_improvement)
-    
-    # Marcar como completada
-    upgrade.completed = True
+        return redirect(url_for('main.upgrades'))
     
+    # Aplicar mejora al componente y marcar como completada
+    UpgradeSystem.apply_upgrades([upgrade])
     db.session.commit()
+    invalidate_dashboard(current_user.id, 'roster')
     
+    strength_improvement = upgrade.level * UPGRADE_STRENGTH_PER_LEVEL
+    reliability_improvement = upgrade.level * UPGRADE_RELIABILITY_PER_LEVEL
     flash(f'¡Mejora completada! +{strength_improvement} fuerza, +{reliability_improvement} fiabilidad', 'success')
-    return redirect(url_for('upgrades'))
+    return redirect(url_for('main.upgrades'))
 
-@app.route('/training')
+@main_bp.route('/training')
 @login_required
 def training():
     # Obtener entrenamiento activo
@@ -1321,7 +1314,7 @@ def training():
                          active_training=active_training,
                          training_history=training_history)
 
-@app.route('/start_training', methods=['POST'])
+@main_bp.route('/start_training', methods=['POST'])
 @login_required
 def start_training():
     try:
@@ -1397,7 +1390,9 @@ def start_training():
         )
         
         db.session.add(training)
+        note_pending_due(current_user, training.end_date)
         db.session.commit()
+        schedule_due_completion(training.end_date)
         
         return jsonify({
             'success': True,
@@ -1409,7 +1404,7 @@ def start_training():
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Error al iniciar entrenamiento: {str(e)}'})
 
-@app.route('/complete_training/<int:training_id>', methods=['POST'])
+@main_bp.route('/complete_training/<int:training_id>', methods=['POST'])
 @login_required
 def complete_training(training_id):
     training = Training.query.get_or_404(training_id)
@@ -1417,117 +1412,251 @@ def complete_training(training_id):
     # Verificar permisos
     if training.team_id != current_user.id:
         flash('No autorizado', 'danger')
-        return redirect(url_for('training'))
+        return redirect(url_for('main.training'))
     
     # Verificar si el entrenamiento está completo
     if training.progress < 100:
         flash('El entrenamiento aún no está completo', 'warning')
-        return redirect(url_for('training'))
-    
-    # Aplicar mejora al personal
-    staff = None
-    if training.staff_type == 'driver':
-        staff = Driver.query.filter_by(id=training.staff_id, team_id=current_user.id).first()
-    elif training.staff_type == 'mechanic':
-        staff = Mechanic.query.filter_by(id=training.staff_id, team_id=current_user.id).first()
-    elif training.staff_type == 'engineer':
-        staff = Engineer.query.filter_by(id=training.staff_id, team_id=current_user.id).first()
-    
-    if staff:
-        # Calcular mejora basada en el nivel
-        improvement = training.level * 3  # +3, +6, +9 puntos
-        
-        # Aplicar mejora al atributo correspondiente
-        if hasattr(staff, training.attribute):
-            current_value = getattr(staff, training.attribute)
-            new_value = min(100, current_value + improvement)
-            setattr(staff, training.attribute, new_value)
-            
-            # Actualizar fecha de último entrenamiento
-            staff.last_trained = datetime.utcnow().date()
-    
-    # Marcar como completado
-    training.completed = True
+        return redirect(url_for('main.training'))
     
+    # Aplicar mejora al personal y marcar como completado
+    TrainingSystem.apply_trainings([training])
     db.session.commit()
+    invalidate_dashboard(current_user.id, 'roster')
     
+    improvement = training.level * TRAINING_POINTS_PER_LEVEL
     flash(f'¡Entrenamiento completado! +{improvement} {training.attribute}', 'success')
-    return redirect(url_for('training'))
+    return redirect(url_for('main.training'))
+
+# Efecto de mejoras y entrenamientos por nivel (1, 2, 3)
+UPGRADE_STRENGTH_PER_LEVEL = 5     # +5, +10, +15
+UPGRADE_RELIABILITY_PER_LEVEL = 3  # +3, +6, +9
+TRAINING_POINTS_PER_LEVEL = 3      # +3, +6, +9
+
+TRAINABLE_STAFF = {'driver': Driver, 'mechanic': Mechanic, 'engineer': Engineer}
+
+def _capped_increment(column, amount, ceiling=100):
+    """Expresión SQL portable de min(ceiling, column + amount)"""
+    return db.case((column + amount > ceiling, ceiling), else_=column + amount)
+
+def _claim_pending(model, rows):
+    """Marca como completadas las filas que aún no lo estaban y devuelve los ids que marcó esta llamada.
+    
+    El UPDATE ... WHERE completed = false es el cerrojo: si el barrido, otro
+    worker o la ruta manual las completaron antes, no se devuelven y su efecto
+    no se aplica dos veces. No hace commit.
+    """
+    ids = [row.id for row in rows if not row.completed]
+    if not ids:
+        return set()
+    table = model.__table__
+    claim = table.update().where(table.c.completed == False).values(completed=True)
+    if db.engine.dialect.update_returning:
+        return set(db.session.execute(claim.where(table.c.id.in_(ids)).returning(table.c.id)).scalars())
+    return {row_id for row_id in ids if db.session.execute(claim.where(table.c.id == row_id)).rowcount}
 
 # Actualizar el sistema programado para completar entrenamientos
 class TrainingSystem:
     @staticmethod
-    def complete_trainings():
-        """Completa los entrenamientos que han terminado su tiempo"""
-        trainings = Training.query.filter(
-            Training.end_date <= datetime.utcnow(),
-            Training.completed == False
-        ).all()
-        
+    def apply_trainings(trainings):
+        """Aplica y marca como completados los entrenamientos dados.
+
+        Primero se reclaman con _claim_pending y solo se aplican los que
+        reclamó esta llamada; después un UPDATE por (tipo de personal,
+        atributo, nivel) en lugar de una consulta por entrenamiento. No hace commit.
+        """
+        claimed = _claim_pending(Training, trainings)
+        trainings = [training for training in trainings if training.id in claimed]
+        groups = {}
         for training in trainings:
-            # Aplicar mejora (similar a complete_training)
-            staff = None
-            if training.staff_type == 'driver':
-                staff = Driver.query.filter_by(id=training.staff_id, team_id=training.team_id).first()
-            elif training.staff_type == 'mechanic':
-                staff = Mechanic.query.filter_by(id=training.staff_id, team_id=training.team_id).first()
-            elif training.staff_type == 'engineer':
-                staff = Engineer.query.filter_by(id=training.staff_id, team_id=training.team_id).first()
-            
-            if staff:
-                improvement = training.level * 3
-                if hasattr(staff, training.attribute):
-                    current_value = getattr(staff, training.attribute)
-                    new_value = min(100, current_value + improvement)
-                    setattr(staff, training.attribute, new_value)
-                    staff.last_trained = datetime.utcnow().date()
-            
-            training.completed = True
-        
+            key = (training.staff_type, training.attribute, training.level)
+            groups.setdefault(key, []).append((training.staff_id, training.team_id))
+
+        today = datetime.utcnow().date()
+        for (staff_type, attribute, level), staff_keys in groups.items():
+            model = TRAINABLE_STAFF.get(staff_type)
+            if model is None or attribute not in model.__table__.columns:
+                continue
+            column = getattr(model, attribute)
+            model.query.filter(
+                db.tuple_(model.id, model.team_id).in_(staff_keys)
+            ).update({
+                column: _capped_increment(column, level * TRAINING_POINTS_PER_LEVEL),
+                model.last_trained: today
+            }, synchronize_session=False)
+
+        if claimed:
+            # Los objetos ya cargados deben reflejar los cambios hechos en SQL
+            db.session.expire_all()
+        return len(claimed)
+
+    @staticmethod
+    def complete_trainings(team_id=None):
+        """Completa los entrenamientos vencidos (solo lee los que han vencido)"""
+        query = Training.query.filter(
+            Training.completed == False,
+            Training.end_date <= datetime.utcnow()
+        )
+        if team_id is not None:
+            query = query.filter(Training.team_id == team_id)
+        trainings = query.all()
+        if not trainings:
+            return 0
+
+        applied = TrainingSystem.apply_trainings(trainings)
         db.session.commit()
+        for team in {training.team_id for training in trainings}:
+            invalidate_dashboard(team, 'roster')
+        return applied
         
 # Añadir esta clase después de TrainingSystem
 class UpgradeSystem:
     @staticmethod
-    def complete_upgrades():
-        """Completa las mejoras que han terminado su tiempo"""
-        upgrades = Upgrade.query.filter(
-            Upgrade.end_date <= datetime.utcnow(),
-            Upgrade.completed == False
-        ).all()
-        
+    def apply_upgrades(upgrades):
+        """Aplica y marca como completadas las mejoras dadas.
+
+        Primero se reclaman con _claim_pending y solo se aplican las que
+        reclamó esta llamada; después un UPDATE de CarComponent por
+        (componente, nivel) para todos los equipos afectados. No hace commit.
+        """
+        claimed = _claim_pending(Upgrade, upgrades)
+        upgrades = [upgrade for upgrade in upgrades if upgrade.id in claimed]
+        groups = {}
         for upgrade in upgrades:
-            # Aplicar mejora al componente
-            component = CarComponent.query.filter_by(
-                team_id=upgrade.team_id,
-                component_type=upgrade.component_type
-            ).first()
-            
-            if component:
-                # Calcular mejoras basadas en el nivel
-                strength_improvement = upgrade.level * 5  # +5, +10, +15
-                reliability_improvement = upgrade.level * 3  # +3, +6, +9
-                
-                component.strength = min(100, component.strength + strength_improvement)
-                component.reliability = min(100, component.reliability + reliability_improvement)
-            
-            # Marcar como completada
-            upgrade.completed = True
-        
+            groups.setdefault((upgrade.component_type, upgrade.level), []).append(upgrade.team_id)
+
+        for (component_type, level), team_ids in groups.items():
+            CarComponent.query.filter(
+                CarComponent.component_type == component_type,
+                CarComponent.team_id.in_(team_ids)
+            ).update({
+                CarComponent.strength: _capped_increment(CarComponent.strength, level * UPGRADE_STRENGTH_PER_LEVEL),
+                CarComponent.reliability: _capped_increment(CarComponent.reliability, level * UPGRADE_RELIABILITY_PER_LEVEL)
+            }, synchronize_session=False)
+
+        if claimed:
+            db.session.expire_all()
+        return len(claimed)
+
+    @staticmethod
+    def complete_upgrades(team_id=None):
+        """Completa las mejoras vencidas (solo lee las que han vencido)"""
+        query = Upgrade.query.filter(
+            Upgrade.completed == False,
+            Upgrade.end_date <= datetime.utcnow()
+        )
+        if team_id is not None:
+            query = query.filter(Upgrade.team_id == team_id)
+        upgrades = query.all()
+        if not upgrades:
+            return 0
+
+        applied = UpgradeSystem.apply_upgrades(upgrades)
         db.session.commit()
+        for team in {upgrade.team_id for upgrade in upgrades}:
+            invalidate_dashboard(team, 'roster')
+        return applied
+
+def note_pending_due(user, due_at):
+    """Adelanta el próximo vencimiento del equipo si el nuevo es anterior"""
+    if user.next_due_at is None or due_at < user.next_due_at:
+        user.next_due_at = due_at
+
+def settle_team_progress(user, now=None):
+    """Aplica las mejoras y entrenamientos vencidos de un equipo antes de leerlo.
+
+    Con el equipo ya cargado la comprobación es O(1): solo si su próximo
+    vencimiento ha pasado se aplican los pendientes (en lote) y se recalcula
+    el siguiente. Devuelve True si hubo que liquidar.
+    """
+    now = now or datetime.utcnow()
+    if user.next_due_at is None or user.next_due_at > now:
+        return False
 
-# Actualizar la tarea programada para mejoras
-def scheduled_upgrade_completion():
-    with app.app_context():
-        UpgradeSystem.complete_upgrades()
+    upgrades = Upgrade.query.filter(
+        Upgrade.team_id == user.id,
+        Upgrade.completed == False,
+        Upgrade.end_date <= now
+    ).all()
+    trainings = Training.query.filter(
+        Training.team_id == user.id,
+        Training.completed == False,
+        Training.end_date <= now
+    ).all()
+    UpgradeSystem.apply_upgrades(upgrades)
+    TrainingSystem.apply_trainings(trainings)
+
+    # Nueva marca de agua: siguiente vencimiento entre lo que sigue pendiente
+    next_upgrade, next_training = db.session.query(
+        db.select(db.func.min(Upgrade.end_date)).where(
+            Upgrade.team_id == user.id, Upgrade.completed == False
+        ).scalar_subquery(),
+        db.select(db.func.min(Training.end_date)).where(
+            Training.team_id == user.id, Training.completed == False
+        ).scalar_subquery()
+    ).one()
+    pending = [due for due in (next_upgrade, next_training) if due is not None]
+    user.next_due_at = min(pending) if pending else None
+    user.settled_at = now
+    db.session.commit()
+
+    if upgrades or trainings:
+        invalidate_dashboard(user.id, 'roster')
+    return True
+
+@main_bp.before_app_request
+def settle_current_team():
+    """Antes de cualquier vista, el equipo del usuario queda al día"""
+    if request.endpoint == 'static' or not current_user.is_authenticated:
+        return
+    try:
+        settle_team_progress(current_user)
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error liquidando progreso del equipo {current_user.id}: {str(e)}")
+
+# Cada cuánto el líder consulta los vencimientos en la base de datos. Así se
+# completan en segundos aunque la mejora o el entrenamiento se creara en otro
+# proceso (sin trabajo 'date' en el scheduler del líder)
+DUE_POLL_SECONDS = 5
 
-# Actualizar la tarea programada
-def scheduled_training_completion():
+def scheduled_due_completions():
+    """Completa mejoras y entrenamientos vencidos.
+
+    Lo lanzan el sondeo cada DUE_POLL_SECONDS y los trabajos 'date' de
+    vencimientos creados en el propio líder. Sin vencidos son dos consultas
+    por el índice (completed, end_date).
+    """
     with app.app_context():
-        TrainingSystem.complete_trainings()
+        upgrades = UpgradeSystem.complete_upgrades()
+        trainings = TrainingSystem.complete_trainings()
+        if upgrades or trainings:
+            print(f"✅ Completados a su hora: {upgrades} mejoras, {trainings} entrenamientos")
+
+def schedule_due_completion(due_at):
+    """Programa un trabajo 'date' para el vencimiento de una mejora/entrenamiento.
+
+    Solo en el líder, y afina la latencia a un segundo. Los vencimientos al
+    mismo segundo comparten trabajo. Lo creado en otros procesos (o antes de
+    reiniciar, ya que los trabajos viven en memoria) lo completa el sondeo
+    del líder, como mucho DUE_POLL_SECONDS después.
+    """
+    if not is_scheduler_leader():
+        return  # El líder lo verá en la base de datos en su siguiente sondeo
+    try:
+        get_scheduler().add_job(
+            scheduled_due_completions, 'date',
+            # due_at es UTC naive (utcnow); el scheduler necesita la zona explícita
+            run_date=(due_at + timedelta(seconds=1)).replace(tzinfo=timezone.utc),
+            id=f"due_completion_{due_at:%Y%m%d%H%M%S}",
+            replace_existing=True,
+            misfire_grace_time=None
+        )
+    except Exception as e:
+        print(f"⚠️ No se pudo programar el vencimiento {due_at}: {str(e)}")
 
 # Añadir una ruta para forzar jubilaciones (para testing)
-@app.route('/admin/retire_staff')
+@main_bp.route('/admin/retire_staff')
 @login_required
 def admin_retire_staff():
     """Ruta administrativa para forzar jubilaciones (solo para testing)"""
@@ -1551,9 +1680,23 @@ def scheduled_aging_update():
     """Actualización programada del envejecimiento del personal"""
     with app.app_context():
         from staff_generator import update_staff_aging
-        update_staff_aging()
-        print("✅ Sistema de envejecimiento del personal actualizado")
+        updated = update_staff_aging()
+        print(f"✅ Sistema de envejecimiento del personal actualizado: {updated['drivers']} pilotos, "
+              f"{updated['mechanics']} mecánicos, {updated['engineers']} ingenieros")
         
+def scheduled_payroll_run():
+    """Liquidación pendiente y cobro programado de nóminas de las carreras ya disputadas"""
+    with app.app_context():
+        # Red de seguridad: liquidar carreras cuyo guardado no llegó a liquidarse
+        for race in SettlementSystem.pending_races():
+            SettlementSystem.settle_race(race.id)
+
+        for race in PayrollSystem.pending_races():
+            payroll_run = PayrollSystem.run_payroll(race.id)
+            if payroll_run:
+                print(f"💶 Nóminas cobradas tras {race.circuit.name}: {payroll_run.teams_charged} equipos, "
+                      f"€{payroll_run.total_amount:,.0f}")
+
 def scheduled_test_cleanup():
     """Limpieza programada de tests antiguos"""
     with app.app_context():
@@ -1561,6 +1704,17 @@ def scheduled_test_cleanup():
         if deleted_count > 0:
             print(f"🧹 {deleted_count} tests antiguos eliminados automáticamente")
             
+def scheduled_results_cleanup():
+    """Borra las versiones de resultados de carrera ya reemplazadas"""
+    with app.app_context():
+        try:
+            deleted_count = RaceResultsSystem.collect_old_versions()
+            if deleted_count > 0:
+                print(f"🧹 {deleted_count} filas de resultados antiguos eliminadas")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error limpiando resultados antiguos: {str(e)}")
+            
 def scheduled_session_starter():
     """Inicia automáticamente las simulaciones cuando llega la hora programada - VERSIÓN CORREGIDA"""
     with app.app_context():
@@ -1574,12 +1728,8 @@ def scheduled_session_starter():
             for race in races:
                 # VERIFICAR CARRERA - Lógica corregida
                 if should_start_session(race.race_session, now):
-                    # Verificar si YA HAY RESULTADOS de carrera (no solo eventos)
-                    existing_race_results = ChampionshipStandings.query.filter_by(
-                        race_id=race.id
-                    ).first()
-                    
-                    if not existing_race_results:
+                    # Verificar si YA HAY RESULTADOS de carrera publicados (no solo eventos)
+                    if race.results_version is None:
                         print(f"🏎️ INICIANDO CARRERA AUTOMÁTICA para {race.circuit.name}")
                         success = start_race_simulation(race.id)
                         if success:
@@ -1633,7 +1783,7 @@ def should_start_session(session_time, current_time):
     
     return should_start
 
-@app.route('/debug/session_status')
+@main_bp.route('/debug/session_status')
 @login_required
 def debug_session_status():
     """Diagnóstico del estado de las sesiones programadas"""
@@ -1866,29 +2016,131 @@ def run_race_simulation_wrapper(race_id):
             import traceback
             traceback.print_exc()
 
-# Tareas programadas
-scheduler = BackgroundScheduler()
-
-# Configurar las tareas programadas
-scheduler.add_job(scheduled_training_completion, 'interval', hours=1)
-scheduler.add_job(scheduled_upgrade_completion, 'interval', hours=1)
-scheduler.add_job(scheduled_retirement_check, 'interval', hours=24) # Verificar jubilaciones cada 24 horas
-scheduler.add_job(scheduled_aging_update, 'interval', days=30)
-scheduler.add_job(scheduled_test_cleanup, 'interval', hours=6)  # Cada 6 horas
-scheduler.add_job(scheduled_session_starter, 'interval', minutes=1)
-
 def simulate_scheduled_races():
     """Tarea programada para simular carreras (mantener compatibilidad)"""
     with app.app_context():
         print("🔍 Ejecutando verificación de carreras programadas (legacy)")
         scheduled_session_starter()
 
-scheduler.add_job(simulate_scheduled_races, 'interval', minutes=30)
-
-@app.route('/calendar')
-@login_required
-def calendar():
-    races = Race.query.all()
+# Tareas programadas: el scheduler (y APScheduler) solo se crea cuando un
+# proceso lo necesita, no al importar este módulo
+_scheduler = None
+
+def get_scheduler():
+    """Crea el scheduler con sus tareas la primera vez que se pide"""
+    global _scheduler
+    if _scheduler is None:
+        from apscheduler.schedulers.background import BackgroundScheduler
+        scheduler = BackgroundScheduler(timezone=timezone.utc)  # Todas las fechas del juego son UTC
+
+        # Configurar las tareas programadas
+        scheduler.add_job(scheduled_due_completions, 'interval', seconds=DUE_POLL_SECONDS)  # Sondeo O(vencidos) por índice
+        scheduler.add_job(scheduled_retirement_check, 'interval', hours=24) # Verificar jubilaciones cada 24 horas
+        scheduler.add_job(scheduled_aging_update, 'interval', days=30)
+        scheduler.add_job(scheduled_test_cleanup, 'interval', hours=6)  # Cada 6 horas
+        scheduler.add_job(scheduled_results_cleanup, 'interval', hours=6)
+        scheduler.add_job(scheduled_session_starter, 'interval', minutes=1)
+        scheduler.add_job(scheduled_payroll_run, 'interval', minutes=10)
+        scheduler.add_job(simulate_scheduled_races, 'interval', minutes=30)
+        _scheduler = scheduler
+    return _scheduler
+
+# Elección de líder: solo el proceso que tiene la concesión ejecuta el scheduler
+# (y por tanto las simulaciones automáticas). Funciona entre procesos y máquinas
+# que comparten la base de datos, en Linux y en Windows.
+SCHEDULER_LEASE_NAME = 'scheduler'
+SCHEDULER_LEASE_TTL = 60    # segundos sin renovar hasta que otro proceso puede tomarla
+SCHEDULER_LEASE_RENEW = 20  # cada cuánto la renueva (o intenta conseguirla) cada proceso
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_background_started = False
+
+def acquire_scheduler_lease():
+    """Toma o renueva la concesión del scheduler. Devuelve True si este proceso es líder"""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=SCHEDULER_LEASE_TTL)
+    table = SchedulerLease.__table__
+
+    with db.engine.begin() as conn:
+        renewed = conn.execute(
+            table.update().where(
+                table.c.name == SCHEDULER_LEASE_NAME,
+                db.or_(table.c.holder == INSTANCE_ID, table.c.expires_at < now)
+            ).values(holder=INSTANCE_ID, expires_at=expires_at)
+        ).rowcount
+    if renewed:
+        return True
+
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(table.insert().values(
+                name=SCHEDULER_LEASE_NAME, holder=INSTANCE_ID, expires_at=expires_at
+            ))
+        return True
+    except IntegrityError:
+        return False  # Otro proceso tiene una concesión vigente
+
+def release_scheduler_lease():
+    """Libera la concesión al terminar para que otro proceso tome el relevo enseguida"""
+    table = SchedulerLease.__table__
+    try:
+        with app.app_context(), db.engine.begin() as conn:
+            conn.execute(table.update().where(
+                table.c.name == SCHEDULER_LEASE_NAME,
+                table.c.holder == INSTANCE_ID
+            ).values(expires_at=datetime.utcnow()))
+    except Exception:
+        pass
+
+def is_scheduler_leader():
+    if _scheduler is None:
+        return False
+    from apscheduler.schedulers.base import STATE_PAUSED
+    return _scheduler.running and _scheduler.state != STATE_PAUSED
+
+def set_scheduler_leadership(leader):
+    """Arranca, reanuda o pausa el scheduler según la concesión"""
+    if not leader and _scheduler is None:
+        return
+    from apscheduler.schedulers.base import STATE_PAUSED
+    scheduler = get_scheduler()
+    if leader and not scheduler.running:
+        scheduler.start()
+        print(f"👑 {INSTANCE_ID} es el líder: scheduler iniciado")
+    elif leader and scheduler.state == STATE_PAUSED:
+        scheduler.resume()
+        print(f"👑 {INSTANCE_ID} recupera el liderazgo: scheduler reanudado")
+    elif not leader and is_scheduler_leader():
+        scheduler.pause()
+        print(f"⏸️ {INSTANCE_ID} pierde el liderazgo: scheduler en pausa")
+
+def _scheduler_lease_loop():
+    while True:
+        with app.app_context():
+            try:
+                leader = acquire_scheduler_lease()
+            except Exception as e:
+                print(f"⚠️ Error renovando la concesión del scheduler: {str(e)}")
+                leader = False
+        set_scheduler_leadership(leader)
+        time.sleep(SCHEDULER_LEASE_RENEW)
+
+def start_background_services():
+    """Inicia la elección de líder del scheduler (una vez por proceso)"""
+    global _background_started
+    if _background_started:
+        return
+    _background_started = True
+
+    thread = threading.Thread(target=_scheduler_lease_loop, name='scheduler-lease')
+    thread.daemon = True
+    thread.start()
+    atexit.register(release_scheduler_lease)
+
+@main_bp.route('/calendar')
+@login_required
+def calendar():
+    races = Race.query.all()
     now = datetime.utcnow()
     
     # Encontrar la próxima carrera
@@ -1900,7 +2152,7 @@ def calendar():
     
     return render_template('calendar.html', races=races, next_race=next_race, now=now)
 
-@app.route('/race/<int:race_id>')
+@main_bp.route('/race/<int:race_id>')
 @login_required
 def race_details(race_id):
     race = Race.query.get_or_404(race_id)
@@ -1910,7 +2162,9 @@ def race_details(race_id):
     
     # Obtener resultados de qualifying y carrera para la lógica
     qualifying_results = QualifyingSession.query.filter_by(race_id=race_id).all()
-    race_results = ChampionshipStandings.query.filter_by(race_id=race_id).all()
+    race_results = ChampionshipStandings.query.filter_by(race_id=race_id).filter(
+        RaceResultsSystem.published(ChampionshipStandings)
+    ).all()
     
     # Verificar que el circuito esté cargado
     if not race.circuit:
@@ -1949,7 +2203,7 @@ def race_details(race_id):
                          has_race_events=has_race_events,
                          is_test_window_open=is_test_window_open)
 
-@app.route('/tests/<int:race_id>')
+@main_bp.route('/tests/<int:race_id>')
 @login_required
 def test_session(race_id):
     race = Race.query.get_or_404(race_id)
@@ -1961,7 +2215,7 @@ def test_session(race_id):
     weather_forecasts = WeatherForecast.query.filter_by(race_id=race_id).all()
     return render_template('tests.html', race=race, team=current_user, strategies=strategies, weather_forecasts=weather_forecasts)
 
-@app.route('/race_strategy/<int:race_id>')
+@main_bp.route('/race_strategy/<int:race_id>')
 @login_required
 def race_strategy(race_id):
     race = Race.query.get_or_404(race_id)
@@ -1973,7 +2227,7 @@ def race_strategy(race_id):
     weather_forecasts = WeatherForecast.query.filter_by(race_id=race_id).all()
     return render_template('race_strategy.html', race=race, team=current_user, strategies=strategies, weather_forecasts=weather_forecasts)
 
-@app.route('/save_race_strategy', methods=['POST'])
+@main_bp.route('/save_race_strategy', methods=['POST'])
 @login_required
 def save_race_strategy():
     data = request.json
@@ -2011,7 +2265,7 @@ def save_race_strategy():
     db.session.commit()
     return jsonify({'success': True, 'message': 'Estrategia guardada'})
 
-@app.route('/delete_strategy/<int:strategy_id>')
+@main_bp.route('/delete_strategy/<int:strategy_id>')
 @login_required
 def delete_strategy(strategy_id):
     strategy = RaceStrategy.query.get(strategy_id)
@@ -2024,7 +2278,7 @@ def delete_strategy(strategy_id):
     
     return jsonify({'success': False, 'message': 'Error al eliminar'})
 
-@app.route('/get_tyre_data')
+@main_bp.route('/get_tyre_data')
 @login_required
 def get_tyre_data():
     tyres = TyreType.query.all()
@@ -2038,13 +2292,13 @@ def get_tyre_data():
         }
     return jsonify(tyre_data)
 
-@app.route('/standings')
+@main_bp.route('/standings')
 @login_required
 def standings():
     """Página principal de clasificaciones"""
     return render_template('standings.html')
 
-@app.route('/api/standings/drivers')
+@main_bp.route('/api/standings/drivers')
 @login_required
 def api_driver_standings():
     """API para clasificación de pilotos (totales)"""
@@ -2057,6 +2311,7 @@ def api_driver_standings():
         db.func.count(ChampionshipStandings.id).label('races_entered')
     ).join(ChampionshipStandings, Driver.id == ChampionshipStandings.driver_id
     ).join(User, ChampionshipStandings.team_id == User.id
+    ).filter(RaceResultsSystem.published(ChampionshipStandings)
     ).group_by(Driver.id, Driver.name, User.team_name
     ).order_by(db.desc('total_points')).all()
     
@@ -2072,7 +2327,7 @@ def api_driver_standings():
     
     return jsonify(standings)
 
-@app.route('/api/standings/teams')
+@main_bp.route('/api/standings/teams')
 @login_required
 def api_team_standings():
     """API para clasificación de escuderías (totales)"""
@@ -2083,6 +2338,7 @@ def api_team_standings():
         db.func.sum(ChampionshipStandings.points).label('total_points'),
         db.func.count(ChampionshipStandings.id).label('races_entered')
     ).join(ChampionshipStandings, User.id == ChampionshipStandings.team_id
+    ).filter(RaceResultsSystem.published(ChampionshipStandings)
     ).group_by(User.id, User.team_name
     ).order_by(db.desc('total_points')).all()
     
@@ -2097,7 +2353,7 @@ def api_team_standings():
     
     return jsonify(standings)
 
-@app.route('/api/standings/race/<int:race_id>/drivers')
+@main_bp.route('/api/standings/race/<int:race_id>/drivers')
 @login_required
 def api_race_driver_standings(race_id):
     """API para clasificación de pilotos por carrera específica"""
@@ -2110,7 +2366,7 @@ def api_race_driver_standings(race_id):
         ChampionshipStandings.dnf
     ).join(Driver, ChampionshipStandings.driver_id == Driver.id
     ).join(User, ChampionshipStandings.team_id == User.id
-    ).filter(ChampionshipStandings.race_id == race_id
+    ).filter(ChampionshipStandings.race_id == race_id, RaceResultsSystem.published(ChampionshipStandings)
     ).order_by(ChampionshipStandings.position).all()
     
     standings = []
@@ -2127,7 +2383,7 @@ def api_race_driver_standings(race_id):
     
     return jsonify(standings)
 
-@app.route('/api/standings/race/<int:race_id>/teams')
+@main_bp.route('/api/standings/race/<int:race_id>/teams')
 @login_required
 def api_race_team_standings(race_id):
     """API para clasificación de escuderías por carrera específica"""
@@ -2135,7 +2391,7 @@ def api_race_team_standings(race_id):
         User.team_name,
         db.func.sum(ChampionshipStandings.points).label('race_points')
     ).join(ChampionshipStandings, User.id == ChampionshipStandings.team_id
-    ).filter(ChampionshipStandings.race_id == race_id
+    ).filter(ChampionshipStandings.race_id == race_id, RaceResultsSystem.published(ChampionshipStandings)
     ).group_by(User.team_name
     ).order_by(db.desc('race_points')).all()
     
@@ -2149,7 +2405,7 @@ def api_race_team_standings(race_id):
     
     return jsonify(standings)
 
-@app.route('/api/races')
+@main_bp.route('/api/races')
 @login_required
 def api_races():
     """API para listar todas las carreras"""
@@ -2166,7 +2422,7 @@ def api_races():
     
     return jsonify(races_data)
     
-@app.route('/championship')
+@main_bp.route('/championship')
 @login_required
 def championship():
     """Página de clasificación del campeonato"""
@@ -2182,6 +2438,7 @@ def championship():
         db.func.count(ChampionshipStandings.id).label('races_entered')
     ).join(ChampionshipStandings, Driver.id == ChampionshipStandings.driver_id
     ).join(User, ChampionshipStandings.team_id == User.id
+    ).filter(RaceResultsSystem.published(ChampionshipStandings)
     ).group_by(Driver.id, Driver.name, User.team_name
     ).order_by(db.desc('total_points')).all()
     
@@ -2192,6 +2449,7 @@ def championship():
         db.func.sum(ChampionshipStandings.points).label('total_points'),
         db.func.count(ChampionshipStandings.id).label('races_entered')
     ).join(ChampionshipStandings, User.id == ChampionshipStandings.team_id
+    ).filter(RaceResultsSystem.published(ChampionshipStandings)
     ).group_by(User.id, User.team_name
     ).order_by(db.desc('total_points')).all()
     
@@ -2200,7 +2458,7 @@ def championship():
                          driver_standings=driver_standings,
                          team_standings=team_standings)
                          
-@app.route('/api/simulate_test', methods=['POST'])
+@main_bp.route('/api/simulate_test', methods=['POST'])
 @login_required
 def api_simulate_test():
     """API para simular tests y guardar en base de datos"""
@@ -2252,6 +2510,7 @@ def api_simulate_test():
         
         db.session.add(test)
         db.session.commit()
+        invalidate_tests_leaderboard(test.race_id)
         
         # Verificar el nuevo conteo
         new_count = TestCleanupSystem.get_remaining_tests_count(current_user.id)
@@ -2269,67 +2528,100 @@ def api_simulate_test():
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Error en la simulación: {str(e)}'})
         
-@app.route('/api/tests/leaderboard')
+@main_bp.route('/api/tests/leaderboard')
 @login_required
 def api_tests_leaderboard():
-    """API para obtener la clasificación general de tests - VERSIÓN CORREGIDA"""
+    """API para obtener la clasificación general de tests (mejor vuelta por piloto)"""
     try:
-        print(f"DEBUG: Solicitando leaderboard para usuario: {current_user.id}")
-        
-        # Obtener TODOS los tests ordenados por mejor vuelta
-        leaderboard_query = db.session.query(
-            Test.id,
-            Test.driver_id,
-            Driver.name.label('driver_name'),
-            User.id.label('team_id'),
-            User.team_name,
-            Test.best_lap,
-            Test.total_laps,
-            Test.initial_tyre,
-            Test.created_at
-        ).join(Driver, Test.driver_id == Driver.id
-        ).join(User, Test.team_id == User.id
-        ).order_by(Test.best_lap.asc()).limit(50).all()
-        
-        print(f"DEBUG: Encontrados {len(leaderboard_query)} tests en total")
-        
-        # Para debugging, mostrar todos los tests encontrados
-        for test in leaderboard_query:
-            print(f"DEBUG - Test: driver={test.driver_name}, team={test.team_name}, best_lap={test.best_lap}")
-        
-        leaderboard_data = []
-        seen_drivers = set()  # Para evitar duplicados
-        
-        for i, result in enumerate(leaderboard_query):
-            # Solo mostrar el mejor resultado por piloto
-            if result.driver_id not in seen_drivers:
-                seen_drivers.add(result.driver_id)
-                
-                # Contar cuántos tests tiene este piloto
-                tests_count = Test.query.filter_by(driver_id=result.driver_id).count()
-                
-                leaderboard_data.append({
-                    'position': len(seen_drivers),
-                    'driver_id': result.driver_id,
-                    'driver_name': result.driver_name,
-                    'team_id': result.team_id,
-                    'team_name': result.team_name,
-                    'best_lap': result.best_lap,
-                    'total_laps': result.total_laps,
-                    'initial_tyre': result.initial_tyre,
-                    'tests_count': tests_count,
-                    'created_at': result.created_at.strftime('%Y-%m-%d %H:%M'),
-                    'is_my_team': result.team_id == current_user.id
-                })
+        race_id = request.args.get('race_id', type=int)
+        
+        leaderboard_rows = get_tests_leaderboard(race_id)
+        print(f"DEBUG: Leaderboard (race_id={race_id}) con {len(leaderboard_rows)} pilotos únicos")
         
-        print(f"DEBUG: Leaderboard final con {len(leaderboard_data)} pilotos únicos")
+        # 'is_my_team' depende del usuario, por eso se añade fuera de la caché
+        leaderboard_data = [
+            dict(row, is_my_team=row['team_id'] == current_user.id)
+            for row in leaderboard_rows
+        ]
         return jsonify(leaderboard_data)
         
     except Exception as e:
         print(f"ERROR en api_tests_leaderboard: {str(e)}")
         return jsonify([])
 
-@app.route('/api/tests/my_team')
+# Caché del leaderboard de tests por carrera (None = todas las carreras).
+# Se invalida cada vez que se guarda o elimina un test.
+tests_leaderboard_cache = SharedCache('tests_leaderboard')
+
+def invalidate_tests_leaderboard(race_id=None):
+    """Invalida la caché del leaderboard de una carrera (y la global)"""
+    if race_id is None:
+        tests_leaderboard_cache.invalidate()
+        return
+    tests_leaderboard_cache.invalidate(lambda key: key in (race_id, None))
+
+def get_tests_leaderboard(race_id=None, limit=50):
+    """Calcula el leaderboard de tests en una sola consulta SQL
+    
+    ROW_NUMBER() OVER (PARTITION BY driver_id ORDER BY best_lap) selecciona
+    la mejor vuelta de cada piloto y COUNT() OVER (PARTITION BY driver_id)
+    cuenta sus tests, sin consultas adicionales por piloto.
+    """
+    cached = tests_leaderboard_cache.get(race_id)
+    if cached is not None:
+        return cached
+    
+    ranked_query = db.session.query(
+        Test.driver_id,
+        Test.team_id,
+        Test.best_lap,
+        Test.total_laps,
+        Test.initial_tyre,
+        Test.created_at,
+        db.func.row_number().over(
+            partition_by=Test.driver_id,
+            order_by=(Test.best_lap.asc(), Test.created_at.asc())
+        ).label('driver_rank'),
+        db.func.count(Test.id).over(partition_by=Test.driver_id).label('tests_count')
+    )
+    if race_id is not None:
+        ranked_query = ranked_query.filter(Test.race_id == race_id)
+    ranked = ranked_query.subquery()
+    
+    rows = db.session.query(
+        ranked.c.driver_id,
+        Driver.name.label('driver_name'),
+        User.id.label('team_id'),
+        User.team_name,
+        ranked.c.best_lap,
+        ranked.c.total_laps,
+        ranked.c.initial_tyre,
+        ranked.c.created_at,
+        ranked.c.tests_count
+    ).join(Driver, ranked.c.driver_id == Driver.id
+    ).join(User, ranked.c.team_id == User.id
+    ).filter(ranked.c.driver_rank == 1
+    ).order_by(ranked.c.best_lap.asc()).limit(limit).all()
+    
+    leaderboard = []
+    for position, row in enumerate(rows, start=1):
+        leaderboard.append({
+            'position': position,
+            'driver_id': row.driver_id,
+            'driver_name': row.driver_name,
+            'team_id': row.team_id,
+            'team_name': row.team_name,
+            'best_lap': row.best_lap,
+            'total_laps': row.total_laps,
+            'initial_tyre': row.initial_tyre,
+            'tests_count': row.tests_count,
+            'created_at': row.created_at.strftime('%Y-%m-%d %H:%M')
+        })
+    
+    tests_leaderboard_cache.set(race_id, leaderboard)
+    return leaderboard
+
+@main_bp.route('/api/tests/my_team')
 @login_required
 def api_my_team_tests():
     """API para obtener los tests del equipo actual - VERSIÓN CORREGIDA"""
@@ -2387,7 +2679,7 @@ def api_my_team_tests():
             'total_tests': 0
         })
 
-@app.route('/api/tests/my_team/count')
+@main_bp.route('/api/tests/my_team/count')
 @login_required
 def api_my_team_tests_count():
     """API para obtener el número de tests activos del equipo"""
@@ -2408,148 +2700,9 @@ def api_my_team_tests_count():
             'remaining': 5
         })
 
-@app.route('/finances')
-@login_required
-def finances():
-    """Página principal de finanzas"""
-    # Obtener transacciones recientes
-    recent_transactions = FinancialTransaction.query.filter_by(
-        team_id=current_user.id
-    ).order_by(FinancialTransaction.created_at.desc()).limit(50).all()
-    
-    # Calcular gastos mensuales en salarios
-    monthly_salary_cost = 0
-    for driver in current_user.drivers:
-        monthly_salary_cost += driver.salary
-    for mechanic in current_user.mechanics:
-        monthly_salary_cost += mechanic.salary
-    for engineer in current_user.engineers:
-        monthly_salary_cost += engineer.salary
-    
-    # Calcular totales
-    total_income = sum(t.amount for t in recent_transactions if t.transaction_type == 'income')
-    total_expenses = sum(t.amount for t in recent_transactions if t.transaction_type == 'expense')
-    net_balance = total_income - total_expenses
-    
-    return render_template('finances.html',
-                         transactions=recent_transactions,
-                         monthly_salary_cost=monthly_salary_cost,
-                         total_income=total_income,
-                         total_expenses=total_expenses,
-                         net_balance=net_balance)
-
-@app.route('/api/finances/transactions')
-@login_required
-def api_finance_transactions():
-    """API para obtener transacciones con filtros"""
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
-    
-    # Filtros
-    transaction_type = request.args.get('type')
-    category = request.args.get('category')
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    
-    query = FinancialTransaction.query.filter_by(team_id=current_user.id)
-    
-    if transaction_type and transaction_type != 'all':
-        query = query.filter_by(transaction_type=transaction_type)
-    
-    if category and category != 'all':
-        query = query.filter_by(category=category)
-    
-    if start_date:
-        try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d')
-            query = query.filter(FinancialTransaction.created_at >= start_date)
-        except ValueError:
-            pass
-    
-    if end_date:
-        try:
-            end_date = datetime.strptime(end_date, '%Y-%m-%d')
-            query = query.filter(FinancialTransaction.created_at <= end_date)
-        except ValueError:
-            pass
-    
-    transactions = query.order_by(FinancialTransaction.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
-    
-    transactions_data = []
-    for transaction in transactions.items:
-        transactions_data.append({
-            'id': transaction.id,
-            'type': transaction.transaction_type,
-            'category': transaction.category,
-            'amount': transaction.amount,
-            'description': transaction.description,
-            'balance_after': transaction.balance_after,
-            'date': transaction.created_at.strftime('%d/%m/%Y %H:%M')
-        })
-    
-    return jsonify({
-        'transactions': transactions_data,
-        'total_pages': transactions.pages,
-        'current_page': page,
-        'has_next': transactions.has_next,
-        'has_prev': transactions.has_prev
-    })
-
-@app.route('/api/finances/stats')
-@login_required
-def api_finance_stats():
-    """API para obtener estadísticas financieras"""
-    # Últimos 6 meses
-    cutoff_date = datetime.utcnow() - timedelta(days=180)
-    
-    # Ingresos y gastos por mes
-    monthly_stats = db.session.query(
-        db.func.strftime('%Y-%m', FinancialTransaction.created_at).label('month'),
-        db.func.sum(
-            db.case(
-                (FinancialTransaction.transaction_type == 'income', FinancialTransaction.amount),
-                else_=0
-            )
-        ).label('income'),
-        db.func.sum(
-            db.case(
-                (FinancialTransaction.transaction_type == 'expense', FinancialTransaction.amount),
-                else_=0
-            )
-        ).label('expenses')
-    ).filter(
-        FinancialTransaction.team_id == current_user.id,
-        FinancialTransaction.created_at >= cutoff_date
-    ).group_by('month').order_by('month').all()
-    
-    # Gastos por categoría (último mes)
-    last_month = datetime.utcnow().replace(day=1) - timedelta(days=1)
-    category_stats = db.session.query(
-        FinancialTransaction.category,
-        db.func.sum(FinancialTransaction.amount).label('total')
-    ).filter(
-        FinancialTransaction.team_id == current_user.id,
-        FinancialTransaction.transaction_type == 'expense',
-        db.func.strftime('%Y-%m', FinancialTransaction.created_at) == last_month.strftime('%Y-%m')
-    ).group_by(FinancialTransaction.category).all()
-    
-    return jsonify({
-        'monthly_stats': [{
-            'month': stat.month,
-            'income': stat.income or 0,
-            'expenses': stat.expenses or 0
-        } for stat in monthly_stats],
-        'category_stats': [{
-            'category': stat.category,
-            'total': stat.total or 0
-        } for stat in category_stats]
-    })
-
 # Añadir en app.py después de las rutas existentes
 
-@app.route('/qualifying/<int:race_id>')
+@main_bp.route('/qualifying/<int:race_id>')
 @login_required
 def qualifying_session(race_id):
     """Página de preparación para la clasificación"""
@@ -2636,7 +2789,7 @@ def qualifying_session(race_id):
                          is_fully_prepared=is_fully_prepared,
                          team=current_user)
 
-@app.route('/api/qualifying_results/<int:race_id>')
+@main_bp.route('/api/qualifying_results/<int:race_id>')
 @login_required
 def api_qualifying_results(race_id):
     """API para obtener resultados de clasificación - VERSIÓN MEJORADA CON VUELTAS RÁPIDAS POR SESIÓN"""
@@ -2654,31 +2807,14 @@ def api_qualifying_results(race_id):
         
         print(f"DEBUG: Encontrados {len(results)} resultados de clasificación")
         
-        # Calcular vuelta rápida de Q1 y Q2
-        q1_fastest = None
-        q2_fastest = None
-        q1_cutoff_time = None  # Tiempo del último que pasa a Q2
-        q2_cutoff_time = None  # Tiempo del último que pasa a Q3
-        
-        for result in results:
-            # Vuelta rápida Q1
-            if result.q1_time and (q1_fastest is None or result.q1_time < q1_fastest):
-                q1_fastest = result.q1_time
-            
-            # Vuelta rápida Q2
-            if result.q2_time and (q2_fastest is None or result.q2_time < q2_fastest):
-                q2_fastest = result.q2_time
-        
-        # Calcular tiempos de corte
-        q1_times = [r.q1_time for r in results if r.q1_time is not None]
-        q1_times.sort()
-        if len(q1_times) >= 15:
-            q1_cutoff_time = q1_times[14]  # 15º tiempo (índice 14)
-        
-        q2_times = [r.q2_time for r in results if r.q2_time is not None]
-        q2_times.sort()
-        if len(q2_times) >= 10:
-            q2_cutoff_time = q2_times[9]  # 10º tiempo (índice 9)
+        # Vuelta rápida y tiempo de corte de cada fase, guardados al simular
+        stages = {stage.stage: stage for stage in QualifyingStage.query.filter_by(race_id=race_id).all()}
+        q1_stage = stages.get(1)
+        q2_stage = stages.get(2)
+        q1_fastest = q1_stage.fastest_time if q1_stage else None
+        q2_fastest = q2_stage.fastest_time if q2_stage else None
+        q1_cutoff_time = q1_stage.cutoff_time if q1_stage else None  # Tiempo del último que pasa a Q2
+        q2_cutoff_time = q2_stage.cutoff_time if q2_stage else None  # Tiempo del último que pasa a Q3
         
         results_data = []
         for result in results:
@@ -2725,7 +2861,7 @@ def api_qualifying_results(race_id):
         print(traceback.format_exc())
         return jsonify([])
 
-@app.route('/api/qualifying/tyre_choice', methods=['POST'])
+@main_bp.route('/api/qualifying/tyre_choice', methods=['POST'])
 @login_required
 def set_qualifying_tyre():
     """API para elegir neumáticos de clasificación"""
@@ -2753,32 +2889,20 @@ def set_qualifying_tyre():
         if tyre_choice not in valid_tyres:
             return jsonify({'success': False, 'message': 'Neumático no válido'})
         
-        # Verificar si ya existe una elección
-        existing = QualifyingSession.query.filter_by(
+        # Crear o actualizar la elección en una sola sentencia (clave race_id, team_id, driver_id)
+        insert = upsert_insert(QualifyingSession.__table__).values(
             race_id=race_id,
             team_id=current_user.id,
-            driver_id=driver_id
-        ).first()
-        
-        if existing:
-            # Actualizar elección existente
-            existing.tyre_choice = tyre_choice
-            action = "actualizada"
-            print(f"DEBUG: Eleccion actualizada para piloto {driver_id}")
-        else:
-            # Crear nueva elección
-            qualifying = QualifyingSession(
-                race_id=race_id,
-                team_id=current_user.id,
-                driver_id=driver_id,
-                tyre_choice=tyre_choice
-            )
-            db.session.add(qualifying)
-            action = "guardada"
-            print(f"DEBUG: Nueva eleccion creada para piloto {driver_id}")
-        
+            driver_id=driver_id,
+            tyre_choice=tyre_choice,
+            created_at=datetime.utcnow()
+        )
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=['race_id', 'team_id', 'driver_id'],
+            set_={'tyre_choice': insert.excluded.tyre_choice}
+        ))
         db.session.commit()
-        print(f"DEBUG: Eleccion {action} exitosamente para piloto {driver_id}")
+        print(f"DEBUG: Eleccion guardada exitosamente para piloto {driver_id}")
         
         return jsonify({
             'success': True, 
@@ -2790,7 +2914,7 @@ def set_qualifying_tyre():
         print(f"ERROR: {str(e)}")
         return jsonify({'success': False, 'message': f'Error: {str(e)}'})
         
-@app.route('/debug/qualifying_detailed/<int:race_id>')
+@main_bp.route('/debug/qualifying_detailed/<int:race_id>')
 @login_required
 def debug_qualifying_detailed(race_id):
     """Diagnóstico detallado del problema"""
@@ -2847,7 +2971,7 @@ def debug_qualifying_detailed(race_id):
     
     return jsonify(diagnostic)
     
-@app.route('/debug/qualifying_status/<int:race_id>')
+@main_bp.route('/debug/qualifying_status/<int:race_id>')
 @login_required
 def debug_qualifying_status(race_id):
     """Diagnóstico del estado de la clasificación"""
@@ -2882,7 +3006,7 @@ def debug_qualifying_status(race_id):
         'total_choices': len(qualifying_choices)
     })
         
-@app.route('/api/qualifying/clear_choices', methods=['POST'])
+@main_bp.route('/api/qualifying/clear_choices', methods=['POST'])
 @login_required
 def clear_qualifying_choices():
     """API para limpiar todas las elecciones de neumáticos del equipo"""
@@ -2924,7 +3048,7 @@ def clear_qualifying_choices():
         print(f"ERROR al limpiar elecciones: {str(e)}")
         return jsonify({'success': False, 'message': f'Error al limpiar elecciones: {str(e)}'})
         
-@app.route('/api/qualifying/clear_driver_choice', methods=['POST'])
+@main_bp.route('/api/qualifying/clear_driver_choice', methods=['POST'])
 @login_required
 def clear_driver_qualifying_choice():
     """API para limpiar la elección de neumáticos de un piloto específico"""
@@ -2963,7 +3087,7 @@ def clear_driver_qualifying_choice():
         print(f"ERROR al limpiar elección individual: {str(e)}")
         return jsonify({'success': False, 'message': f'Error al eliminar elección: {str(e)}'})
 
-@app.route('/simulate_qualifying/<int:race_id>')
+@main_bp.route('/simulate_qualifying/<int:race_id>')
 @login_required
 def simulate_qualifying(race_id):
     """Simular la sesión de clasificación"""
@@ -2980,24 +3104,9 @@ def simulate_qualifying(race_id):
             session_type='qualifying'
         ).first()
         
-        # Simular Q1, Q2, Q3
-        results = simulate_qualifying_session(qualifying_choices, weather)
-        
-        # Guardar resultados
-        for result in results:
-            qualifying = QualifyingSession.query.filter_by(
-                race_id=race_id,
-                team_id=result['team_id'],
-                driver_id=result['driver_id']
-            ).first()
-            
-            if qualifying:
-                qualifying.q1_time = result['q1_time']
-                qualifying.q2_time = result.get('q2_time')
-                qualifying.q3_time = result.get('q3_time')
-                qualifying.final_position = result['final_position']
-        
-        db.session.commit()
+        # Simular Q1, Q2, Q3 y guardar resultados, fases y eventos
+        time_model = WeatherTimeModel(weather.condition if weather else None)
+        results = run_qualifying_engine(race_id, qualifying_choices, time_model)
         
         return jsonify({
             'success': True,
@@ -3009,137 +3118,7 @@ def simulate_qualifying(race_id):
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Error en la simulación: {str(e)}'})
 
-def simulate_qualifying_session(qualifying_choices, weather):
-    """Simula las tres partes de la clasificación"""
-    results = []
-    
-    # Simular Q1 - Todos los pilotos
-    q1_results = []
-    for choice in qualifying_choices:
-        base_time = calculate_base_qualifying_time(choice.driver, choice.team, choice.tyre_choice, weather)
-        q1_time = apply_weather_effects(base_time, choice.tyre_choice, weather)
-        q1_results.append({
-            'team_id': choice.team_id,
-            'driver_id': choice.driver_id,
-            'driver_name': choice.driver.name,
-            'team_name': choice.team.team_name,
-            'tyre_choice': choice.tyre_choice,
-            'q1_time': q1_time
-        })
-    
-    # Ordenar Q1 y eliminar los más lentos (top 15 pasan a Q2)
-    q1_results.sort(key=lambda x: x['q1_time'])
-    q2_participants = q1_results[:15]
-    
-    # Simular Q2
-    for participant in q2_participants:
-        base_time = calculate_base_qualifying_time(
-            Driver.query.get(participant['driver_id']),
-            User.query.get(participant['team_id']),
-            participant['tyre_choice'],
-            weather
-        )
-        q2_time = apply_weather_effects(base_time, participant['tyre_choice'], weather)
-        participant['q2_time'] = q2_time
-    
-    # Ordenar Q2 y eliminar los más lentos (top 10 pasan a Q3)
-    q2_participants.sort(key=lambda x: x['q2_time'])
-    q3_participants = q2_participants[:10]
-    
-    # Simular Q3
-    for participant in q3_participants:
-        base_time = calculate_base_qualifying_time(
-            Driver.query.get(participant['driver_id']),
-            User.query.get(participant['team_id']),
-            participant['tyre_choice'],
-            weather
-        )
-        q3_time = apply_weather_effects(base_time, participant['tyre_choice'], weather)
-        participant['q3_time'] = q3_time
-    
-    # Ordenar final por Q3 (o Q2 si no hay Q3)
-    q3_participants.sort(key=lambda x: x.get('q3_time', x['q2_time']))
-    
-    # Asignar posiciones finales
-    for i, participant in enumerate(q3_participants):
-        participant['final_position'] = i + 1
-    
-    # Combinar todos los resultados
-    all_participants = q3_participants + [p for p in q1_results if p not in q3_participants]
-    for i, participant in enumerate(all_participants):
-        if 'final_position' not in participant:
-            participant['final_position'] = i + 1
-    
-    return all_participants
-
-def calculate_base_qualifying_time(driver, team, tyre_choice, weather):
-    """Calcula el tiempo base para una vuelta de clasificación"""
-    # Tiempo base según circuito (aproximado)
-    base_time = 85.0  # 1:25.000 como referencia
-    
-    # Efecto del piloto
-    driver_skill = (driver.skill + driver.experience) / 2
-    driver_effect = (100 - driver_skill) / 200  # Mejor piloto = menos tiempo
-    
-    # Efecto del coche
-    car_performance = sum(comp.strength for comp in team.car_components) / 4
-    car_effect = (100 - car_performance) / 150
-    
-    # Efecto del neumático
-    tyre_effects = {
-        'soft': -2.0,    # Más rápido
-        'medium': -1.0,  # Intermedio
-        'hard': 0.0,     # Neutral
-        'wet': 8.0,      # Más lento en seco
-        'extreme_wet': 12.0  # Mucho más lento en seco
-    }
-    tyre_effect = tyre_effects.get(tyre_choice, 0.0)
-    
-    # Ajustar neumático según condiciones
-    if weather and weather.condition != 'dry':
-        if weather.condition == 'light_rain':
-            if tyre_choice in ['soft', 'medium', 'hard']:
-                tyre_effect += 15.0  # Muy lento con neumáticos de seco en lluvia
-            elif tyre_choice == 'wet':
-                tyre_effect = 2.0    # Bueno para lluvia ligera
-            else:  # extreme_wet
-                tyre_effect = 4.0    # Demasiado conservador
-        elif weather.condition == 'heavy_rain':
-            if tyre_choice in ['soft', 'medium', 'hard']:
-                tyre_effect += 25.0  # Extremadamente lento/peligroso
-            elif tyre_choice == 'wet':
-                tyre_effect += 8.0   # Riesgoso en lluvia intensa
-            else:  # extreme_wet
-                tyre_effect = 3.0    # Ideal para lluvia intensa
-    
-    # Factor aleatorio
-    random_factor = random.uniform(-0.5, 0.5)
-    
-    # Cálculo final
-    final_time = base_time - driver_effect - car_effect + tyre_effect + random_factor
-    return round(final_time, 3)
-
-def apply_weather_effects(base_time, tyre_choice, weather):
-    """Aplica efectos meteorológicos adicionales"""
-    if not weather:
-        return base_time
-    
-    time_penalty = 0
-    
-    # Penalizaciones por neumático incorrecto
-    if weather.condition == 'light_rain' and tyre_choice in ['soft', 'medium', 'hard']:
-        time_penalty += random.uniform(2.0, 5.0)  # Alta penalización
-    elif weather.condition == 'heavy_rain' and tyre_choice != 'extreme_wet':
-        time_penalty += random.uniform(5.0, 10.0) # Penalización muy alta
-    
-    # Variabilidad por condiciones
-    if weather.condition != 'dry':
-        variability = random.uniform(-1.0, 3.0)
-        time_penalty += variability
-    
-    return round(base_time + time_penalty, 3)
-    
-@app.route('/qualifying_results/<int:race_id>')
+@main_bp.route('/qualifying_results/<int:race_id>')
 @login_required
 def qualifying_results(race_id):
     """Página de resultados de clasificación"""
@@ -3154,7 +3133,7 @@ def qualifying_results(race_id):
 
 # Añadir después de las rutas existentes en app.py
 
-@app.route('/live_session/<int:race_id>/<session_type>')
+@main_bp.route('/live_session/<int:race_id>/<session_type>')
 @login_required
 def live_session(race_id, session_type):
     """Página unificada de transmisión en vivo para quali y carrera"""
@@ -3182,7 +3161,7 @@ def live_session(race_id, session_type):
                          session_status=session_status,
                          session_time=session_time)
 
-@app.route('/api/live_session_events/<int:race_id>/<session_type>')
+@main_bp.route('/api/live_session_events/<int:race_id>/<session_type>')
 @login_required
 def live_session_events(race_id, session_type):
     """API para eventos de transmisión en vivo - FILTRADO PRECISO POR EVENT_TYPE"""
@@ -3275,7 +3254,7 @@ def get_safe_event_title(event_type, driver_name="Piloto"):
     
     return titles.get(event_type, f'Evento: {event_type}')
     
-@app.route('/debug/events/<int:race_id>')
+@main_bp.route('/debug/events/<int:race_id>')
 @login_required
 def debug_events(race_id):
     """Diagnóstico de eventos en la base de datos"""
@@ -3299,7 +3278,7 @@ def debug_events(race_id):
     
     return jsonify(diagnostic)
     
-@app.route('/debug/delete_events/<int:race_id>')
+@main_bp.route('/debug/delete_events/<int:race_id>')
 @login_required
 def debug_delete_events(race_id):
     """Ruta de depuración para eliminar eventos de una carrera específica"""
@@ -3329,7 +3308,7 @@ def debug_delete_events(race_id):
         db.session.rollback()
         return jsonify({'success': False, 'message': f'❌ Error eliminando eventos: {str(e)}'})
 
-@app.route('/api/simulate_qualifying_live/<int:race_id>')
+@main_bp.route('/api/simulate_qualifying_live/<int:race_id>')
 @login_required
 def simulate_qualifying_live(race_id):
     """Inicia la simulación de clasificación en segundo plano"""
@@ -3350,7 +3329,7 @@ def simulate_qualifying_live(race_id):
         return jsonify({
             'success': True,
             'message': '🏁 Simulación de clasificación iniciada en segundo plano',
-            'redirect_url': url_for('live_session', race_id=race_id, session_type='qualifying')
+            'redirect_url': url_for('main.live_session', race_id=race_id, session_type='qualifying')
         })
         
     except Exception as e:
@@ -3371,88 +3350,36 @@ def run_qualifying_simulation(race_id, user_id):
             # LIMPIAR SOLO EVENTOS DE QUALIFYING anteriores
             LiveEvent.query.filter_by(race_id=race_id, session_type='qualifying').delete()
             
-            # Obtener TODOS los equipos registrados que tengan pilotos
-            all_teams = User.query.filter(User.drivers.any()).all()
-            print(f"DEBUG: Equipos encontrados: {len(all_teams)}")
-            
-            # Crear o verificar elecciones de neumáticos para TODOS los pilotos
-            qualifying_choices = []
-            for team in all_teams:
-                for driver in team.drivers:
-                    # Verificar si ya existe elección
-                    existing_choice = QualifyingSession.query.filter_by(
-                        race_id=race_id,
-                        team_id=team.id,
-                        driver_id=driver.id
-                    ).first()
-                    
-                    if existing_choice:
-                        qualifying_choices.append(existing_choice)
-                        print(f"DEBUG: Elección existente - {driver.name}: {existing_choice.tyre_choice}")
-                    else:
-                        # Crear elección automática
-                        tyre_choice = random.choice(['soft', 'medium', 'hard'])
-                        new_choice = QualifyingSession(
-                            race_id=race_id,
-                            team_id=team.id,
-                            driver_id=driver.id,
-                            tyre_choice=tyre_choice
-                        )
-                        db.session.add(new_choice)
-                        qualifying_choices.append(new_choice)
-                        print(f"DEBUG: Nueva elección - {driver.name}: {tyre_choice}")
-            
-            db.session.commit()
-            print(f"DEBUG: Total elecciones preparadas: {len(qualifying_choices)}")
+            # TODOS los pilotos con equipo
+            picks = db.session.query(Driver.team_id, Driver.id).filter(Driver.team_id.isnot(None)).all()
+            print(f"DEBUG: Pilotos con equipo: {len(picks)}")
             
-            # EVENTO DE INICIO DE QUALIFYING
-            start_event = LiveEvent(
-                race_id=race_id,
-                team_id=0,
-                driver_id=0,
-                lap=0,
-                event_type='qualifying_start',
-                description='🏁 SESIÓN DE CLASIFICACIÓN INICIADA - TODOS LOS PILOTOS EN PISTA!',
-                session_type='qualifying'
-            )
-            db.session.add(start_event)
+            # Elección automática para quien no la tenga: un solo INSERT ... ON CONFLICT DO NOTHING
+            if picks:
+                now = datetime.utcnow()
+                db.session.execute(
+                    upsert_insert(QualifyingSession.__table__).on_conflict_do_nothing(
+                        index_elements=['race_id', 'team_id', 'driver_id']
+                    ),
+                    [
+                        {'race_id': race_id, 'team_id': team_id, 'driver_id': driver_id,
+                         'tyre_choice': random.choice(['soft', 'medium', 'hard']), 'created_at': now}
+                        for team_id, driver_id in picks
+                    ]
+                )
             db.session.commit()
             
-            # SIMULAR Q1, Q2, Q3 CON EL MOTOR MEJORADO
-            final_results = simulate_qualifying_with_engine(qualifying_choices, race_id)
-            
-            # GUARDAR RESULTADOS EN LA BASE DE DATOS
-            for i, result in enumerate(final_results):
-                qualifying = QualifyingSession.query.filter_by(
-                    race_id=race_id,
-                    team_id=result['team_id'],
-                    driver_id=result['driver_id']
-                ).first()
-                
-                if qualifying:
-                    qualifying.q1_time = result.get('q1_time')
-                    qualifying.q2_time = result.get('q2_time')
-                    qualifying.q3_time = result.get('q3_time')
-                    qualifying.final_position = i + 1
-            
-            # EVENTO FINAL DE QUALIFYING CON POLE
-            if final_results:
-                pole_winner = final_results[0]
-                # Obtener el mejor tiempo del pole winner
-                pole_time = pole_winner.get("q3_time", pole_winner.get("q2_time", pole_winner.get("q1_time", 0)))
-                
-                pole_event = LiveEvent(
-                    race_id=race_id,
-                    team_id=pole_winner['team_id'],
-                    driver_id=pole_winner['driver_id'],
-                    lap=0,
-                    event_type='qualifying_pole',
-                    description=f'🏆 {pole_winner["driver_name"]} CONSIGUE LA POLE POSITION! - {format_lap_time(pole_time)}',
-                    session_type='qualifying'
-                )
-                db.session.add(pole_event)
+            # Elecciones de los pilotos que siguen en el equipo con el que eligieron
+            qualifying_choices = QualifyingSession.query.join(
+                Driver, Driver.id == QualifyingSession.driver_id
+            ).filter(
+                QualifyingSession.race_id == race_id,
+                Driver.team_id == QualifyingSession.team_id
+            ).order_by(QualifyingSession.team_id, QualifyingSession.driver_id).all()
+            print(f"DEBUG: Total elecciones preparadas: {len(qualifying_choices)}")
             
-            db.session.commit()
+            # SIMULAR Q1, Q2, Q3 CON EL MOTOR DE COMPONENTES Y GUARDAR RESULTADOS
+            run_qualifying_engine(race_id, qualifying_choices, ComponentTimeModel())
             print(f"✅ Simulación completada para carrera {race_id}")
             
         except Exception as e:
@@ -3461,297 +3388,99 @@ def run_qualifying_simulation(race_id, user_id):
             import traceback
             traceback.print_exc()
 
-def simulate_qualifying_with_engine(qualifying_choices, race_id):
-    """Simula clasificación con componentes del coche - VERSIÓN MEJORADA"""
-    import random
-    
-    print(f"DEBUG: Simulando clasificación MEJORADA para {len(qualifying_choices)} pilotos")
-    
-    # LIMPIAR EVENTOS ANTERIORES DE QUALIFYING
-    LiveEvent.query.filter_by(race_id=race_id, session_type='qualifying').delete()
-    
-    # EVENTO DE INICIO
-    start_event = LiveEvent(
-        race_id=race_id,
-        team_id=0,
-        driver_id=0,
-        lap=0,
-        event_type='qualifying_start',
-        description='🏁 INICIO DE CLASIFICACIÓN - Q1 COMIENZA!',
-        session_type='qualifying'
-    )
-    db.session.add(start_event)
-    db.session.commit()
-    
-    # SIMULAR Q1 - TODOS LOS PILOTOS CON COMPONENTES
-    print("=== Q1 INICIADO (CON COMPONENTES) ===")
-    q1_results = []
-    
-    for choice in qualifying_choices:
-        # OBTENER COMPONENTES DEL COCHE
-        car_components = CarComponent.query.filter_by(
-            team_id=choice.team_id
-        ).all()
-        
-        # CALCULAR RENDIMIENTO DEL COCHE
-        car_performance = calculate_car_performance(car_components)
-        
-        # CALCULAR TIEMPO BASE CON COMPONENTES
-        base_time = calculate_qualifying_base_time(choice.tyre_choice)
-        
-        # EFECTO DEL PILOTO (más fuerte en clasificación)
-        driver_effect = (100 - choice.driver.skill) / 80
-        
-        # EFECTO DEL COCHE (strength afecta directamente)
-        car_effect = (car_performance['strength'] - 50) * -0.015  # Efecto amplificado en clasificación
-        
-        # VARIABILIDAD REDUCIDA EN CLASIFICACIÓN
-        consistency_variation = (100 - choice.driver.consistency) / 300
-        random_variation = (random.random() - 0.5) * 0.8
-        
-        # CÁLCULO FINAL
-        q1_time = base_time - driver_effect - car_effect + consistency_variation + random_variation
-        
-        q1_results.append({
-            'team_id': choice.team_id,
-            'driver_id': choice.driver_id,
-            'driver_name': choice.driver.name,
-            'team_name': choice.team.team_name,
-            'tyre_choice': choice.tyre_choice,
-            'q1_time': q1_time,
-            'driver_skill': choice.driver.skill,
-            'car_performance': car_performance,
-            'car_components': [comp.component_type for comp in car_components]
-        })
-        
-        # EVENTO DE VUELTA RÁPIDA OCASIONAL
-        if random.random() < 0.3:  # 30% de probabilidad de evento por piloto
-            event = LiveEvent(
-                race_id=race_id,
-                team_id=choice.team_id,
-                driver_id=choice.driver_id,
-                lap=1,
-                event_type='qualifying_fast_lap',
-                description=f'🚀 {choice.driver.name} marca {format_lap_time(q1_time)} en Q1',
-                session_type='qualifying'
-            )
-            db.session.add(event)
-    
-    db.session.commit()
-    
-    # Ordenar Q1 y eliminar los más lentos
-    q1_results.sort(key=lambda x: x['q1_time'])
-    q2_participants = q1_results[:15] if len(q1_results) > 15 else q1_results
-    eliminated_q1 = q1_results[15:] if len(q1_results) > 15 else []
-    
-    # CALCULAR VUELTA RÁPIDA Y CORTE DE Q1
-    q1_fastest = min([r['q1_time'] for r in q1_results]) if q1_results else None
-    q1_cutoff_time = q2_participants[-1]['q1_time'] if q2_participants else None
-    
-    # Evento de vuelta rápida Q1
-    if q1_fastest:
-        fastest_q1_driver = next((p for p in q1_results if p['q1_time'] == q1_fastest), None)
-        if fastest_q1_driver:
-            event = LiveEvent(
-                race_id=race_id,
-                team_id=fastest_q1_driver['team_id'],
-                driver_id=fastest_q1_driver['driver_id'],
-                lap=1,
-                event_type='qualifying_fast_lap',
-                description=f'🏆 {fastest_q1_driver["driver_name"]} MARCA LA VUELTA RÁPIDA DE Q1: {format_lap_time(q1_fastest)}!',
-                session_type='qualifying'
-            )
-            db.session.add(event)
-    
-    # Evento de corte Q1
-    if q1_cutoff_time:
-        cutoff_q1_driver = next((p for p in q1_results if p['q1_time'] == q1_cutoff_time), None)
-        if cutoff_q1_driver:
-            event = LiveEvent(
-                race_id=race_id,
-                team_id=cutoff_q1_driver['team_id'],
-                driver_id=cutoff_q1_driver['driver_id'],
-                lap=1,
-                event_type='qualifying_eliminated',
-                description=f'⏰ {cutoff_q1_driver["driver_name"]} ES EL ÚLTIMO EN PASAR A Q2: {format_lap_time(q1_cutoff_time)}',
-                session_type='qualifying'
-            )
-            db.session.add(event)
-    
-    # Evento de eliminación Q1
-    if eliminated_q1:
-        elimination_event = LiveEvent(
-            race_id=race_id,
-            team_id=0,
-            driver_id=0,
-            lap=1,
-            event_type='qualifying_end',
-            description=f'🏁 Q1 FINALIZADO - {len(eliminated_q1)} pilotos eliminados',
-            session_type='qualifying'
-        )
-        db.session.add(elimination_event)
-    
-    db.session.commit()
-    
-    # SIMULAR Q2 - TOP 15
-    print("=== Q2 INICIADO (CON COMPONENTES) ===")
-    q2_results = []
-    
-    for participant in q2_participants:
-        # MEJORA EN Q2 (pilotos presionan más)
-        q2_improvement = random.uniform(0.3, 1.0)
-        q2_time = participant['q1_time'] - q2_improvement
-        q2_time = max(74.0, q2_time)
-        participant['q2_time'] = q2_time
-        q2_results.append(participant)
-        
-        # EVENTO DE MEJORA
-        if random.random() < 0.4:
-            event = LiveEvent(
-                race_id=race_id,
-                team_id=participant['team_id'],
-                driver_id=participant['driver_id'],
-                lap=2,
-                event_type='qualifying_fast_lap',
-                description=f'💨 {participant["driver_name"]} mejora a {q2_time:.3f}s en Q2',
-                session_type='qualifying'
-            )
-            db.session.add(event)
-    
-    # Ordenar Q2 y eliminar los más lentos
-    q2_results.sort(key=lambda x: x['q2_time'])
-    q3_participants = q2_results[:10] if len(q2_results) > 10 else q2_results
-    eliminated_q2 = q2_results[10:] if len(q2_results) > 10 else []
-    
-    # CALCULAR VUELTA RÁPIDA Y CORTE DE Q2
-    q2_fastest = min([r['q2_time'] for r in q2_results]) if q2_results else None
-    q2_cutoff_time = q3_participants[-1]['q2_time'] if q3_participants else None
-    
-    # Evento de vuelta rápida Q2
-    if q2_fastest:
-        fastest_q2_driver = next((p for p in q2_results if p['q2_time'] == q2_fastest), None)
-        if fastest_q2_driver:
-            event = LiveEvent(
-                race_id=race_id,
-                team_id=fastest_q2_driver['team_id'],
-                driver_id=fastest_q2_driver['driver_id'],
-                lap=2,
-                event_type='qualifying_fast_lap',
-                description=f'🏆 {fastest_q2_driver["driver_name"]} MARCA LA VUELTA RÁPIDA DE Q2: {format_lap_time(q2_fastest)}!',
-                session_type='qualifying'
-            )
-            db.session.add(event)
-    
-    # Evento de corte Q2
-    if q2_cutoff_time:
-        cutoff_q2_driver = next((p for p in q2_results if p['q2_time'] == q2_cutoff_time), None)
-        if cutoff_q2_driver:
-            event = LiveEvent(
-                race_id=race_id,
-                team_id=cutoff_q2_driver['team_id'],
-                driver_id=cutoff_q2_driver['driver_id'],
-                lap=2,
-                event_type='qualifying_eliminated',
-                description=f'⏰ {cutoff_q2_driver["driver_name"]} ES EL ÚLTIMO EN PASAR A Q3: {format_lap_time(q2_cutoff_time)}',
-                session_type='qualifying'
-            )
-            db.session.add(event)
-    
-    # Evento final Q2
-    if eliminated_q2:
-        q2_end = LiveEvent(
-            race_id=race_id,
-            team_id=0,
-            driver_id=0,
-            lap=2,
-            event_type='qualifying_end',
-            description=f'🏁 Q2 FINALIZADO - {len(eliminated_q2)} pilotos eliminados',
-            session_type='qualifying'
+def build_qualifying_entries(picks):
+    """Entradas del motor de clasificación para (team_id, driver_id, tyre_choice), en ese orden.
+    
+    Pilotos, equipos y componentes se cargan con una consulta cada uno.
+    """
+    team_ids = {team_id for team_id, _, _ in picks}
+    drivers = {driver.id: driver for driver in Driver.query.filter(Driver.id.in_({driver_id for _, driver_id, _ in picks}))}
+    team_names = dict(db.session.query(User.id, User.team_name).filter(User.id.in_(team_ids)).all())
+    components = {}
+    for component in CarComponent.query.filter(CarComponent.team_id.in_(team_ids)).all():
+        components.setdefault(component.team_id, []).append(ComponentInput(
+            component_type=component.component_type,
+            strength=component.strength,
+            reliability=component.reliability
+        ))
+    
+    return [
+        QualifyingEntry(
+            team_id=team_id,
+            driver_id=driver_id,
+            driver_name=drivers[driver_id].name,
+            team_name=team_names.get(team_id, ''),
+            tyre_choice=tyre_choice,
+            driver_skill=drivers[driver_id].skill,
+            driver_experience=drivers[driver_id].experience,
+            driver_consistency=drivers[driver_id].consistency,
+            components=tuple(components.get(team_id, ()))
         )
-        db.session.add(q2_end)
-    
-    db.session.commit()
-    
-    # SIMULAR Q3 - TOP 10 (SHOOTOUT)
-    print("=== Q3 INICIADO (CON COMPONENTES) ===")
-    q3_results = []
-    
-    for participant in q3_participants:
-        # MEJORA EN Q3 (máximo esfuerzo)
-        q3_improvement = random.uniform(0.5, 1.5)
-        q3_time = participant['q2_time'] - q3_improvement
-        q3_time = max(73.0, q3_time)
-        participant['q3_time'] = q3_time
-        q3_results.append(participant)
-        
-        # EVENTO DE VUELTA DEFINITIVA
-        event = LiveEvent(
-            race_id=race_id,
-            team_id=participant['team_id'],
-            driver_id=participant['driver_id'],
-            lap=3,
-            event_type='qualifying_fast_lap',
-            description=f'🏎️ {participant["driver_name"]} marca {format_lap_time(q3_time)} en Q3!',
-            session_type='qualifying'
+        for team_id, driver_id, tyre_choice in picks
+    ]
+
+def persist_qualifying(race_id, output):
+    """Guarda tiempos y posiciones, el resumen de cada fase y los eventos del directo"""
+    # Tiempos y posiciones: una sola sentencia UPDATE ejecutada con executemany
+    table = QualifyingSession.__table__
+    rows = []
+    for result in output.results:
+        q1_time, q2_time, q3_time = (result.stage_times + (None,) * 3)[:3]
+        rows.append({
+            'b_team_id': result.team_id, 'b_driver_id': result.driver_id,
+            'b_q1_time': q1_time, 'b_q2_time': q2_time, 'b_q3_time': q3_time,
+            'b_final_position': result.final_position
+        })
+    if rows:
+        db.session.execute(
+            table.update().where(
+                table.c.race_id == race_id,
+                table.c.team_id == bindparam('b_team_id'),
+                table.c.driver_id == bindparam('b_driver_id')
+            ).values(
+                q1_time=bindparam('b_q1_time'), q2_time=bindparam('b_q2_time'),
+                q3_time=bindparam('b_q3_time'), final_position=bindparam('b_final_position')
+            ),
+            rows
         )
-        db.session.add(event)
     
-    # Ordenar Q3 para determinar pole
-    q3_results.sort(key=lambda x: x['q3_time'])
-    pole_winner = q3_results[0] if q3_results else None
-    
-    # Evento final CON pole
-    if q3_results:
-        final_event = LiveEvent(
-            race_id=race_id,
-            team_id=0,
-            driver_id=0,
-            lap=3,
-            event_type='qualifying_end',
-            description=f'🏁 CLASIFICACIÓN FINALIZADA - {pole_winner["driver_name"]} consigue la POLE POSITION con {format_lap_time(pole_winner.get("q3_time", 0))}!',
-            session_type='qualifying'
-        )
-        db.session.add(final_event)
+    QualifyingStage.query.filter_by(race_id=race_id).delete()
+    db.session.bulk_insert_mappings(QualifyingStage, [dict(asdict(stage), race_id=race_id) for stage in output.stages])
     
+    # created_at estrictamente creciente: el directo ordena por created_at
+    LiveEvent.query.filter_by(race_id=race_id, session_type='qualifying').delete()
+    started = datetime.utcnow()
+    db.session.bulk_insert_mappings(LiveEvent, [
+        dict(asdict(event), race_id=race_id, session_type='qualifying', created_at=started + timedelta(microseconds=offset))
+        for offset, event in enumerate(output.events)
+    ])
     db.session.commit()
-    
-    print(f"DEBUG: Clasificación MEJORADA completada - Pole: {pole_winner['driver_name'] if pole_winner else 'N/A'}")
-    
-    # COMBINAR TODOS LOS RESULTADOS FINALES
-    final_results = q3_results + eliminated_q2 + eliminated_q1
-    
-    # ASIGNAR POSICIONES FINALES
-    for i, result in enumerate(final_results):
-        result['final_position'] = i + 1
-    
-    return final_results
-
-def calculate_qualifying_base_time(tyre_choice):
-    """Calcula tiempo base para clasificación según neumático"""
-    base_times = {
-        'soft': 75.0,
-        'medium': 76.5, 
-        'hard': 78.0,
-        'wet': 82.0,
-        'extreme_wet': 85.0
-    }
-    return base_times.get(tyre_choice, 76.0)
 
-def calculate_car_performance(car_components):
-    """Calcula el rendimiento general del coche basado en componentes"""
-    if not car_components:
-        return {'strength': 50, 'reliability': 50}
+def run_qualifying_engine(race_id, qualifying_choices, time_model, seed=None):
+    """Simula la clasificación con el motor de `sim` y la guarda.
+    
+    Es el único camino de clasificación de la app; las entradas sólo eligen el
+    modelo de tiempos. Devuelve los resultados como dicts en orden final, con
+    q1_time, q2_time... por fase disputada.
+    """
+    print(f"DEBUG: Simulando clasificación para {len(qualifying_choices)} pilotos")
+    entries = build_qualifying_entries([
+        (choice.team_id, choice.driver_id, choice.tyre_choice) for choice in qualifying_choices
+    ])
+    rng = random.Random(seed)
+    output = QualifyingSimulation(entries, current_app.config['QUALIFYING_KNOCKOUT'], time_model, rng).run()
+    persist_qualifying(race_id, output)
+    print(f"DEBUG: Clasificación completada - Pole: {output.pole.driver_name if output.pole else 'N/A'}")
     
-    total_strength = sum(comp.strength for comp in car_components)
-    total_reliability = sum(comp.reliability for comp in car_components)
-    component_count = len(car_components)
-    
-    return {
-        'strength': total_strength / component_count,
-        'reliability': total_reliability / component_count
-    }
-
-@app.route('/api/race_results/<int:race_id>')
+    results = []
+    for result in output.results:
+        row = asdict(result)
+        for stage, lap_time in enumerate(row.pop('stage_times'), start=1):
+            row[f'q{stage}_time'] = lap_time
+        results.append(row)
+    return results
+
+@main_bp.route('/api/race_results/<int:race_id>')
 @login_required
 def api_race_results(race_id):
     """API para obtener resultados de carrera"""
@@ -3759,7 +3488,9 @@ def api_race_results(race_id):
         print(f"DEBUG: Solicitando resultados de carrera para carrera {race_id}")
         
         # Obtener resultados de carrera ordenados por posición
-        results = ChampionshipStandings.query.filter_by(race_id=race_id).join(
+        results = ChampionshipStandings.query.filter_by(race_id=race_id).filter(
+            RaceResultsSystem.published(ChampionshipStandings)
+        ).join(
             Driver, ChampionshipStandings.driver_id == Driver.id
         ).join(
             User, ChampionshipStandings.team_id == User.id
@@ -3778,6 +3509,7 @@ def api_race_results(race_id):
                 'points': result.points,
                 'fastest_lap': result.fastest_lap,
                 'dnf': result.dnf,
+                'division': result.division or 1,
                 'status': 'DNF' if result.dnf else 'Finished'
             })
             print(f"DEBUG - Resultado carrera: {result.driver.name}, Pos: {result.position}, Puntos: {result.points}")
@@ -3790,7 +3522,7 @@ def api_race_results(race_id):
         print(traceback.format_exc())
         return jsonify([])
 
-@app.route('/api/simulate_race_live/<int:race_id>')
+@main_bp.route('/api/simulate_race_live/<int:race_id>')
 @login_required
 def simulate_race_live(race_id):
     """Simula carrera usando el motor de simulacion mejorado CON PROBABILIDADES DEL RACE_ENGINE Y ESTRATEGIAS"""
@@ -3879,7 +3611,7 @@ def simulate_race_live(race_id):
             'winner': finished_cars[0]["driver_name"] if finished_cars else None,
             'events_generated': LiveEvent.query.filter_by(race_id=race_id, session_type='race').count(),
             'laps': race.circuit.laps,
-            'redirect_url': url_for('live_session', race_id=race_id, session_type='race')
+            'redirect_url': url_for('main.live_session', race_id=race_id, session_type='race')
         })
         
     except Exception as e:
@@ -3892,542 +3624,198 @@ def simulate_race_live(race_id):
         print(error_trace)
         return jsonify({'success': False, 'message': f'Error en la simulacion: {str(e)}'})
 
-def simulate_race_with_strategies(race_id, qualifying_results, total_laps, race_weather):
-    """Simula carrera usando estrategias definidas o neumáticos por defecto según condiciones"""
-    import random
-    import time
-    
-    print(f"DEBUG: Simulando carrera con ESTRATEGIAS para {len(qualifying_results)} pilotos, {total_laps} vueltas")
-    
-    # Determinar condición climática base
-    weather_condition = race_weather.condition if race_weather else 'dry'
-    print(f"DEBUG: Condición climática: {weather_condition}")
+RACE_LAP_PACING = 0.05  # segundos entre vueltas persistidas, mantiene la sensación de directo
+
+def build_race_input(race_id, qualifying_results, total_laps, race_weather, seed=None):
+    """Carga desde la base de datos la entrada del núcleo de simulación (parrilla, estrategias, clima)"""
+    team_ids = {qualifying.team_id for qualifying in qualifying_results}
+    components = {}
+    for component in CarComponent.query.filter(CarComponent.team_id.in_(team_ids)).all():
+        components.setdefault(component.team_id, []).append(ComponentInput(
+            component_type=component.component_type,
+            strength=component.strength,
+            reliability=component.reliability
+        ))
+    
+    strategies = {
+        (strategy.driver_id, strategy.team_id): strategy
+        for strategy in RaceStrategy.query.filter_by(race_id=race_id).all()
+    }
     
-    # Crear lista de coches en parrilla de salida
     cars = []
-    for i, qualifying in enumerate(qualifying_results):
-        # Obtener componentes del coche
-        car_components = []
-        for component in qualifying.team.car_components:
-            car_components.append({
-                'component_type': component.component_type,
-                'strength': component.strength,
-                'reliability': component.reliability
-            })
-        
-        # Obtener estrategia definida para este piloto
-        strategy = RaceStrategy.query.filter_by(
-            race_id=race_id,
+    for qualifying in qualifying_results:
+        strategy = strategies.get((qualifying.driver_id, qualifying.team_id))
+        strategy_input = None
+        if strategy:
+            strategy_input = StrategyInput(
+                starting_tyre=strategy.starting_tyre,
+                segments=tuple(
+                    StrategySegmentInput(tyre_type=segment.tyre_type, laps_planned=segment.laps_planned)
+                    for segment in sorted(strategy.segments, key=lambda x: x.segment_order)
+                ),
+                rain_strategy=strategy.rain_strategy,
+                heavy_rain_strategy=strategy.heavy_rain_strategy,
+                dry_strategy=strategy.dry_strategy
+            )
+        cars.append(CarInput(
             driver_id=qualifying.driver_id,
-            team_id=qualifying.team_id
-        ).first()
-        
-        # Determinar neumático inicial según estrategia o condiciones climáticas
-        if strategy and strategy.segments:
-            # Usar estrategia definida - primer segmento define neumático de salida
-            starting_tyre = strategy.starting_tyre
-            strategy_segments = sorted(strategy.segments, key=lambda x: x.segment_order)
-            has_strategy = True
-        else:
-            # Sin estrategia definida - usar neumáticos por defecto según condiciones
-            if weather_condition == 'dry':
-                starting_tyre = 'hard'
-            elif weather_condition == 'light_rain':
-                starting_tyre = 'wet'
-            else:  # heavy_rain
-                starting_tyre = 'extreme_wet'
-            strategy_segments = []
-            has_strategy = False
-        
-        car_data = {
-            'qualifying': qualifying,
-            'driver_id': qualifying.driver_id,
-            'driver_name': qualifying.driver.name,
-            'team_id': qualifying.team_id,
-            'team_name': qualifying.team.team_name,
-            'current_tyre': starting_tyre,
-            'current_position': i + 1,
-            'grid_position': i + 1,
-            'lap_times': [],
-            'pit_stops': 0,
-            'car_components': car_components,
-            'incidents': 0,
-            'mechanical_failures': 0,
-            'dnf': False,
-            'dnf_reason': None,
-            'total_time': 0,
-            'driver_skill': qualifying.driver.skill,
-            'driver_consistency': qualifying.driver.consistency,
-            'last_pit_lap': 0,
-            'tyre_wear': 0,
-            'finished': False,
-            'has_strategy': has_strategy,
-            'strategy': strategy,
-            'strategy_segments': strategy_segments,
-            'current_segment': 0,  # Índice del segmento actual
-            'segment_laps_completed': 0,  # Vueltas completadas en el segmento actual
-            'weather_condition': weather_condition,
-            'rain_strategy': strategy.rain_strategy if strategy else 'continue',
-            'heavy_rain_strategy': strategy.heavy_rain_strategy if strategy else 'continue',
-            'dry_strategy': strategy.dry_strategy if strategy else 'continue'
-        }
-        cars.append(car_data)
-    
-    # EVENTO DE INICIO
-    start_event = LiveEvent(
-        race_id=race_id,
-        team_id=0,
-        driver_id=0,
-        lap=1,
-        event_type='race_start',
-        description='LUCES VERDES! LA CARRERA ESTA EN MARCHA!',
-        session_type='race'
-    )
-    db.session.add(start_event)
-    db.session.commit()
-    
-    # SIMULAR VUELTA POR VUELTA
-    for lap in range(1, total_laps + 1):
-        print(f"DEBUG: Vuelta {lap}/{total_laps}")
-        
-        # Ordenar coches por posicion actual (solo los que no han abandonado)
-        active_cars = [car for car in cars if not car['dnf']]
-        active_cars.sort(key=lambda x: x['current_position'])
-        
-        # Actualizar posiciones de los coches activos
-        for i, car in enumerate(active_cars):
-            car['current_position'] = i + 1
-        
-        # Simular eventos de vuelta (solo si hay coches activos)
-        if lap > 1 and active_cars:
-            simulate_lap_events_simple(race_id, active_cars, lap, total_laps)
-        
-        # VERIFICAR FALLAS MECANICAS CON RACE_ENGINE
-        for car in active_cars:
-            check_mechanical_failure(race_id, car, lap, total_laps, cars)
-        
-        # GESTIONAR ESTRATEGIAS Y CAMBIOS DE NEUMÁTICOS
-        manage_race_strategies(race_id, active_cars, lap, total_laps, weather_condition)
-        
-        # Actualizar rendimiento (solo coches activos)
-        update_car_performance_simple(active_cars, lap)
-        
-        # Simular adelantamientos basicos (solo coches activos)
-        simulate_overtakes_simple(race_id, active_cars, lap)
-        
-        # Verificar paradas por desgaste (solo coches activos)
-        check_tyre_wear_pit_stops(race_id, active_cars, lap)
-        
-        # Marcar coches que terminan la carrera
-        if lap == total_laps:
-            for car in active_cars:
-                car['finished'] = True
-                print(f"TERMINO: {car['driver_name']} completa la carrera en posicion {car['current_position']}")
-        
-        # Pequena pausa
-        time.sleep(0.05)
-        
-        # Si no quedan coches activos, terminar la carrera anticipadamente
-        if not active_cars:
-            print("CARRERA TERMINADA ANTICIPADAMENTE - TODOS ABANDONARON")
-            break
-    
-    # CALCULAR RESULTADOS FINALES
-    finished_cars = [car for car in cars if car['finished']]  # Solo los que terminaron
-    dnf_cars = [car for car in cars if car['dnf']]  # Los que abandonaron
-    
-    # Ordenar por tiempo total (solo los que terminaron)
-    finished_cars.sort(key=lambda x: x['total_time'])
-    
-    # Asignar posiciones finales
-    final_results = finished_cars + dnf_cars
-    for i, car in enumerate(final_results):
-        car['final_position'] = i + 1
-        if car['finished']:  # Solo dar puntos a los que terminaron
-            points_system = {1: 25, 2: 18, 3: 15, 4: 12, 5: 10, 6: 8, 7: 6, 8: 4, 9: 2, 10: 1}
-            car['points'] = points_system.get(i + 1, 0)
-            # Vuelta rapida para el ganador (70% probabilidad)
-            if i == 0 and random.random() < 0.7:
-                car['fastest_lap'] = True
-                car['points'] += 1
-            else:
-                car['fastest_lap'] = False
-        else:
-            car['points'] = 0
-            car['fastest_lap'] = False
-    
-    print(f"DEBUG: Simulacion completada - {len(finished_cars)} terminaron, {len(dnf_cars)} abandonos")
-    
-    return final_results
+            driver_name=qualifying.driver.name,
+            team_id=qualifying.team_id,
+            team_name=qualifying.team.team_name,
+            driver_skill=qualifying.driver.skill,
+            driver_consistency=qualifying.driver.consistency,
+            components=tuple(components.get(qualifying.team_id, ())),
+            strategy=strategy_input
+        ))
+    
+    # Línea temporal del clima: pronóstico base + cambios previstos como probables
+    weather = [WeatherPoint(lap=0, condition=race_weather.condition if race_weather else 'dry')]
+    changes = WeatherChange.query.filter_by(race_id=race_id, session_type='race').order_by(WeatherChange.change_lap).all()
+    for change in changes:
+        if change.probability >= 0.5:
+            weather.append(WeatherPoint(lap=change.change_lap, condition=change.to_condition))
+    
+    return RaceInput(total_laps=total_laps, cars=tuple(cars), weather=tuple(weather), seed=seed)
+
+def persist_race_events(race_id, events, pacing=RACE_LAP_PACING):
+    """Guarda los eventos de la simulación vuelta a vuelta para que el directo los vaya mostrando"""
+    for lap, lap_events in groupby(events, key=attrgetter('lap')):
+        # created_at estrictamente creciente: el directo ordena por created_at
+        lap_started = datetime.utcnow()
+        db.session.bulk_insert_mappings(LiveEvent, [
+            {
+                'race_id': race_id,
+                'team_id': event.team_id,
+                'driver_id': event.driver_id,
+                'lap': lap,
+                'event_type': event.event_type,
+                'description': event.description,
+                'session_type': 'race',
+                'created_at': lap_started + timedelta(microseconds=offset)
+            }
+            for offset, event in enumerate(lap_events)
+        ])
+        db.session.commit()
+        if pacing:
+            time.sleep(pacing)
 
-def manage_race_strategies(race_id, active_cars, current_lap, total_laps, current_weather):
-    """Gestiona las estrategias de carrera y cambios de neumáticos"""
-    for car in active_cars:
-        if car['dnf']:
-            continue
-            
-        # Incrementar contador de vueltas en segmento actual
-        car['segment_laps_completed'] += 1
-        
-        # VERIFICAR CAMBIOS CLIMÁTICOS Y APLICAR ESTRATEGIAS
-        check_weather_changes_strategy(race_id, car, current_lap, current_weather)
-        
-        # VERIFICAR FIN DE SEGMENTO DE ESTRATEGIA
-        if car['has_strategy'] and car['strategy_segments']:
-            current_segment_idx = car['current_segment']
-            current_segment = car['strategy_segments'][current_segment_idx]
-            planned_laps = current_segment.laps_planned
-            
-            # Si hemos completado las vueltas planificadas para este segmento
-            if car['segment_laps_completed'] >= planned_laps and current_segment_idx < len(car['strategy_segments']) - 1:
-                # Cambiar al siguiente segmento
-                next_segment_idx = current_segment_idx + 1
-                next_segment = car['strategy_segments'][next_segment_idx]
-                
-                # Realizar parada para cambio de neumáticos
-                execute_strategy_pit_stop(race_id, car, current_lap, 
-                                        current_segment.tyre_type, 
-                                        next_segment.tyre_type,
-                                        f"Estrategia programada: {current_segment.tyre_type} -> {next_segment.tyre_type}")
-                
-                # Actualizar contadores de segmento
-                car['current_segment'] = next_segment_idx
-                car['segment_laps_completed'] = 0
-        
-        # PARA COCHES SIN ESTRATEGIA: Verificar desgaste extremo y cambiar según condiciones
-        elif not car['has_strategy'] and car['tyre_wear'] > 85:
-            # Cambio por desgaste - usar neumático por defecto según condiciones
-            if current_weather == 'dry':
-                new_tyre = 'hard'
-            elif current_weather == 'light_rain':
-                new_tyre = 'wet'
-            else:  # heavy_rain
-                new_tyre = 'extreme_wet'
-            
-            if new_tyre != car['current_tyre']:
-                execute_strategy_pit_stop(race_id, car, current_lap, 
-                                        car['current_tyre'], new_tyre,
-                                        f"Cambio por desgaste: {car['current_tyre']} -> {new_tyre}")
-
-def check_weather_changes_strategy(race_id, car, current_lap, current_weather):
-    """Verifica cambios climáticos y aplica estrategias correspondientes"""
-    # Simular cambio climático aleatorio (en una implementación real, usarías WeatherChange)
-    weather_change_prob = 0.02  # 2% de probabilidad por vuelta de cambio climático
-    
-    if random.random() < weather_change_prob:
-        new_weather = random.choice(['dry', 'light_rain', 'heavy_rain'])
-        if new_weather != current_weather:
-            # Aplicar estrategia según el cambio climático
-            apply_weather_change_strategy(race_id, car, current_lap, current_weather, new_weather)
-
-def apply_weather_change_strategy(race_id, car, current_lap, old_weather, new_weather):
-    """Aplica la estrategia definida para cambios climáticos"""
-    
-    # Determinar neumático apropiado para la nueva condición
-    appropriate_tyre = get_appropriate_tyre_for_weather(new_weather)
-    
-    # Verificar si el neumático actual es apropiado
-    current_tyre_appropriate = is_tyre_appropriate_for_weather(car['current_tyre'], new_weather)
-    
-    if not current_tyre_appropriate:
-        # El neumático actual no es apropiado - aplicar estrategia
-        strategy_to_apply = None
-        
-        if new_weather == 'light_rain':
-            strategy_to_apply = car['rain_strategy']
-        elif new_weather == 'heavy_rain':
-            strategy_to_apply = car['heavy_rain_strategy']
-        elif new_weather == 'dry':
-            strategy_to_apply = car['dry_strategy']
-        
-        # Ejecutar la estrategia
-        if strategy_to_apply == 'pit_wet' and new_weather == 'light_rain':
-            execute_strategy_pit_stop(race_id, car, current_lap, 
-                                    car['current_tyre'], 'wet',
-                                    f"Cambio por lluvia: {car['current_tyre']} -> Wet")
-        
-        elif strategy_to_apply == 'pit_extreme' and new_weather in ['light_rain', 'heavy_rain']:
-            execute_strategy_pit_stop(race_id, car, current_lap, 
-                                    car['current_tyre'], 'extreme_wet',
-                                    f"Cambio por lluvia intensa: {car['current_tyre']} -> Extreme Wet")
-        
-        elif strategy_to_apply == 'immediate_pit':
-            execute_strategy_pit_stop(race_id, car, current_lap, 
-                                    car['current_tyre'], appropriate_tyre,
-                                    f"Boxes inmediato: {car['current_tyre']} -> {appropriate_tyre}")
-        
-        elif strategy_to_apply in ['pit_soft', 'pit_medium'] and new_weather == 'dry':
-            new_tyre = 'soft' if strategy_to_apply == 'pit_soft' else 'medium'
-            execute_strategy_pit_stop(race_id, car, current_lap, 
-                                    car['current_tyre'], new_tyre,
-                                    f"Cambio a seco: {car['current_tyre']} -> {new_tyre}")
-        
-        # Para 'continue' o 'next_pit', no hacer nada - esperar parada programada
-
-def get_appropriate_tyre_for_weather(weather):
-    """Devuelve el neumático apropiado para las condiciones climáticas"""
-    if weather == 'dry':
-        return 'hard'  # Por defecto para coches sin estrategia
-    elif weather == 'light_rain':
-        return 'wet'
-    else:  # heavy_rain
-        return 'extreme_wet'
-
-def is_tyre_appropriate_for_weather(tyre, weather):
-    """Verifica si un neumático es apropiado para las condiciones climáticas"""
-    if weather == 'dry':
-        return tyre in ['soft', 'medium', 'hard']
-    elif weather == 'light_rain':
-        return tyre in ['wet', 'extreme_wet']
-    else:  # heavy_rain
-        return tyre == 'extreme_wet'
-
-def execute_strategy_pit_stop(race_id, car, lap, old_tyre, new_tyre, reason):
-    """Ejecuta una parada en boxes por estrategia"""
-    pit_time = 2.5 + random.uniform(0, 1.0)
-    car['pit_stops'] += 1
-    car['last_pit_lap'] = lap
-    car['tyre_wear'] = 0
-    car['current_tyre'] = new_tyre
-    
-    # Reemplazar caracteres Unicode problemáticos
-    safe_reason = reason.replace('→', '->')
-    
-    event = LiveEvent(
-        race_id=race_id,
-        team_id=car['team_id'],
-        driver_id=car['driver_id'],
-        lap=lap,
-        event_type='race_pit_stop',
-        description=f'BOXES {car["driver_name"]} - {safe_reason} - {pit_time:.1f}s',
-        session_type='race'
-    )
-    db.session.add(event)
-    
-    car['total_time'] += pit_time
-    db.session.commit()
+def simulate_race_with_strategies(race_id, qualifying_results, total_laps, race_weather, seed=None):
+    """Simula carrera usando estrategias definidas o neumáticos por defecto según condiciones.
     
-    print(f"STRATEGY: {car['driver_name']} - {safe_reason} en vuelta {lap}")
+    Adaptador sobre el núcleo puro `sim`: carga la entrada, simula sin tocar la base
+    de datos y después persiste los eventos. Devuelve los resultados como dicts,
+    en orden de clasificación final.
     
-def check_mechanical_failure(race_id, car, current_lap, total_laps, cars):
-    """Verifica fallas mecanicas - PROTECCIÓN CONTRA MÚLTIPLES ABANDONOS DEL MISMO EQUIPO"""
-    from race_engine_bridge import RaceEngineBridge
-    
-    # Solo verificar si el coche no ha abandonado
-    if car['dnf']:
-        return
-    
-    # CONTAR cuántos coches del mismo equipo ya abandonaron
-    team_abandoned_count = sum(1 for c in cars if c['team_id'] == car['team_id'] and c['dnf'])
-    
-    # Calcular riesgo base usando el motor
-    base_risk = RaceEngineBridge.calculate_mechanical_failure_risk(
-        car['car_components'],
-        current_lap,
-        total_laps,
-        car['incidents']
-    )
-    
-    # FACTOR SUERTE DEL PILOTO (habilidad y experiencia reducen riesgo)
-    luck_factor = (car['driver_skill'] + car['driver_consistency']) / 200  # 0.5 a 1.0
-    final_risk = base_risk * (1.3 - luck_factor)  # Pilotos buenos tienen menos riesgo
-    
-    # PROTECCIÓN: Reducir riesgo si ya hay abandonos en el mismo equipo
-    if team_abandoned_count >= 1:
-        final_risk *= 0.3  # 70% menos riesgo si ya hay un abandono en el equipo
-    if team_abandoned_count >= 2:
-        final_risk *= 0.1  # 90% menos riesgo si ya hay dos abandonos
-    
-    # PROTECCIÓN: Reducir riesgo si muchos coches ya abandonaron
-    total_abandoned = sum(1 for c in cars if c['dnf'])
-    if total_abandoned >= len(cars) // 2:  # Si la mitad o más abandonaron
-        final_risk *= 0.2  # 80% menos riesgo
-    
-    # RIESGO MÍNIMO por vuelta (0.02%)
-    final_risk = max(0.0002, final_risk)
-    
-    # Solo mostrar riesgo si es > 0.05%
-    if final_risk > 0.0005:
-        print(f"MECANICA {car['driver_name']} - Riesgo: {final_risk:.4f} en vuelta {current_lap}")
+    Si la parrilla supera Config.RACE_DIVISION_SIZE se parte en divisiones que
+    corren por separado (en un pool de procesos) y puntúan con DIVISION_POINTS.
+    """
+    print(f"DEBUG: Simulando carrera con ESTRATEGIAS para {len(qualifying_results)} pilotos, {total_laps} vueltas")
     
-    # Verificar si ocurre falla (probabilidad muy baja)
-    if random.random() < final_risk:
-        failed_component = RaceEngineBridge.determine_failed_component(car['car_components'])
-        car['dnf'] = True
-        car['dnf_reason'] = f'FALLA MECANICA EN {failed_component.upper()}'
-        car['mechanical_failures'] += 1
-        
-        # Crear evento de abandono
-        event = LiveEvent(
-            race_id=race_id,
-            team_id=car['team_id'],
-            driver_id=car['driver_id'],
-            lap=current_lap,
-            event_type='race_dnf',
-            description=f'FALLA! {car["driver_name"]} ABANDONA! - {car["dnf_reason"]}',
-            session_type='race'
+    race_input = build_race_input(race_id, qualifying_results, total_laps, race_weather, seed=seed)
+    print(f"DEBUG: Condición climática: {race_input.weather_at(0)}")
+    
+    # Ligas grandes: cada división es una carrera independiente, simuladas en paralelo
+    divisions = partition_grid(race_input.cars, current_app.config['RACE_DIVISION_SIZE'],
+                               current_app.config['RACE_DIVISION_SEEDING'])
+    division_inputs = [
+        replace(
+            race_input,
+            cars=cars,
+            division=number,
+            points=DIVISION_POINTS[min(number, len(DIVISION_POINTS)) - 1],
+            seed=None if seed is None else seed * 1009 + number
         )
-        db.session.add(event)
-        db.session.commit()
-        
-        print(f"ABANDONO INUSUAL: {car['driver_name']} - {car['dnf_reason']}")
-
-def check_tyre_wear_pit_stops(race_id, cars, lap):
-    """Verifica paradas por desgaste de neumaticos"""
-    for car in cars:
-        if car['dnf'] or lap - car['last_pit_lap'] < 10:
-            continue
-            
-        # Aumentar desgaste
-        wear_increase = random.uniform(2, 6)
-        car['tyre_wear'] += wear_increase
-        
-        # Parada si desgaste > 80%
-        if car['tyre_wear'] > 80 and random.random() < 0.3:
-            execute_pit_stop(race_id, car, lap)
-
-def execute_pit_stop(race_id, car, lap):
-    """Ejecuta una parada en boxes"""
-    pit_time = 2.5 + random.uniform(0, 1.0)
-    car['pit_stops'] += 1
-    car['last_pit_lap'] = lap
-    car['tyre_wear'] = 0
-    
-    # Elegir nuevo neumatico
-    new_tyre = random.choice(['soft', 'medium', 'hard'])
-    car['current_tyre'] = new_tyre
-    
-    event = LiveEvent(
-        race_id=race_id,
-        team_id=car['team_id'],
-        driver_id=car['driver_id'],
-        lap=lap,
-        event_type='race_pit_stop',
-        description=f'BOXES {car["driver_name"]} - Parada en boxes - {pit_time:.1f}s - Cambio a {new_tyre.upper()}',
-        session_type='race'
-    )
-    db.session.add(event)
+        for number, cars in enumerate(divisions, start=1)
+    ]
+    if len(division_inputs) > 1:
+        print(f"DEBUG: Carrera dividida en {len(division_inputs)} divisiones de {[len(cars) for cars in divisions]} coches")
+    outputs = simulate_divisions(division_inputs, current_app.config['RACE_SIMULATION_WORKERS'])
+    
+    if len(outputs) == 1:
+        events = outputs[0].events
+    else:
+        # Un solo directo para todas las divisiones, intercalado por vuelta
+        events = heapq.merge(*(
+            [replace(event, description=f'[D{division_input.division}] {event.description}') for event in output.events]
+            for division_input, output in zip(division_inputs, outputs)
+        ), key=attrgetter('lap'))
+    persist_race_events(race_id, events)
+    
+    # Clasificación general: división 1 primero; dentro de cada una, su orden final
+    final_results = []
+    for output in outputs:
+        offset = len(final_results)
+        for result in output.results:
+            result_data = asdict(result)
+            result_data['division_position'] = result.final_position
+            result_data['final_position'] = offset + result.final_position
+            final_results.append(result_data)
+    finished = sum(1 for result in final_results if result['finished'])
+    print(f"DEBUG: Simulacion completada - {finished} terminaron, {len(final_results) - finished} abandonos")
     
-    car['total_time'] += pit_time
-    db.session.commit()
+    return final_results
 
-def update_car_performance_simple(cars, lap):
-    """Actualizacion simple del rendimiento"""
-    for car in cars:
-        if car['dnf']:
-            continue
-            
-        # Tiempo base + efectos
-        base_time = 80.0
-        skill_effect = (100 - car['driver_skill']) * 0.04
-        wear_penalty = car['tyre_wear'] * 0.08
-        random_variation = random.uniform(-0.2, 0.2)
-        
-        lap_time = base_time + skill_effect + wear_penalty + random_variation
-        car['lap_times'].append(lap_time)
-        car['total_time'] += lap_time
-
-def simulate_overtakes_simple(race_id, cars, lap):
-    """Adelantamientos simples"""
-    for i in range(len(cars) - 1):
-        car_ahead = cars[i]
-        car_behind = cars[i + 1]
-        
-        if car_ahead['dnf'] or car_behind['dnf']:
-            continue
-            
-        # Probabilidad basada en diferencia de habilidad y desgaste
-        skill_diff = (car_behind['driver_skill'] - car_ahead['driver_skill']) / 100
-        tyre_advantage = (car_ahead['tyre_wear'] - car_behind['tyre_wear']) / 100
-        overtake_chance = 0.05 + skill_diff * 0.1 + tyre_advantage * 0.15
-        
-        if random.random() < overtake_chance:
-            # Intercambiar posiciones
-            cars[i], cars[i + 1] = cars[i + 1], cars[i]
-            
-            event = LiveEvent(
-                race_id=race_id,
-                team_id=car_behind['team_id'],
-                driver_id=car_behind['driver_id'],
-                lap=lap,
-                event_type='race_overtake',
-                description=f'ADELANTAMIENTO {car_behind["driver_name"]} ADELANTA A {car_ahead["driver_name"]}',
-                session_type='race'
-            )
-            db.session.add(event)
-            db.session.commit()
-
-def simulate_lap_events_simple(race_id, cars, lap, total_laps):
-    """Eventos simples por vuelta"""
-    import random
-    
-    # Solo un evento por vuelta para evitar spam
-    if random.random() < 0.15 and cars:  # 15% de probabilidad por vuelta y hay coches activos
-        car = random.choice(cars)
-        
-        event_types = [
-            ('race_fast_lap', f'VUELTA RAPIDA {car["driver_name"]} MARCA VUELTA RAPIDA'),
-            ('race_spin', f'TROMPO {car["driver_name"]} DA UN TROMPO PERO CONTINUA'),
-            ('race_off_track', f'FUERA PISTA {car["driver_name"]} SE SALE DE LA PISTA')
-        ]
-        
-        event_type, description = random.choice(event_types)
-        
-        event = LiveEvent(
-            race_id=race_id,
-            team_id=car['team_id'],
-            driver_id=car['driver_id'],
-            lap=lap,
-            event_type=event_type,
-            description=description,
-            session_type='race'
-        )
-        db.session.add(event)
-        
-        if 'spin' in event_type or 'off_track' in event_type:
-            car['incidents'] += 1
-            # Pequena penalizacion de tiempo por incidente
-            car['total_time'] += random.uniform(2, 5)
-        
-        db.session.commit()
+RESULTS_SAVE_ATTEMPTS = 3  # guardados concurrentes: quien pierde la versión reintenta con la siguiente
 
 def save_race_results_improved(race_id, race_results):
-    """Guarda los resultados de la carrera en la base de datos - VERSION MEJORADA"""
-    # Primero eliminar resultados anteriores de esta carrera para evitar duplicados
-    ChampionshipStandings.query.filter_by(race_id=race_id).delete()
-    RaceResult.query.filter_by(race_id=race_id).delete()
-    
-    for result in race_results:
-        standing = ChampionshipStandings(
-            team_id=result['team_id'],
-            driver_id=result['driver_id'],
-            race_id=race_id,
-            points=result.get('points', 0),
-            position=result['final_position'],
-            fastest_lap=result.get('fastest_lap', False),
-            dnf=result['dnf']
-        )
-        db.session.add(standing)
-        
-        # Tambien crear un RaceResult
-        race_result = RaceResult(
-            race_id=race_id,
-            team_id=result['team_id'],
-            driver_id=result['driver_id'],
-            position=result['final_position'],
-            points=result.get('points', 0),
-            tyre_usage=result.get('pit_stops', 0),
-            pit_stops=result.get('pit_stops', 0),
-            fastest_lap=result.get('fastest_lap', False),
-            dnf=result['dnf'],
-            dnf_reason=result.get('dnf_reason')
-        )
-        db.session.add(race_result)
+    """Guarda los resultados de la carrera en la base de datos - VERSION MEJORADA
+    
+    No borra nada: las filas nuevas van bajo la versión siguiente y se publican
+    con RaceResultsSystem.publish en la misma transacción. Si otro guardado
+    simultáneo se queda con la misma versión, la clave única lo detecta y se
+    reintenta con una nueva. Las versiones anteriores las limpia
+    scheduled_results_cleanup.
+    """
+    for attempt in range(1, RESULTS_SAVE_ATTEMPTS + 1):
+        version = RaceResultsSystem.next_version(race_id)
+        try:
+            db.session.bulk_insert_mappings(ChampionshipStandings, [
+                {
+                    'team_id': result['team_id'],
+                    'driver_id': result['driver_id'],
+                    'race_id': race_id,
+                    'points': result.get('points', 0),
+                    'position': result['final_position'],
+                    'fastest_lap': result.get('fastest_lap', False),
+                    'dnf': result['dnf'],
+                    'division': result.get('division', 1),
+                    'version': version
+                }
+                for result in race_results
+            ])
+            # Tambien crear un RaceResult
+            db.session.bulk_insert_mappings(RaceResult, [
+                {
+                    'race_id': race_id,
+                    'team_id': result['team_id'],
+                    'driver_id': result['driver_id'],
+                    'position': result['final_position'],
+                    'points': result.get('points', 0),
+                    'tyre_usage': result.get('pit_stops', 0),
+                    'pit_stops': result.get('pit_stops', 0),
+                    'fastest_lap': result.get('fastest_lap', False),
+                    'dnf': result['dnf'],
+                    'dnf_reason': result.get('dnf_reason'),
+                    'division': result.get('division', 1),
+                    'version': version
+                }
+                for result in race_results
+            ])
+            RaceResultsSystem.publish(race_id, version)
+            db.session.commit()
+            break
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == RESULTS_SAVE_ATTEMPTS:
+                raise
+            print(f"⚠️ Versión {version} de la carrera {race_id} ocupada por otro guardado, reintentando")
+    print(f"RESULTADOS GUARDADOS para carrera {race_id}: {len(race_results)} pilotos (versión {version})")
     
-    db.session.commit()
-    print(f"RESULTADOS GUARDADOS para carrera {race_id}: {len(race_results)} pilotos")
+    # Liquidación de la versión publicada (idempotente por versión) y nóminas (idempotentes por carrera)
+    SettlementSystem.settle_race(race_id)
+    PayrollSystem.run_payroll(race_id)
 
-@app.route('/api/lap_times/qualifying/<int:race_id>')
+@main_bp.route('/api/lap_times/qualifying/<int:race_id>')
 @login_required
 def api_qualifying_lap_times(race_id):
     """API para obtener tiempos por vuelta de clasificación"""
@@ -4471,7 +3859,7 @@ def api_qualifying_lap_times(race_id):
         print(f"Error en api_qualifying_lap_times: {str(e)}")
         return jsonify([])
 
-@app.route('/api/lap_times/race/<int:race_id>')
+@main_bp.route('/api/lap_times/race/<int:race_id>')
 @login_required
 def api_race_lap_times(race_id):
     """API para obtener tiempos por vuelta de carrera"""
@@ -4515,7 +3903,39 @@ def api_race_lap_times(race_id):
         print(f"Error en api_race_lap_times: {str(e)}")
         return jsonify([])
 
+def create_app(config_object=Config):
+    """Fábrica de la aplicación web.
+
+    Cada llamada crea una aplicación nueva con la configuración indicada, sus
+    extensiones (base de datos y sesiones) y los blueprints: 'main' (rutas
+    generales) y 'finance' (finance.py). No arranca el scheduler ni tareas en
+    segundo plano. Los scripts que solo necesitan la base de datos deben usar
+    models.create_db_app().
+    """
+    app = Flask(__name__,
+        static_folder='static',
+        template_folder='templates'
+    )
+    app.config.from_object(config_object)
+    db.init_app(app)
+    login_manager.init_app(app)
+    app.register_blueprint(main_bp)
+    app.register_blueprint(finance_bp)
+    return app
+
+# Aplicación del proceso: la sirven los puntos de entrada y la usan las tareas en segundo plano
+app = create_app()
+
+def get_app(start_services=False):
+    """Devuelve la aplicación del proceso y, si se pide, arranca sus servicios.
+
+    Crear el scheduler, registrar tareas y elegir líder solo ocurre con
+    start_services=True, y siempre sobre esta aplicación.
+    """
+    if start_services:
+        start_background_services()
+    return app
+
 # Solo iniciar el scheduler si estamos ejecutando app.py directamente
 if __name__ == '__main__':
-    scheduler.start()
-    app.run(debug=True)
\ No newline at end of file
+    get_app(start_services=True).run(debug=True)
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""Compara el motor único de clasificación con las implementaciones anteriores.
+
+Las dos clasificaciones de la app (la rápida de /simulate_qualifying y la
+del directo) tenían su propio cálculo de tiempos. Ahora ambas pasan por
+sim.QualifyingSimulation con un modelo de tiempos distinto. Este script
+reproduce las fórmulas anteriores, simula muchas sesiones con las dos
+versiones sobre una parrilla sintética y compara el perfil estadístico:
+tiempo de pole, tiempo de corte de cada fase y posición media de cada
+piloto. Termina con código 1 si alguna diferencia supera la tolerancia.
+tests/test_qualifying_parity.py ejecuta la misma comparación con pytest.
+
+Uso:
+    python check_qualifying_parity.py
+    python check_qualifying_parity.py --sessions 5000 --seed 3
+"""
+import argparse
+import random
+import statistics
+import sys
+
+from sim import (
+    ComponentInput, ComponentTimeModel, QualifyingEntry, QualifyingSimulation, WeatherTimeModel,
+    knockout, stage_sizes
+)
+
+KNOCKOUT = ('75%', '50%')
+TIME_TOLERANCE = 0.05      # segundos de diferencia en medias de tiempos
+POSITION_TOLERANCE = 0.35  # posiciones de diferencia en la posición media de un piloto
+
+
+def synthetic_grid(rng, size, tyre_choices):
+    """Parrilla variada: pilotos y coches de todos los niveles"""
+    entries = []
+    for i in range(size):
+        entries.append(QualifyingEntry(
+            team_id=i // 2 + 1,
+            driver_id=i + 1,
+            driver_name=f'Piloto {i + 1}',
+            team_name=f'Equipo {i // 2 + 1}',
+            tyre_choice=tyre_choices[i % len(tyre_choices)],
+            driver_skill=rng.randint(40, 99),
+            driver_experience=rng.randint(20, 99),
+            driver_consistency=rng.randint(40, 99),
+            components=tuple(ComponentInput(kind, rng.randint(30, 95), 75)
+                             for kind in ('engine', 'chassis', 'aerodynamics', 'suspension'))
+        ))
+    return entries
+
+
+def legacy_component_times(rng, entry, previous, stage):
+    """Fórmulas de simulate_qualifying_with_engine"""
+    if stage == 1:
+        base_time = {'soft': 75.0, 'medium': 76.5, 'hard': 78.0, 'wet': 82.0, 'extreme_wet': 85.0}.get(entry.tyre_choice, 76.0)
+        strength = sum(c.strength for c in entry.components) / len(entry.components) if entry.components else 50
+        return (base_time - (100 - entry.driver_skill) / 80 - (strength - 50) * -0.015
+                + (100 - entry.driver_consistency) / 300 + (rng.random() - 0.5) * 0.8)
+    if stage == 2:
+        return max(74.0, previous - rng.uniform(0.3, 1.0))
+    return max(73.0, previous - rng.uniform(0.5, 1.5))
+
+
+def legacy_weather_times(condition):
+    """Fórmulas de calculate_base_qualifying_time + apply_weather_effects"""
+    def lap(rng, entry, previous, stage):
+        tyre_effect = {'soft': -2.0, 'medium': -1.0, 'hard': 0.0, 'wet': 8.0, 'extreme_wet': 12.0}.get(entry.tyre_choice, 0.0)
+        dry_tyre = entry.tyre_choice in ('soft', 'medium', 'hard')
+        if condition == 'light_rain':
+            tyre_effect = tyre_effect + 15.0 if dry_tyre else (2.0 if entry.tyre_choice == 'wet' else 4.0)
+        elif condition == 'heavy_rain':
+            if dry_tyre:
+                tyre_effect += 25.0
+            elif entry.tyre_choice == 'wet':
+                tyre_effect += 8.0
+            else:
+                tyre_effect = 3.0
+        driver_effect = (100 - (entry.driver_skill + entry.driver_experience) / 2) / 200
+        car_effect = (100 - sum(c.strength for c in entry.components) / 4) / 150
+        lap_time = round(85.0 - driver_effect - car_effect + tyre_effect + rng.uniform(-0.5, 0.5), 3)
+        if condition in (None, 'dry'):
+            return lap_time
+        penalty = 0
+        if condition == 'light_rain' and dry_tyre:
+            penalty += rng.uniform(2.0, 5.0)
+        elif condition == 'heavy_rain' and entry.tyre_choice != 'extreme_wet':
+            penalty += rng.uniform(5.0, 10.0)
+        penalty += rng.uniform(-1.0, 3.0)
+        return round(lap_time + penalty, 3)
+    return lap
+
+
+def legacy_session(rng, entries, lap):
+    """Eliminatorias como antes: un dict por piloto y tiempos por fase"""
+    participants = [{'entry': entry} for entry in entries]
+    sizes = stage_sizes(KNOCKOUT, len(participants))
+    stages, eliminated_by_stage = [], []
+    for stage in range(1, len(sizes) + 1):
+        for participant in participants:
+            participant[stage] = lap(rng, participant['entry'], participant.get(stage - 1), stage)
+        advance = sizes[stage] if stage < len(sizes) else len(participants)
+        advancing, eliminated = knockout(participants, advance, key=lambda p: p[stage])
+        stages.append((advancing[0][stage], advancing[-1][stage] if eliminated else None))
+        eliminated_by_stage.append(eliminated)
+        participants = advancing
+    for eliminated in reversed(eliminated_by_stage):
+        participants += eliminated
+    return stages, [participant['entry'].driver_id for participant in participants]
+
+
+def engine_session(rng, entries, time_model):
+    output = QualifyingSimulation(entries, KNOCKOUT, time_model, rng).run()
+    stages = [(stage.fastest_time, stage.cutoff_time) for stage in output.stages]
+    return stages, [result.driver_id for result in output.results]
+
+
+def profile(sessions, entries):
+    """Medias de pole y cortes por fase y posición media por piloto"""
+    stage_count = len(sessions[0][0])
+    fastest = [statistics.fmean(s[0][i][0] for s in sessions) for i in range(stage_count)]
+    cutoffs = [statistics.fmean(s[0][i][1] for s in sessions) for i in range(stage_count - 1)]
+    positions = {entry.driver_id: [] for entry in entries}
+    for _, order in sessions:
+        for position, driver_id in enumerate(order, start=1):
+            positions[driver_id].append(position)
+    return fastest, cutoffs, {driver_id: statistics.fmean(p) for driver_id, p in positions.items()}
+
+
+def compare(name, legacy, engine):
+    """Imprime las diferencias y devuelve True si están dentro de tolerancia"""
+    ok = True
+    for label, old_values, new_values in (('pole', legacy[0], engine[0]), ('corte', legacy[1], engine[1])):
+        for stage, (old, new) in enumerate(zip(old_values, new_values), start=1):
+            within = abs(old - new) <= TIME_TOLERANCE
+            ok &= within
+            print(f"  {name} Q{stage} {label}: antes {old:.3f}s, ahora {new:.3f}s {'✅' if within else '❌'}")
+    worst = max(abs(legacy[2][driver_id] - engine[2][driver_id]) for driver_id in legacy[2])
+    within = worst <= POSITION_TOLERANCE
+    ok &= within
+    print(f"  {name} mayor diferencia de posición media: {worst:.3f} {'✅' if within else '❌'}")
+    return ok
+
+
+def run_parity(sessions=3000, grid=20, seed=1):
+    """Simula y compara los cuatro casos; devuelve True si todos están dentro de tolerancia"""
+    grid_rng = random.Random(seed)
+    cases = [
+        ('componentes', ('soft', 'medium', 'hard'), legacy_component_times, ComponentTimeModel()),
+        ('clima seco', ('soft', 'medium', 'hard', 'wet'), legacy_weather_times('dry'), WeatherTimeModel('dry')),
+        ('lluvia ligera', ('soft', 'wet', 'extreme_wet'), legacy_weather_times('light_rain'), WeatherTimeModel('light_rain')),
+        ('lluvia intensa', ('medium', 'wet', 'extreme_wet'), legacy_weather_times('heavy_rain'), WeatherTimeModel('heavy_rain')),
+    ]
+    ok = True
+    for name, tyres, legacy_lap, time_model in cases:
+        entries = synthetic_grid(grid_rng, grid, tyres)
+        legacy_rng = random.Random(seed * 2)
+        engine_rng = random.Random(seed * 2 + 1)
+        legacy = [legacy_session(legacy_rng, entries, legacy_lap) for _ in range(sessions)]
+        engine = [engine_session(engine_rng, entries, time_model) for _ in range(sessions)]
+        print(f"{name}:")
+        ok &= compare(name, profile(legacy, entries), profile(engine, entries))
+
+    print('Paridad OK' if ok else 'Paridad FUERA DE TOLERANCIA')
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=3000, help='sesiones simuladas por modelo')
+    parser.add_argument('--grid', type=int, default=20, help='pilotos en la parrilla')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    return 0 if run_parity(args.sessions, args.grid, args.seed) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
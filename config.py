@@ -9,6 +9,12 @@ class Config:
         'sqlite:///' + os.path.join(basedir, 'instance', 'f1_manager.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Servidor de producción (serve.py)
+    SERVER_HOST = os.environ.get('F1_HOST', '0.0.0.0')
+    SERVER_PORT = int(os.environ.get('F1_PORT', 5000))
+    SERVER_WORKERS = int(os.environ.get('F1_WORKERS', os.cpu_count() or 1))  # Procesos
+    SERVER_THREADS = int(os.environ.get('F1_THREADS', 8))  # Hilos por proceso
+    
     # Configuración de sesión
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     
@@ -19,4 +25,11 @@ class Config:
     MAX_ENGINEERS = 4
     DRIVER_RETIREMENT_AGE = 40
     MECHANIC_RETIREMENT_AGE = 60  # Nuevo: retiro de mecánicos a 60 años
-    ENGINEER_RETIREMENT_AGE = 70
\ No newline at end of file
+    ENGINEER_RETIREMENT_AGE = 70
+    # Clasificación: cuántos pasan a Q2 y a Q3 (número absoluto o porcentaje de la parrilla)
+    QUALIFYING_KNOCKOUT = ('75%', '50%')
+    # Ligas grandes: carreras de más de RACE_DIVISION_SIZE coches se parten en divisiones
+    # (0 = una sola carrera). Sembrado por 'qualifying' o por 'rating' del piloto.
+    RACE_DIVISION_SIZE = int(os.environ.get('F1_DIVISION_SIZE', 24))
+    RACE_DIVISION_SEEDING = os.environ.get('F1_DIVISION_SEEDING', 'qualifying')
+    RACE_SIMULATION_WORKERS = int(os.environ.get('F1_SIM_WORKERS', os.cpu_count() or 1))  # Procesos por carrera
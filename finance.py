@@ -0,0 +1,362 @@
+"""Finanzas del equipo: libro de movimientos, nóminas y sus vistas.
+
+FinanceSystem registra asientos dentro de la transacción del llamador y
+mantiene los acumulados mensuales; PayrollSystem cobra las nóminas tras
+cada carrera. Las rutas de finanzas forman el blueprint `finance_bp`, que
+registra app.create_app().
+"""
+from datetime import datetime, timedelta
+
+from flask import Blueprint, render_template, request, jsonify
+from flask_login import login_required, current_user
+
+from models import (
+    db, User, Driver, Mechanic, Engineer, Race, FinancialTransaction, FinanceMonthlySnapshot,
+    FinanceBalanceSnapshot, PayrollRun, finance_period, month_start, upsert_insert
+)
+
+finance_bp = Blueprint('finance', __name__)
+
+class FinanceSystem:
+    @staticmethod
+    def get_financial_summary(team_id, months=6):
+        """Obtiene un resumen financiero de los últimos meses"""
+        first_period = finance_period(month_start(months_back=months - 1))
+
+        # Ingresos y gastos por mes desde los saldos mensuales
+        monthly_data = [{
+            'month': snap.period,
+            'income': snap.total_income,
+            'expenses': snap.total_expenses
+        } for snap in FinanceBalanceSnapshot.query.filter(
+            FinanceBalanceSnapshot.team_id == team_id,
+            FinanceBalanceSnapshot.period >= first_period
+        ).order_by(FinanceBalanceSnapshot.period).all()]
+
+        # Totales por categoría
+        category_totals = db.session.query(
+            FinanceMonthlySnapshot.category,
+            FinanceMonthlySnapshot.transaction_type,
+            db.func.sum(FinanceMonthlySnapshot.total_amount).label('total')
+        ).filter(
+            FinanceMonthlySnapshot.team_id == team_id,
+            FinanceMonthlySnapshot.period >= first_period
+        ).group_by(FinanceMonthlySnapshot.category, FinanceMonthlySnapshot.transaction_type).all()
+
+        return {
+            'monthly_data': monthly_data,
+            'category_totals': category_totals
+        }
+
+    @staticmethod
+    def record_transaction(team_id, transaction_type, category, amount, description):
+        """Registra una transacción financiera.
+
+        No hace commit: el asiento forma parte de la transacción del llamador
+        (compra, mejora, entrenamiento...), que es quien confirma o revierte.
+        """
+        posted = FinanceSystem.post_transactions([{
+            'team_id': team_id,
+            'transaction_type': transaction_type,
+            'category': category,
+            'amount': amount,
+            'description': description
+        }])
+        return bool(posted)
+
+    @staticmethod
+    def post_transactions(postings, moment=None):
+        """Registra un lote de asientos (p. ej. nóminas de todos los equipos).
+
+        Carga los equipos implicados en una sola consulta, actualiza saldos en
+        orden, inserta los movimientos en bloque y mantiene los acumulados
+        mensuales. Tampoco hace commit. Devuelve las filas insertadas.
+        """
+        if not postings:
+            return []
+
+        moment = moment or datetime.utcnow()
+        period = finance_period(moment)
+        team_ids = {posting['team_id'] for posting in postings}
+        users = {user.id: user for user in User.query.filter(User.id.in_(team_ids)).all()}
+
+        rows = []
+        category_totals = {}  # (team_id, category, tipo) -> [importe, nº movimientos]
+        balance_moves = {}    # team_id -> [apertura, cierre, ingresos, gastos]
+        for posting in postings:
+            user = users.get(posting['team_id'])
+            if not user:
+                continue
+
+            transaction_type = posting['transaction_type']
+            amount = posting['amount']
+            opening = user.money
+            if transaction_type == 'income':
+                user.money += amount
+            elif transaction_type == 'expense':
+                user.money -= amount
+
+            rows.append({
+                'team_id': user.id,
+                'transaction_type': transaction_type,
+                'category': posting['category'],
+                'amount': amount,
+                'description': posting['description'],
+                'balance_after': user.money,
+                'created_at': moment
+            })
+
+            totals = category_totals.setdefault((user.id, posting['category'], transaction_type), [0.0, 0])
+            totals[0] += amount
+            totals[1] += 1
+
+            move = balance_moves.setdefault(user.id, [opening, user.money, 0.0, 0.0])
+            move[1] = user.money
+            if transaction_type == 'income':
+                move[2] += amount
+            elif transaction_type == 'expense':
+                move[3] += amount
+
+        if rows:
+            db.session.bulk_insert_mappings(FinancialTransaction, rows)
+            FinanceSystem._apply_snapshots(period, category_totals, balance_moves)
+        return rows
+
+    @staticmethod
+    def _apply_snapshots(period, category_totals, balance_moves):
+        """Suma los movimientos del lote a los acumulados del periodo.
+
+        Un INSERT ... ON CONFLICT DO UPDATE por tabla con el incremento hecho en
+        SQL: dos procesos que asientan a la vez para el mismo equipo y periodo
+        no pierden ninguna suma ni chocan con la clave única al crear la fila.
+        """
+        table = FinanceMonthlySnapshot.__table__
+        insert = upsert_insert(table)
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=['team_id', 'period', 'category', 'transaction_type'],
+            set_={
+                'total_amount': table.c.total_amount + insert.excluded.total_amount,
+                'transaction_count': table.c.transaction_count + insert.excluded.transaction_count
+            }
+        ), [{
+            'team_id': team_id,
+            'period': period,
+            'category': category,
+            'transaction_type': transaction_type,
+            'total_amount': amount,
+            'transaction_count': count
+        } for (team_id, category, transaction_type), (amount, count) in category_totals.items()])
+
+        table = FinanceBalanceSnapshot.__table__
+        insert = upsert_insert(table)
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=['team_id', 'period'],
+            set_={
+                'closing_balance': insert.excluded.closing_balance,
+                'total_income': table.c.total_income + insert.excluded.total_income,
+                'total_expenses': table.c.total_expenses + insert.excluded.total_expenses
+            }
+        ), [{
+            'team_id': team_id,
+            'period': period,
+            'opening_balance': opening,
+            'closing_balance': closing,
+            'total_income': income,
+            'total_expenses': expenses
+        } for team_id, (opening, closing, income, expenses) in balance_moves.items()])
+
+    @staticmethod
+    def get_totals(team_id):
+        """Ingresos y gastos acumulados leyendo los saldos mensuales (O(meses))"""
+        totals = db.session.query(
+            db.func.coalesce(db.func.sum(FinanceBalanceSnapshot.total_income), 0.0),
+            db.func.coalesce(db.func.sum(FinanceBalanceSnapshot.total_expenses), 0.0)
+        ).filter(FinanceBalanceSnapshot.team_id == team_id).one()
+        return {'income': totals[0], 'expenses': totals[1]}
+
+class PayrollSystem:
+    @staticmethod
+    def get_wage_bills():
+        """Coste salarial por carrera de cada equipo en una única consulta agregada"""
+        staff = db.union_all(
+            db.select(Driver.team_id.label('team_id'), Driver.salary.label('salary')).where(Driver.team_id.isnot(None)),
+            db.select(Mechanic.team_id.label('team_id'), Mechanic.salary.label('salary')).where(Mechanic.team_id.isnot(None)),
+            db.select(Engineer.team_id.label('team_id'), Engineer.salary.label('salary')).where(Engineer.team_id.isnot(None))
+        ).subquery()
+
+        return db.session.query(
+            staff.c.team_id,
+            db.func.sum(staff.c.salary).label('amount'),  # Los salarios son por carrera
+            db.func.count().label('staff_count')
+        ).group_by(staff.c.team_id).all()
+
+    @staticmethod
+    def run_payroll(race_id):
+        """Cobra las nóminas de todos los equipos tras una carrera.
+
+        Todo va en una transacción: asientos del libro, saldos y el PayrollRun
+        que marca la carrera como pagada. Si ya existe, no hace nada.
+        """
+        if PayrollRun.query.filter_by(race_id=race_id).first():
+            return None
+
+        race = Race.query.get(race_id)
+        if not race:
+            return None
+
+        bills = PayrollSystem.get_wage_bills()
+        postings = [{
+            'team_id': bill.team_id,
+            'transaction_type': 'expense',
+            'category': 'salary',
+            'amount': round(bill.amount, 2),
+            'description': f'Nóminas GP {race.circuit.name} ({bill.staff_count} empleados)'
+        } for bill in bills if bill.amount]
+
+        try:
+            FinanceSystem.post_transactions(postings)
+            payroll_run = PayrollRun(
+                race_id=race_id,
+                teams_charged=len(postings),
+                staff_count=sum(bill.staff_count for bill in bills),
+                total_amount=sum(posting['amount'] for posting in postings)
+            )
+            db.session.add(payroll_run)
+            db.session.commit()
+        except Exception as e:
+            # Otro proceso pudo registrar la misma carrera (race_id es único)
+            db.session.rollback()
+            print(f"❌ Error cobrando nóminas de la carrera {race_id}: {str(e)}")
+            return None
+
+        return payroll_run
+
+    @staticmethod
+    def pending_races():
+        """Carreras con resultados guardados y nóminas aún sin cobrar"""
+        has_results = Race.results_version.isnot(None)
+        already_paid = db.exists().where(PayrollRun.race_id == Race.id)
+        return Race.query.filter(has_results, ~already_paid).order_by(Race.race_session).all()
+
+@finance_bp.route('/finances')
+@login_required
+def finances():
+    """Página principal de finanzas"""
+    # Obtener transacciones recientes (solo para el listado)
+    recent_transactions = FinancialTransaction.query.filter_by(
+        team_id=current_user.id
+    ).order_by(FinancialTransaction.created_at.desc()).limit(50).all()
+    
+    # Calcular gasto en salarios por carrera
+    race_salary_cost = 0
+    for driver in current_user.drivers:
+        race_salary_cost += driver.salary
+    for mechanic in current_user.mechanics:
+        race_salary_cost += mechanic.salary
+    for engineer in current_user.engineers:
+        race_salary_cost += engineer.salary
+    
+    # Totales a partir de los saldos mensuales, sin recorrer transacciones
+    totals = FinanceSystem.get_totals(current_user.id)
+    total_income = totals['income']
+    total_expenses = totals['expenses']
+    net_balance = total_income - total_expenses
+    
+    return render_template('finances.html',
+                         transactions=recent_transactions,
+                         race_salary_cost=race_salary_cost,
+                         total_income=total_income,
+                         total_expenses=total_expenses,
+                         net_balance=net_balance)
+
+@finance_bp.route('/api/finances/transactions')
+@login_required
+def api_finance_transactions():
+    """API para obtener transacciones con filtros"""
+    page = request.args.get('page', 1, type=int)
+    per_page = 20
+    
+    # Filtros
+    transaction_type = request.args.get('type')
+    category = request.args.get('category')
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    
+    query = FinancialTransaction.query.filter_by(team_id=current_user.id)
+    
+    if transaction_type and transaction_type != 'all':
+        query = query.filter_by(transaction_type=transaction_type)
+    
+    if category and category != 'all':
+        query = query.filter_by(category=category)
+    
+    if start_date:
+        try:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d')
+            query = query.filter(FinancialTransaction.created_at >= start_date)
+        except ValueError:
+            pass
+    
+    if end_date:
+        try:
+            # Rango semiabierto: incluye todo el día indicado
+            end_date = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+            query = query.filter(FinancialTransaction.created_at < end_date)
+        except ValueError:
+            pass
+    
+    transactions = query.order_by(FinancialTransaction.created_at.desc()).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+    
+    transactions_data = []
+    for transaction in transactions.items:
+        transactions_data.append({
+            'id': transaction.id,
+            'type': transaction.transaction_type,
+            'category': transaction.category,
+            'amount': transaction.amount,
+            'description': transaction.description,
+            'balance_after': transaction.balance_after,
+            'date': transaction.created_at.strftime('%d/%m/%Y %H:%M')
+        })
+    
+    return jsonify({
+        'transactions': transactions_data,
+        'total_pages': transactions.pages,
+        'current_page': page,
+        'has_next': transactions.has_next,
+        'has_prev': transactions.has_prev
+    })
+
+@finance_bp.route('/api/finances/stats')
+@login_required
+def api_finance_stats():
+    """API para obtener estadísticas financieras"""
+    # Últimos 6 meses (incluido el actual): una lectura por índice (team_id, period)
+    monthly_stats = FinanceBalanceSnapshot.query.filter(
+        FinanceBalanceSnapshot.team_id == current_user.id,
+        FinanceBalanceSnapshot.period >= finance_period(month_start(months_back=5))
+    ).order_by(FinanceBalanceSnapshot.period).all()
+    
+    # Gastos por categoría (último mes)
+    category_stats = db.session.query(
+        FinanceMonthlySnapshot.category,
+        FinanceMonthlySnapshot.total_amount.label('total')
+    ).filter(
+        FinanceMonthlySnapshot.team_id == current_user.id,
+        FinanceMonthlySnapshot.period == finance_period(month_start(months_back=1)),
+        FinanceMonthlySnapshot.transaction_type == 'expense'
+    ).order_by(FinanceMonthlySnapshot.total_amount.desc()).all()
+    
+    return jsonify({
+        'monthly_stats': [{
+            'month': stat.period,
+            'income': stat.total_income or 0,
+            'expenses': stat.total_expenses or 0
+        } for stat in monthly_stats],
+        'category_stats': [{
+            'category': stat.category,
+            'total': stat.total or 0
+        } for stat in category_stats]
+    })
@@ -1,10 +1,13 @@
 # init_db.py
-from app import app, db, Driver, Mechanic, Engineer, Circuit, Race, CarComponent, TyreType, WeatherForecast, WeatherChange, Upgrade, Training, ChampionshipStandings
+from models import create_db_app, db, Driver, Mechanic, Engineer, Circuit, Race, CarComponent, TyreType, WeatherForecast, WeatherChange, Upgrade, Training, ChampionshipStandings
 from datetime import datetime, timedelta
 import random
 import os
 from werkzeug.security import generate_password_hash
 
+# Solo la base de datos: no hace falta cargar la aplicación web ni el scheduler
+app = create_db_app()
+
 # ELIMINAR las siguientes funciones de init_db.py (ya están en staff_generator.py):
 # - generate_random_name()
 # - generate_mechanic_name() 
@@ -0,0 +1,87 @@
+"""Mide el tiempo de importación de los módulos principales.
+
+Cada medición se hace en un intérprete nuevo (sin cachés de import
+compartidas) y se informa la mediana de varias repeticiones. Con
+--output se añade una línea JSON por ejecución para seguir la evolución
+entre versiones, y con --max-ms falla si algún módulo supera el límite.
+
+Uso:
+    python measure_startup.py
+    python measure_startup.py --runs 10 --output logs/startup.jsonl --max-ms app=1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+# Del más ligero al más pesado: lo que importan los scripts y workers
+# frente a la aplicación web completa
+MODULES = ['models', 'staff_generator', 'finance', 'app']
+
+SNIPPET = (
+    "import time; start = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def measure(module, runs):
+    """Mediana en milisegundos del tiempo de importar un módulo"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', SNIPPET.format(module=module)],
+            cwd=here, capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        samples.append(float(output) * 1000)
+    return statistics.median(samples)
+
+
+def current_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tiempo de importación de F1 Manager')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', help='Fichero JSONL al que añadir el resultado')
+    parser.add_argument('--max-ms', action='append', default=[],
+                        help='Límite por módulo, p. ej. app=1500 (se puede repetir)')
+    args = parser.parse_args()
+
+    results = {module: round(measure(module, args.runs), 1) for module in MODULES}
+
+    print("========================================")
+    print("    TIEMPO DE IMPORTACIÓN (mediana)")
+    print("========================================")
+    for module, elapsed in results.items():
+        print(f"{module:<18} {elapsed:>8.1f} ms")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'a') as handle:
+            handle.write(json.dumps({
+                'date': datetime.utcnow().isoformat(timespec='seconds'),
+                'revision': current_revision(),
+                'runs': args.runs,
+                'import_ms': results
+            }) + '\n')
+
+    failed = False
+    for limit in args.max_ms:
+        module, _, max_ms = limit.partition('=')
+        if module in results and results[module] > float(max_ms):
+            print(f"❌ {module} supera el límite: {results[module]:.1f} ms > {max_ms} ms")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,691 @@
+"""Modelos de la base de datos y fórmulas que usan.
+
+Este módulo no crea la aplicación web ni el scheduler: las herramientas de
+línea de comandos (init_db.py, staff_generator.py) y los procesos de
+trabajo pueden importarlo solo con Flask-SQLAlchemy. La aplicación completa
+la crea app.create_app(), que llama a db.init_app.
+"""
+from datetime import datetime, date
+
+from flask import Flask
+from flask_login import UserMixin
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import postgresql, sqlite
+
+from config import Config
+
+db = SQLAlchemy()
+
+
+def create_db_app(config_object=Config):
+    """Aplicación mínima (solo base de datos) para scripts y procesos de trabajo"""
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    db.init_app(app)
+    return app
+
+def upsert_insert(table):
+    """INSERT del dialecto en uso, con on_conflict_do_nothing / on_conflict_do_update (SQLite o PostgreSQL)"""
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(table)
+
+
+# Modelos de la base de datos
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(120), nullable=False)
+    team_name = db.Column(db.String(100), nullable=False)
+    money = db.Column(db.Float, default=Config.STARTING_MONEY)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Liquidación al leer: hasta cuándo están aplicadas sus mejoras/entrenamientos
+    # y cuándo vence el próximo pendiente (None si no hay ninguno)
+    settled_at = db.Column(db.DateTime)
+    next_due_at = db.Column(db.DateTime)
+    
+    drivers = db.relationship('Driver', backref='team', lazy=True)
+    mechanics = db.relationship('Mechanic', backref='team', lazy=True)
+    engineers = db.relationship('Engineer', backref='team', lazy=True)
+    car_components = db.relationship('CarComponent', backref='team', lazy=True)
+    test_sessions = db.relationship('TestSession', backref='team', lazy=True)
+    race_strategies = db.relationship('RaceStrategy', backref='team', lazy=True)
+
+class Driver(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    date_of_birth = db.Column(db.Date, nullable=False)
+    age = db.Column(db.Integer, nullable=False)
+    salary = db.Column(db.Float, nullable=False)
+    skill = db.Column(db.Integer, default=50)
+    experience = db.Column(db.Integer, default=50)
+    aggression = db.Column(db.Integer, default=50)
+    consistency = db.Column(db.Integer, default=50)
+    growth_potential = db.Column(db.Integer, default=50)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    market_available = db.Column(db.Boolean, default=True)
+    value_score = db.Column(db.Float, nullable=False, default=0.0)  # Relación calidad/precio precalculada; clave del cursor del mercado
+    last_trained = db.Column(db.Date)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_driver_market_value', 'market_available', 'value_score', 'id'),
+        db.Index('ix_driver_market_skill', 'market_available', 'skill'),
+        db.Index('ix_driver_market_salary', 'market_available', 'salary'),
+        db.Index('ix_driver_market_age', 'market_available', 'age'),
+    )
+    
+    def refresh_value_score(self):
+        """Recalcula la relación calidad/precio con los atributos actuales"""
+        self.value_score = calculate_driver_value_score(self.skill, self.experience, self.consistency, self.salary)
+    
+    @property
+    def is_retired(self):
+        """Verifica si el piloto ha alcanzado la edad de jubilación (Config.DRIVER_RETIREMENT_AGE)"""
+        today = date.today()
+        age = today.year - self.date_of_birth.year - (
+            (today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day)
+        )
+        return age >= Config.DRIVER_RETIREMENT_AGE
+
+class Mechanic(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    date_of_birth = db.Column(db.Date, nullable=False)
+    age = db.Column(db.Integer, nullable=False)
+    salary = db.Column(db.Float, nullable=False)
+    pit_stop_skill = db.Column(db.Integer, default=50)
+    reliability_skill = db.Column(db.Integer, default=50)
+    growth_potential = db.Column(db.Integer, default=50)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    market_available = db.Column(db.Boolean, default=True)
+    value_score = db.Column(db.Float, nullable=False, default=0.0)  # Relación calidad/precio precalculada; clave del cursor del mercado
+    last_trained = db.Column(db.Date)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_mechanic_market_value', 'market_available', 'value_score', 'id'),
+        db.Index('ix_mechanic_market_skill', 'market_available', 'pit_stop_skill'),
+        db.Index('ix_mechanic_market_salary', 'market_available', 'salary'),
+        db.Index('ix_mechanic_market_age', 'market_available', 'age'),
+    )
+    
+    def refresh_value_score(self):
+        """Recalcula la relación calidad/precio con los atributos actuales"""
+        self.value_score = calculate_mechanic_value_score(self.pit_stop_skill, self.reliability_skill, self.salary)
+    
+    @property
+    def is_retired(self):
+        """Verifica si el mecánico ha alcanzado la edad de jubilación (Config.MECHANIC_RETIREMENT_AGE)"""
+        today = date.today()
+        age = today.year - self.date_of_birth.year - (
+            (today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day)
+        )
+        return age >= Config.MECHANIC_RETIREMENT_AGE
+
+class Engineer(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    date_of_birth = db.Column(db.Date, nullable=False)
+    age = db.Column(db.Integer, nullable=False)
+    salary = db.Column(db.Float, nullable=False)
+    innovation = db.Column(db.Integer, default=50)
+    development_speed = db.Column(db.Integer, default=50)
+    growth_potential = db.Column(db.Integer, default=50)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    market_available = db.Column(db.Boolean, default=True)
+    value_score = db.Column(db.Float, nullable=False, default=0.0)  # Relación calidad/precio precalculada; clave del cursor del mercado
+    last_trained = db.Column(db.Date)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_engineer_market_value', 'market_available', 'value_score', 'id'),
+        db.Index('ix_engineer_market_skill', 'market_available', 'innovation'),
+        db.Index('ix_engineer_market_salary', 'market_available', 'salary'),
+        db.Index('ix_engineer_market_age', 'market_available', 'age'),
+    )
+    
+    def refresh_value_score(self):
+        """Recalcula la relación calidad/precio con los atributos actuales"""
+        self.value_score = calculate_engineer_value_score(self.innovation, self.development_speed, self.salary)
+    
+    @property
+    def is_retired(self):
+        """Verifica si el ingeniero ha alcanzado la edad de jubilación (Config.ENGINEER_RETIREMENT_AGE)"""
+        today = date.today()
+        age = today.year - self.date_of_birth.year - (
+            (today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day)
+        )
+        return age >= Config.ENGINEER_RETIREMENT_AGE
+
+class CarComponent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    component_type = db.Column(db.String(20), nullable=False)
+    strength = db.Column(db.Integer, default=50)
+    reliability = db.Column(db.Integer, default=50)
+    upgrade_progress = db.Column(db.Integer, default=0)
+    upgrade_ends_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Upgrade(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    component_type = db.Column(db.String(20), nullable=False)
+    level = db.Column(db.Integer, nullable=False)  # 1, 2, 3
+    weeks = db.Column(db.Integer, nullable=False)  # 1, 2, 3
+    total_cost = db.Column(db.Float, nullable=False)
+    start_date = db.Column(db.DateTime, nullable=False)
+    end_date = db.Column(db.DateTime, nullable=False)
+    completed = db.Column(db.Boolean, default=False)
+
+    __table_args__ = (
+        db.Index('ix_upgrade_due', 'completed', 'end_date'),
+    )
+    
+    @property
+    def progress(self):
+        if self.completed:
+            return 100
+            
+        total_seconds = (self.end_date - self.start_date).total_seconds()
+        elapsed_seconds = (datetime.utcnow() - self.start_date).total_seconds()
+        
+        if total_seconds <= 0:
+            return 100
+            
+        progress = min(100, (elapsed_seconds / total_seconds) * 100)
+        return progress
+    
+    @property
+    def remaining_days(self):
+        if self.completed:
+            return 0
+            
+        remaining_seconds = (self.end_date - datetime.utcnow()).total_seconds()
+        remaining_days = max(0, remaining_seconds / (24 * 3600))
+        return int(remaining_days) + 1  # +1 para redondear hacia arriba
+        
+class Training(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    staff_type = db.Column(db.String(20), nullable=False)  # driver, mechanic, engineer
+    staff_id = db.Column(db.Integer, nullable=False)  # ID del piloto/mecánico/ingeniero
+    attribute = db.Column(db.String(30), nullable=False)  # atributo a mejorar
+    level = db.Column(db.Integer, nullable=False)  # 1, 2, 3
+    weeks = db.Column(db.Integer, nullable=False)  # 1, 2, 3
+    total_cost = db.Column(db.Float, nullable=False)
+    start_date = db.Column(db.DateTime, nullable=False)
+    end_date = db.Column(db.DateTime, nullable=False)
+    completed = db.Column(db.Boolean, default=False)
+
+    __table_args__ = (
+        db.Index('ix_training_due', 'completed', 'end_date'),
+    )
+    
+    @property
+    def progress(self):
+        if self.completed:
+            return 100
+            
+        total_seconds = (self.end_date - self.start_date).total_seconds()
+        elapsed_seconds = (datetime.utcnow() - self.start_date).total_seconds()
+        
+        if total_seconds <= 0:
+            return 100
+            
+        progress = min(100, (elapsed_seconds / total_seconds) * 100)
+        return progress
+    
+    @property
+    def remaining_days(self):
+        if self.completed:
+            return 0
+            
+        remaining_seconds = (self.end_date - datetime.utcnow()).total_seconds()
+        remaining_days = max(0, remaining_seconds / (24 * 3600))
+        return int(remaining_days) + 1  # +1 para redondear hacia arriba
+
+class Circuit(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    country = db.Column(db.String(50), nullable=False)
+    timezone = db.Column(db.String(50), nullable=False)
+    laps = db.Column(db.Integer, nullable=False)
+
+class Race(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    circuit_id = db.Column(db.Integer, db.ForeignKey('circuit.id'), nullable=False)
+    round_number = db.Column(db.Integer, nullable=False)
+    season_year = db.Column(db.Integer, nullable=False)
+    test_session = db.Column(db.DateTime, nullable=False, index=True)
+    qualifying_session = db.Column(db.DateTime, nullable=False, index=True)
+    sprint_session = db.Column(db.DateTime)
+    race_session = db.Column(db.DateTime, nullable=False, index=True)
+    # Versión publicada de RaceResult / ChampionshipStandings (None = sin resultados)
+    results_version = db.Column(db.Integer)
+    
+    circuit = db.relationship('Circuit', backref='races')
+    live_events = db.relationship('LiveEvent', backref='race', lazy=True)  # AÑADE ESTA LÍNEA
+    
+class QualifyingSession(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
+    tyre_choice = db.Column(db.String(20), nullable=False)  # soft, medium, hard, wet, extreme_wet
+    q1_time = db.Column(db.Float)  # Tiempo en Q1
+    q2_time = db.Column(db.Float)  # Tiempo en Q2  
+    q3_time = db.Column(db.Float)  # Tiempo en Q3
+    final_position = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('race_id', 'team_id', 'driver_id', name='uq_qualifying_session_race_team_driver'),
+    )
+    
+    race = db.relationship('Race', backref='qualifying_sessions')
+    team = db.relationship('User', backref='qualifying_sessions')
+    driver = db.relationship('Driver', backref='qualifying_sessions')
+
+class QualifyingStage(db.Model):
+    """Resumen de cada fase de clasificación (Q1, Q2, Q3) guardado al simular"""
+    id = db.Column(db.Integer, primary_key=True)
+    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
+    stage = db.Column(db.Integer, nullable=False)  # 1, 2, 3
+    participants = db.Column(db.Integer, nullable=False)
+    advancing = db.Column(db.Integer, nullable=False)  # Cuántos pasan a la siguiente fase
+    fastest_time = db.Column(db.Float)
+    fastest_driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'))
+    cutoff_time = db.Column(db.Float)  # Tiempo del último que pasa (None si no hay eliminados)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('race_id', 'stage', name='uq_qualifying_stage_race_stage'),
+    )
+
+class RaceResult(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
+    position = db.Column(db.Integer)
+    points = db.Column(db.Integer, default=0)
+    tyre_usage = db.Column(db.Integer, default=0)
+    pit_stops = db.Column(db.Integer, default=0)
+    fastest_lap = db.Column(db.Boolean, default=False)
+    dnf = db.Column(db.Boolean, default=False)
+    dnf_reason = db.Column(db.String(50))
+    division = db.Column(db.Integer, default=1)
+    version = db.Column(db.Integer, default=1, nullable=False)  # ver Race.results_version
+    
+    __table_args__ = (
+        db.UniqueConstraint('race_id', 'version', 'driver_id', name='uq_race_result_race_version_driver'),
+    )
+
+class LiveEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
+    lap = db.Column(db.Integer, nullable=False)
+    event_type = db.Column(db.String(50), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    session_type = db.Column(db.String(20), nullable=False, default='race')  # 'qualifying' o 'race'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Nuevos modelos para el sistema de tests
+class TyreType(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(20), nullable=False)  # soft, medium, hard, wet, extreme_wet
+    dry_performance = db.Column(db.Integer, nullable=False)
+    wet_performance = db.Column(db.Integer, nullable=False)
+    durability = db.Column(db.Integer, nullable=False)
+    warmup_time = db.Column(db.Integer, nullable=False)  # en segundos
+
+class TestSession(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
+    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relaciones
+    driver = db.relationship('Driver')
+    race = db.relationship('Race')
+
+class TestLap(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    test_session_id = db.Column(db.Integer, db.ForeignKey('test_session.id'), nullable=False)
+    lap_number = db.Column(db.Integer, nullable=False)
+    tyre_type = db.Column(db.String(20), nullable=False)
+    lap_time = db.Column(db.Float, nullable=False)  # tiempo en segundos
+    tyre_wear = db.Column(db.Integer, nullable=False)  # desgaste de 0-100
+    track_condition = db.Column(db.String(20), nullable=False)  # dry, wet, heavy_rain
+    
+    test_session = db.relationship('TestSession', backref='laps')
+
+class RaceStrategy(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
+    strategy_name = db.Column(db.String(100), nullable=False)
+    total_pit_stops = db.Column(db.Integer, nullable=False)
+    starting_tyre = db.Column(db.String(20), default='soft')
+    rain_strategy = db.Column(db.String(20), default='continue')  # continue, pit_wet, pit_extreme, next_pit
+    heavy_rain_strategy = db.Column(db.String(20), default='continue')  # continue, pit_extreme, immediate_pit
+    dry_strategy = db.Column(db.String(20), default='continue')  # continue, pit_soft, pit_medium, next_pit
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    driver = db.relationship('Driver')
+    race = db.relationship('Race')
+
+class StrategySegment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    strategy_id = db.Column(db.Integer, db.ForeignKey('race_strategy.id'), nullable=False)
+    segment_order = db.Column(db.Integer, nullable=False)
+    tyre_type = db.Column(db.String(20), nullable=False)
+    laps_planned = db.Column(db.Integer, nullable=False)
+    
+    strategy = db.relationship('RaceStrategy', backref='segments')
+    
+# Añadir después de los modelos existentes en app.py
+
+class WeatherForecast(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
+    session_type = db.Column(db.String(20), nullable=False)  # test, qualifying, race
+    forecast_time = db.Column(db.DateTime, nullable=False)
+    condition = db.Column(db.String(20), nullable=False)  # dry, light_rain, heavy_rain
+    probability = db.Column(db.Float, nullable=False)  # 0-1
+    
+    race = db.relationship('Race', backref='weather_forecasts')
+    
+# Añadir después del modelo WeatherForecast en app.py
+
+class WeatherChange(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
+    session_type = db.Column(db.String(20), nullable=False)  # test, qualifying, race
+    change_lap = db.Column(db.Integer, nullable=False)  # vuelta en la que cambia el tiempo
+    from_condition = db.Column(db.String(20), nullable=False)  # condición anterior
+    to_condition = db.Column(db.String(20), nullable=False)  # nueva condición
+    probability = db.Column(db.Float, nullable=False)  # 0-1
+    
+    race = db.relationship('Race', backref='weather_changes')
+
+class ChampionshipStandings(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
+    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
+    points = db.Column(db.Integer, default=0)
+    position = db.Column(db.Integer)
+    fastest_lap = db.Column(db.Boolean, default=False)
+    dnf = db.Column(db.Boolean, default=False)
+    division = db.Column(db.Integer, default=1)
+    version = db.Column(db.Integer, default=1, nullable=False)  # ver Race.results_version
+    
+    __table_args__ = (
+        db.UniqueConstraint('race_id', 'version', 'driver_id', name='uq_championship_standings_race_version_driver'),
+    )
+    
+    team = db.relationship('User', backref='championship_results')
+    driver = db.relationship('Driver', backref='championship_results')
+    race = db.relationship('Race', backref='championship_results')
+    
+class Test(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
+    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False)
+    initial_tyre = db.Column(db.String(20), nullable=False)
+    track_condition = db.Column(db.String(20), nullable=False)
+    total_laps = db.Column(db.Integer, nullable=False)
+    best_lap = db.Column(db.Float, nullable=False)
+    avg_lap = db.Column(db.Float, nullable=False)
+    incidents = db.Column(db.Integer, default=0)
+    pit_stops = db.Column(db.Integer, default=0)
+    total_time_lost = db.Column(db.Float, default=0.0)
+    lap_data = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relaciones - Asegúrate de que estén así
+    team = db.relationship('User', backref='tests')
+    driver = db.relationship('Driver', backref='tests')
+    race = db.relationship('Race', backref='tests')
+
+
+# Funciones de cálculo de salarios (para usar en el mercado)
+def calculate_driver_salary(age, skill, experience, aggression, consistency, growth_potential):
+    """Calcula el salario del piloto basado en sus atributos"""
+    # Base salary por ser piloto de F1
+    base_salary = 500000
+    
+    # Factores de ajuste
+    age_factor = 1.0
+    if age <= 25:
+        age_factor = 0.7  # Jóvenes ganan menos
+    elif age <= 30:
+        age_factor = 1.0  # Edad óptima
+    elif age <= 35:
+        age_factor = 1.2  # Experimentados
+    else:
+        age_factor = 1.5  # Veteranos muy valorados
+    
+    # Habilidad y experiencia son los factores más importantes
+    skill_factor = skill / 50.0  # 50 es el promedio
+    experience_factor = experience / 50.0
+    
+    # Factores secundarios
+    consistency_factor = consistency / 50.0
+    growth_factor = growth_potential / 50.0
+    
+    # La agresión puede ser positiva o negativa dependiendo del nivel
+    aggression_factor = 1.0
+    if aggression < 50:
+        aggression_factor = 0.9  # Muy conservador
+    elif aggression > 80:
+        aggression_factor = 1.1  # Muy agresivo (arriesgado pero puede dar resultados)
+    
+    # Cálculo final del salario
+    salary = base_salary * age_factor * skill_factor * experience_factor * consistency_factor * growth_factor * aggression_factor
+    
+    # Ajustar rango razonable para pilotos de F1
+    salary = max(200000, min(15000000, salary))
+    
+    return int(salary)
+
+def calculate_mechanic_salary(age, pit_stop_skill, reliability_skill, growth_potential):
+    """Calcula el salario del mecánico basado en sus atributos"""
+    base_salary = 80000
+    
+    # Factores de ajuste
+    age_factor = 1.0
+    if age <= 30:
+        age_factor = 0.8  # Jóvenes ganan menos
+    elif age <= 45:
+        age_factor = 1.0  # Edad óptima
+    elif age <= 55:
+        age_factor = 1.3  # Experimentados muy valorados
+    else:
+        age_factor = 1.5  # Veteranos con mucha experiencia
+    
+    # Habilidades principales
+    pit_skill_factor = pit_stop_skill / 50.0
+    reliability_factor = reliability_skill / 50.0
+    growth_factor = growth_potential / 50.0
+    
+    # Cálculo final
+    salary = base_salary * age_factor * pit_skill_factor * reliability_factor * growth_factor
+    
+    # Ajustar rango razonable para mecánicos de F1
+    salary = max(50000, min(400000, salary))
+    
+    return int(salary)
+
+def calculate_engineer_salary(age, innovation, development_speed, growth_potential):
+    """Calcula el salario del ingeniero basado en sus atributos"""
+    base_salary = 120000
+    
+    # Factores de ajuste
+    age_factor = 1.0
+    if age <= 35:
+        age_factor = 0.8  # Jóvenes ganan menos
+    elif age <= 50:
+        age_factor = 1.0  # Edad óptima
+    elif age <= 65:
+        age_factor = 1.4  # Experimentados muy valorados
+    else:
+        age_factor = 1.6  # Veteranos con mucha experiencia
+    
+    # Habilidades principales
+    innovation_factor = innovation / 50.0
+    development_factor = development_speed / 50.0
+    growth_factor = growth_potential / 50.0
+    
+    # Cálculo final
+    salary = base_salary * age_factor * innovation_factor * development_factor * growth_factor
+    
+    # Ajustar rango razonable para ingenieros de F1
+    salary = max(80000, min(600000, salary))
+    
+    return int(salary)
+
+# Relación calidad/precio (mismas fórmulas que muestra la página del mercado)
+def calculate_driver_value_score(skill, experience, consistency, salary):
+    """Puntos de habilidad del piloto por cada 1.000€ de salario"""
+    return (skill + experience + consistency) / salary * 1000 if salary else 0.0
+
+def calculate_mechanic_value_score(pit_stop_skill, reliability_skill, salary):
+    """Puntos de habilidad del mecánico por cada 1.000€ de salario"""
+    return (pit_stop_skill + reliability_skill) / salary * 1000 if salary else 0.0
+
+def calculate_engineer_value_score(innovation, development_speed, salary):
+    """Puntos de habilidad del ingeniero por cada 1.000€ de salario"""
+    return (innovation + development_speed) / salary * 1000 if salary else 0.0
+
+
+def finance_period(moment=None):
+    """Periodo contable ('YYYY-MM') al que pertenece una fecha"""
+    return (moment or datetime.utcnow()).strftime('%Y-%m')
+
+def month_start(moment=None, months_back=0):
+    """Primer instante del mes de una fecha, opcionalmente N meses atrás.
+
+    Sirve para filtrar con rangos semiabiertos [inicio, siguiente_inicio)
+    sobre created_at, que sí pueden usar el índice.
+    """
+    moment = moment or datetime.utcnow()
+    month_index = moment.year * 12 + (moment.month - 1) - months_back
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+class FinancialTransaction(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    transaction_type = db.Column(db.String(20), nullable=False)  # income, expense
+    category = db.Column(db.String(50), nullable=False)  # salary, upgrade, training, sponsorship, race_prize, etc.
+    amount = db.Column(db.Float, nullable=False)
+    description = db.Column(db.String(200), nullable=False)
+    balance_after = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    team = db.relationship('User', backref='financial_transactions')
+
+    __table_args__ = (
+        db.Index('ix_financial_transaction_team_created', 'team_id', 'created_at'),
+    )
+
+class Budget(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    allocated_amount = db.Column(db.Float, nullable=False)
+    spent_amount = db.Column(db.Float, default=0.0)
+    month = db.Column(db.Integer, nullable=False)  # 1-12
+    year = db.Column(db.Integer, nullable=False)
+    
+    team = db.relationship('User', backref='budgets')
+
+class FinanceMonthlySnapshot(db.Model):
+    """Acumulado mensual por equipo, categoría y tipo de transacción"""
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    period = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    category = db.Column(db.String(50), nullable=False)
+    transaction_type = db.Column(db.String(20), nullable=False)
+    total_amount = db.Column(db.Float, default=0.0, nullable=False)
+    transaction_count = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('team_id', 'period', 'category', 'transaction_type',
+                            name='uq_finance_snapshot_team_period_category'),
+    )
+
+class FinanceBalanceSnapshot(db.Model):
+    """Saldo de apertura/cierre e ingresos/gastos de cada equipo por mes"""
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    period = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    opening_balance = db.Column(db.Float, nullable=False)
+    closing_balance = db.Column(db.Float, nullable=False)
+    total_income = db.Column(db.Float, default=0.0, nullable=False)
+    total_expenses = db.Column(db.Float, default=0.0, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('team_id', 'period', name='uq_finance_balance_team_period'),
+    )
+
+
+class TeamStanding(db.Model):
+    """Clasificación acumulada de cada equipo, incrementada al liquidar cada carrera"""
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
+    points = db.Column(db.Integer, default=0, nullable=False)
+    races_entered = db.Column(db.Integer, default=0, nullable=False)  # Participaciones (una por piloto)
+    wins = db.Column(db.Integer, default=0, nullable=False)
+    podiums = db.Column(db.Integer, default=0, nullable=False)
+    prize_money = db.Column(db.Float, default=0.0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    team = db.relationship('User', backref=db.backref('standing', uselist=False))
+
+    __table_args__ = (
+        db.Index('ix_team_standing_points', 'points'),
+    )
+
+class RaceSettlement(db.Model):
+    """Marca de carrera liquidada (premios y clasificación), una por carrera"""
+    id = db.Column(db.Integer, primary_key=True)
+    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False, unique=True)
+    version = db.Column(db.Integer, nullable=False)  # Versión de resultados liquidada (Race.results_version)
+    teams_paid = db.Column(db.Integer, default=0)
+    total_prize = db.Column(db.Float, default=0.0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    race = db.relationship('Race', backref=db.backref('settlement', uselist=False))
+
+
+class PayrollRun(db.Model):
+    """Registro de nóminas cobradas tras una carrera (una sola vez por carrera)"""
+    id = db.Column(db.Integer, primary_key=True)
+    race_id = db.Column(db.Integer, db.ForeignKey('race.id'), nullable=False, unique=True)
+    teams_charged = db.Column(db.Integer, default=0)
+    staff_count = db.Column(db.Integer, default=0)
+    total_amount = db.Column(db.Float, default=0.0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    race = db.relationship('Race', backref=db.backref('payroll_run', uselist=False))
+
+
+class CacheGeneration(db.Model):
+    """Versión de cada espacio de caché; subirla invalida la caché en todos los procesos"""
+    namespace = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+class SchedulerLease(db.Model):
+    """Concesión con caducidad que decide qué proceso ejecuta el scheduler"""
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
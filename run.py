@@ -1,4 +1,4 @@
-from app import app
+from app import get_app
 import os
 
 def check_ssl_certificates():
@@ -13,6 +13,10 @@ def check_ssl_certificates():
 if __name__ == '__main__':
     ssl_context = check_ssl_certificates()
     
+    # Con debug=True el recargador ejecuta este script dos veces; el
+    # scheduler solo debe arrancar en el proceso que atiende peticiones
+    app = get_app(start_services=os.environ.get('WERKZEUG_RUN_MAIN') == 'true')
+    
     if ssl_context:
         print("========================================")
         print("    F1 MANAGER - MODO HTTPS")
@@ -0,0 +1,91 @@
+"""Punto de entrada de producción: Waitress con varios procesos y hilos.
+
+Cada proceso hijo importa la aplicación por su cuenta (sin compartir
+conexiones a la base de datos) y atiende el mismo socket con
+SERVER_THREADS hilos. Todos los procesos compiten por la concesión del
+scheduler en la base de datos; solo el líder ejecuta las tareas
+programadas y las simulaciones automáticas.
+
+Uso:
+    F1_WORKERS=4 F1_THREADS=8 python serve.py
+
+En Windows no se pueden compartir sockets entre procesos creados con
+fork, así que se usa un único proceso con varios hilos.
+"""
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+
+from config import Config
+
+
+def create_listener(host, port):
+    """Crea el socket de escucha compartido por todos los procesos"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(1024)
+    return listener
+
+
+def run_worker(listener, threads):
+    """Proceso trabajador: importa la app, arranca la elección de líder y sirve"""
+    from waitress import serve
+    from app import get_app, release_scheduler_lease
+
+    # Salir limpiamente con SIGTERM para liberar la concesión del scheduler
+    # (los hijos de multiprocessing no ejecutan atexit)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    app = get_app(start_services=True)
+    try:
+        serve(app, sockets=[listener], threads=threads, ident='F1 Manager')
+    finally:
+        release_scheduler_lease()
+
+
+def main():
+    host, port = Config.SERVER_HOST, Config.SERVER_PORT
+    workers = max(1, Config.SERVER_WORKERS)
+    threads = max(1, Config.SERVER_THREADS)
+    if os.name == 'nt':
+        workers = 1
+
+    listener = create_listener(host, port)
+
+    print("========================================")
+    print("    F1 MANAGER - PRODUCCIÓN (WAITRESS)")
+    print("========================================")
+    print(f"Escuchando en: http://{host}:{port}")
+    print(f"Procesos: {workers} | Hilos por proceso: {threads}")
+    print("========================================")
+
+    if workers == 1:
+        run_worker(listener, threads)
+        return
+
+    # Los hijos se crean con fork antes de importar la app en el padre
+    context = multiprocessing.get_context('fork')
+    processes = [
+        context.Process(target=run_worker, args=(listener, threads), name=f'f1-worker-{i}')
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def shutdown(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    for process in processes:
+        process.join()
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
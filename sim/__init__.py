@@ -0,0 +1,63 @@
+# sim/__init__.py
+"""Núcleo de simulación puro: sin Flask, sin base de datos y sin I/O.
+
+La app carga las entradas desde la base de datos, llama a `simulate_race`
+y persiste la salida (ver `simulate_race_with_strategies` en app.py).
+"""
+from .data import (
+    CarInput,
+    CarResult,
+    ComponentInput,
+    QualifyingEntry,
+    QualifyingOutput,
+    QualifyingResult,
+    QualifyingStageResult,
+    RaceInput,
+    RaceOutput,
+    SimEvent,
+    StrategyInput,
+    StrategySegmentInput,
+    WeatherPoint,
+)
+from .divisions import partition_grid, simulate_divisions
+from .qualifying import (
+    ComponentTimeModel,
+    QualifyingSimulation,
+    WeatherTimeModel,
+    advancing_count,
+    format_lap_time,
+    knockout,
+    simulate_qualifying,
+    stage_sizes,
+)
+from .race import RaceSimulation, simulate_race
+from .state import CarState
+
+__all__ = [
+    'CarInput',
+    'CarResult',
+    'ComponentInput',
+    'QualifyingEntry',
+    'QualifyingOutput',
+    'QualifyingResult',
+    'QualifyingStageResult',
+    'RaceInput',
+    'RaceOutput',
+    'SimEvent',
+    'StrategyInput',
+    'StrategySegmentInput',
+    'WeatherPoint',
+    'CarState',
+    'partition_grid',
+    'simulate_divisions',
+    'ComponentTimeModel',
+    'QualifyingSimulation',
+    'WeatherTimeModel',
+    'advancing_count',
+    'format_lap_time',
+    'knockout',
+    'simulate_qualifying',
+    'stage_sizes',
+    'RaceSimulation',
+    'simulate_race',
+]
@@ -0,0 +1,171 @@
+# sim/data.py
+"""Entradas y salidas del núcleo de simulación.
+
+Son objetos planos (sin ORM ni sesión) para que una simulación pueda
+ejecutarse en otro proceso, en un benchmark o en un bucle Monte Carlo.
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+WEATHER_CONDITIONS = ('dry', 'light_rain', 'heavy_rain')
+DEFAULT_POINTS = (25, 18, 15, 12, 10, 8, 6, 4, 2, 1)
+
+
+@dataclass(frozen=True)
+class ComponentInput:
+    component_type: str
+    strength: int = 50
+    reliability: int = 75
+
+
+@dataclass(frozen=True)
+class StrategySegmentInput:
+    tyre_type: str
+    laps_planned: int
+
+
+@dataclass(frozen=True)
+class StrategyInput:
+    """Estrategia de carrera de un piloto (segmentos ya ordenados)"""
+    starting_tyre: str = 'soft'
+    segments: Tuple[StrategySegmentInput, ...] = ()
+    rain_strategy: str = 'continue'
+    heavy_rain_strategy: str = 'continue'
+    dry_strategy: str = 'continue'
+
+
+@dataclass(frozen=True)
+class CarInput:
+    driver_id: int
+    driver_name: str
+    team_id: int
+    team_name: str
+    driver_skill: int
+    driver_consistency: int
+    components: Tuple[ComponentInput, ...] = ()
+    strategy: Optional[StrategyInput] = None
+
+
+@dataclass(frozen=True)
+class WeatherPoint:
+    """Condición vigente a partir de la vuelta indicada"""
+    lap: int
+    condition: str
+
+
+@dataclass(frozen=True)
+class RaceInput:
+    """Todo lo necesario para simular una carrera. `cars` va en orden de parrilla."""
+    total_laps: int
+    cars: Tuple[CarInput, ...]
+    weather: Tuple[WeatherPoint, ...] = (WeatherPoint(0, 'dry'),)
+    seed: Optional[int] = None
+    safety_car: bool = True  # comprimir diferencias con safety car tras abandonos
+    points: Tuple[int, ...] = DEFAULT_POINTS  # puntos por posición, desde el ganador
+    division: int = 1
+
+    def weather_at(self, lap):
+        """Condición climática vigente en una vuelta según la línea temporal"""
+        condition = self.weather[0].condition if self.weather else 'dry'
+        for point in self.weather:
+            if point.lap > lap:
+                break
+            condition = point.condition
+        return condition
+
+
+@dataclass(frozen=True)
+class SimEvent:
+    """Evento de carrera; el adaptador lo convierte en LiveEvent"""
+    lap: int
+    event_type: str
+    description: str
+    team_id: int = 0
+    driver_id: int = 0
+
+
+@dataclass
+class CarResult:
+    driver_id: int
+    driver_name: str
+    team_id: int
+    team_name: str
+    grid_position: int
+    final_position: int
+    finished: bool
+    dnf: bool
+    dnf_reason: Optional[str]
+    total_time: float
+    pit_stops: int
+    points: int
+    fastest_lap: bool
+    incidents: int = 0
+    mechanical_failures: int = 0
+    division: int = 1
+    lap_times: List[float] = field(default_factory=list)
+
+
+@dataclass
+class RaceOutput:
+    results: List[CarResult]
+    events: List[SimEvent]
+
+    @property
+    def winner(self):
+        """Primer clasificado que terminó la carrera, o None si todos abandonaron"""
+        for result in self.results:
+            if result.finished:
+                return result
+        return None
+
+
+@dataclass(frozen=True)
+class QualifyingEntry:
+    """Un piloto en la clasificación con lo que necesitan los modelos de tiempo"""
+    team_id: int
+    driver_id: int
+    driver_name: str
+    team_name: str
+    tyre_choice: str
+    driver_skill: int
+    driver_experience: int
+    driver_consistency: int
+    components: Tuple[ComponentInput, ...] = ()
+
+
+@dataclass
+class QualifyingResult:
+    team_id: int
+    driver_id: int
+    driver_name: str
+    team_name: str
+    tyre_choice: str
+    final_position: int
+    stage_times: Tuple[float, ...]  # una vuelta por fase disputada (Q1, Q2...)
+
+    @property
+    def best_time(self):
+        """Tiempo de la última fase disputada, el que decide la posición"""
+        return self.stage_times[-1]
+
+
+@dataclass(frozen=True)
+class QualifyingStageResult:
+    """Resumen de una fase; se guarda tal cual en QualifyingStage"""
+    stage: int
+    participants: int
+    advancing: int
+    fastest_time: float
+    fastest_driver_id: int
+    cutoff_time: Optional[float]
+
+
+@dataclass
+class QualifyingOutput:
+    results: List[QualifyingResult]
+    stages: List[QualifyingStageResult]
+    events: List[SimEvent]
+
+    @property
+    def pole(self):
+        return self.results[0] if self.results else None
@@ -0,0 +1,53 @@
+# sim/divisions.py
+"""Ligas grandes: reparto de la parrilla en divisiones que se simulan por separado."""
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from .race import simulate_race
+
+
+def partition_grid(cars, division_size, seeding='qualifying'):
+    """Reparte la parrilla en divisiones de como mucho `division_size` coches.
+
+    `cars` llega en orden de parrilla. Con seeding 'qualifying' la primera
+    división son los más rápidos en clasificación; con 'rating' se ordena por
+    habilidad + constancia del piloto. Las divisiones salen del mismo tamaño
+    (±1) y cada una conserva el orden de parrilla de sus coches.
+    """
+    cars = list(cars)
+    if division_size <= 0 or len(cars) <= division_size:
+        return [tuple(cars)]
+
+    grid_rank = {id(car): rank for rank, car in enumerate(cars)}
+    if seeding == 'rating':
+        ranked = sorted(cars, key=lambda car: car.driver_skill + car.driver_consistency, reverse=True)
+    else:
+        ranked = cars
+
+    count = math.ceil(len(cars) / division_size)
+    base, extra = divmod(len(cars), count)
+    divisions = []
+    start = 0
+    for number in range(count):
+        size = base + (1 if number < extra else 0)
+        members = sorted(ranked[start:start + size], key=lambda car: grid_rank[id(car)])
+        divisions.append(tuple(members))
+        start += size
+    return divisions
+
+
+def simulate_divisions(race_inputs, workers=1):
+    """Simula las divisiones (independientes entre sí) y devuelve sus salidas en orden.
+
+    Con más de un worker cada división va a un proceso del pool; las entradas
+    y salidas son objetos planos y viajan por pickle. Los procesos se crean
+    con 'spawn' y no con fork: quien llama es un hilo de Waitress o del
+    scheduler, y un fork de un proceso con varios hilos hereda conexiones a
+    la base de datos y locks que pueden estar tomados.
+    """
+    if workers <= 1 or len(race_inputs) <= 1:
+        return [simulate_race(race_input) for race_input in race_inputs]
+    with ProcessPoolExecutor(max_workers=min(workers, len(race_inputs)),
+                             mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(pool.map(simulate_race, race_inputs))
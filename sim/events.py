@@ -0,0 +1,49 @@
+# sim/events.py
+"""Programación de eventos aleatorios por saltos geométricos.
+
+En lugar de tirar un dado en cada vuelta para cada tipo de evento se sortea
+cuántas vueltas faltan para la próxima ocurrencia y se guarda en una cola de
+prioridad. Las vueltas tranquilas no consumen números aleatorios.
+"""
+import heapq
+import math
+
+
+def geometric_gap(rng, probability):
+    """Ensayos hasta el primer éxito de un Bernoulli(probability), siempre >= 1.
+
+    Equivale a tirar un dado por ensayo y contar hasta que sale, con una sola
+    llamada al generador. Devuelve None si la probabilidad es 0.
+    """
+    if probability <= 0:
+        return None
+    if probability >= 1:
+        return 1
+    return int(math.log(1.0 - rng.random()) / math.log1p(-probability)) + 1
+
+
+class EventScheduler:
+    """Cola de prioridad de eventos (vuelta, tipo, dato)"""
+
+    def __init__(self):
+        self._heap = []
+        self._sequence = 0
+
+    def schedule(self, lap, kind, payload=None):
+        # La secuencia desempata eventos de la misma vuelta por orden de alta
+        heapq.heappush(self._heap, (lap, self._sequence, kind, payload))
+        self._sequence += 1
+
+    def schedule_after(self, rng, lap, probability, kind, payload=None):
+        """Programa la próxima ocurrencia de un evento con `probability` por vuelta"""
+        gap = geometric_gap(rng, probability)
+        if gap is not None:
+            self.schedule(lap + gap, kind, payload)
+
+    def pop_due(self, lap):
+        """Saca los eventos programados hasta `lap` inclusive, en orden"""
+        due = []
+        while self._heap and self._heap[0][0] <= lap:
+            _, _, kind, payload = heapq.heappop(self._heap)
+            due.append((kind, payload))
+        return due
@@ -0,0 +1,289 @@
+# sim/qualifying.py
+"""Clasificación por eliminatorias: cortes, selección de los más rápidos y el motor de la sesión.
+
+El motor (`QualifyingSimulation`) es el mismo para todas las entradas de la
+app; lo que cambia es el modelo de tiempos. Un modelo calcula los tiempos de
+toda una fase de una vez a partir de un bloque de uniformes.
+"""
+import heapq
+import math
+import random
+
+from .data import QualifyingOutput, QualifyingResult, QualifyingStageResult, SimEvent
+from .streams import uniform_block
+
+
+def advancing_count(spec, field_size):
+    """Cuántos pilotos pasan el corte.
+
+    `spec` puede ser un número absoluto (15), una fracción (0.75) o un
+    porcentaje en texto ('75%'), siempre relativo a la parrilla completa.
+    """
+    if isinstance(spec, str) and spec.endswith('%'):
+        spec = float(spec[:-1]) / 100
+    if isinstance(spec, float) and spec <= 1:
+        count = math.ceil(field_size * spec)
+    else:
+        count = int(spec)
+    return max(1, min(field_size, count))
+
+
+def stage_sizes(knockout, field_size):
+    """Participantes de cada fase: la parrilla completa y luego cada corte, nunca creciendo"""
+    sizes = [field_size]
+    for spec in knockout:
+        sizes.append(min(sizes[-1], advancing_count(spec, field_size)))
+    return sizes
+
+
+def knockout(entries, advance, key):
+    """Separa los `advance` más rápidos del resto.
+
+    La selección es parcial (heapq.nsmallest, O(n log k)); sólo se ordena a
+    los eliminados, que necesitan su posición final. Devuelve
+    (clasificados ordenados, eliminados ordenados).
+    """
+    if advance >= len(entries):
+        return sorted(entries, key=key), []
+    advancing = heapq.nsmallest(advance, entries, key=key)
+    chosen = {id(entry) for entry in advancing}
+    eliminated = sorted((entry for entry in entries if id(entry) not in chosen), key=key)
+    return advancing, eliminated
+
+
+def format_lap_time(seconds):
+    """Convierte segundos a formato minutos:segundos.milisegundos"""
+    if not seconds or seconds <= 0:
+        return "0:00.000"
+
+    minutes = int(seconds // 60)
+    remaining_seconds = seconds % 60
+    return f"{minutes}:{remaining_seconds:06.3f}"
+
+
+def average_strength(components, default=50):
+    if not components:
+        return default
+    return sum(component.strength for component in components) / len(components)
+
+
+# Mejora de tiempo respecto a la fase anterior (mínimo, máximo) y tiempo tope por fase
+STAGE_IMPROVEMENT = {
+    2: (0.3, 1.0, 74.0),  # Q2: los pilotos presionan más
+    3: (0.5, 1.5, 73.0),  # Q3 y siguientes: máximo esfuerzo
+}
+
+
+class ComponentTimeModel:
+    """Modelo de la clasificación en directo: neumático, piloto y componentes del coche.
+
+    Q1 parte del tiempo base del neumático; en las fases siguientes cada piloto
+    mejora su vuelta anterior (STAGE_IMPROVEMENT), sin bajar del tope.
+    """
+    BASE_TIMES = {
+        'soft': 75.0,
+        'medium': 76.5,
+        'hard': 78.0,
+        'wet': 82.0,
+        'extreme_wet': 85.0
+    }
+
+    def base_time(self, entry):
+        base = self.BASE_TIMES.get(entry.tyre_choice, 76.0)
+        # EFECTO DEL PILOTO (más fuerte en clasificación)
+        driver_effect = (100 - entry.driver_skill) / 80
+        # EFECTO DEL COCHE (strength afecta directamente, amplificado en clasificación)
+        car_effect = (average_strength(entry.components) - 50) * -0.015
+        # VARIABILIDAD REDUCIDA EN CLASIFICACIÓN
+        consistency_variation = (100 - entry.driver_consistency) / 300
+        return base - driver_effect - car_effect + consistency_variation
+
+    def stage_times(self, rng, entries, stage, previous):
+        """Tiempos de una fase; `previous` son los de la fase anterior (None en Q1)"""
+        noise = uniform_block(rng, len(entries))
+        if stage == 1:
+            return [self.base_time(entry) + (u - 0.5) * 0.8 for entry, u in zip(entries, noise)]
+        low, high, floor = STAGE_IMPROVEMENT[min(stage, 3)]
+        return [max(floor, time - (low + (high - low) * u)) for time, u in zip(previous, noise)]
+
+
+class WeatherTimeModel:
+    """Modelo de la clasificación rápida: cada fase es una vuelta nueva con el clima del pronóstico.
+
+    `condition` es la condición del pronóstico o None si no lo hay (se corre en seco).
+    """
+    TYRE_EFFECTS = {
+        'soft': -2.0,    # Más rápido
+        'medium': -1.0,  # Intermedio
+        'hard': 0.0,     # Neutral
+        'wet': 8.0,      # Más lento en seco
+        'extreme_wet': 12.0  # Mucho más lento en seco
+    }
+    DRY_TYRES = ('soft', 'medium', 'hard')
+
+    def __init__(self, condition=None):
+        self.condition = condition
+
+    def tyre_effect(self, tyre_choice):
+        effect = self.TYRE_EFFECTS.get(tyre_choice, 0.0)
+        if self.condition == 'light_rain':
+            if tyre_choice in self.DRY_TYRES:
+                effect += 15.0  # Muy lento con neumáticos de seco en lluvia
+            elif tyre_choice == 'wet':
+                effect = 2.0    # Bueno para lluvia ligera
+            else:  # extreme_wet
+                effect = 4.0    # Demasiado conservador
+        elif self.condition == 'heavy_rain':
+            if tyre_choice in self.DRY_TYRES:
+                effect += 25.0  # Extremadamente lento/peligroso
+            elif tyre_choice == 'wet':
+                effect += 8.0   # Riesgoso en lluvia intensa
+            else:  # extreme_wet
+                effect = 3.0    # Ideal para lluvia intensa
+        return effect
+
+    def base_time(self, entry):
+        # 1:25.000 como referencia; mejor piloto y mejor coche = menos tiempo
+        driver_effect = (100 - (entry.driver_skill + entry.driver_experience) / 2) / 200
+        car_performance = sum(component.strength for component in entry.components) / 4
+        car_effect = (100 - car_performance) / 150
+        return 85.0 - driver_effect - car_effect + self.tyre_effect(entry.tyre_choice)
+
+    def stage_times(self, rng, entries, stage, previous):
+        noise = uniform_block(rng, len(entries))
+        times = [round(self.base_time(entry) + (u - 0.5), 3) for entry, u in zip(entries, noise)]
+        if self.condition in (None, 'dry'):
+            return times
+
+        # Penalización por neumático incorrecto y variabilidad por condiciones
+        penalty = uniform_block(rng, len(entries))
+        variability = uniform_block(rng, len(entries))
+        for i, entry in enumerate(entries):
+            extra = -1.0 + 4.0 * variability[i]
+            if self.condition == 'light_rain' and entry.tyre_choice in self.DRY_TYRES:
+                extra += 2.0 + 3.0 * penalty[i]
+            elif self.condition == 'heavy_rain' and entry.tyre_choice != 'extreme_wet':
+                extra += 5.0 + 5.0 * penalty[i]
+            times[i] = round(times[i] + extra, 3)
+        return times
+
+
+# Probabilidad de que la vuelta de un piloto aparezca en el directo, por fase
+STAGE_EVENT_PROBABILITY = {1: 0.3, 2: 0.4}
+
+
+def stage_lap_description(stage, name, lap_time):
+    if stage == 1:
+        return f'🚀 {name} marca {format_lap_time(lap_time)} en Q1'
+    if stage == 2:
+        return f'💨 {name} mejora a {lap_time:.3f}s en Q2'
+    return f'🏎️ {name} marca {format_lap_time(lap_time)} en Q{stage}!'
+
+
+def simulate_qualifying(entries, knockout_spec, time_model, seed=None):
+    """Simula una clasificación completa y devuelve un QualifyingOutput"""
+    return QualifyingSimulation(entries, knockout_spec, time_model, random.Random(seed)).run()
+
+
+class QualifyingSimulation:
+    """Motor único de clasificación.
+
+    `knockout_spec` son los cortes (ver `stage_sizes`); con () hay una sola
+    fase. Los eventos salen en el orden en que se muestran en el directo.
+    """
+
+    def __init__(self, entries, knockout_spec, time_model, rng=None):
+        self.entries = list(entries)
+        self.sizes = stage_sizes(knockout_spec, len(self.entries)) if self.entries else []
+        self.time_model = time_model
+        self.rng = rng or random.Random()
+        self.events = []
+
+    def add_event(self, lap, event_type, description, entry=None):
+        self.events.append(SimEvent(
+            lap=lap,
+            event_type=event_type,
+            description=description,
+            team_id=entry.team_id if entry else 0,
+            driver_id=entry.driver_id if entry else 0
+        ))
+
+    def run(self):
+        self.add_event(0, 'qualifying_start', '🏁 INICIO DE CLASIFICACIÓN - Q1 COMIENZA!')
+
+        # Por piloto, sus tiempos de cada fase; se avanza con índices sobre `entries`
+        times = [[] for _ in self.entries]
+        participants = list(range(len(self.entries)))
+        eliminated_by_stage = []
+        stages = []
+
+        for stage in range(1, len(self.sizes) + 1):
+            stage_entries = [self.entries[i] for i in participants]
+            previous = [times[i][-1] for i in participants] if stage > 1 else None
+            for i, lap_time in zip(participants, self.time_model.stage_times(self.rng, stage_entries, stage, previous)):
+                times[i].append(lap_time)
+
+            probability = STAGE_EVENT_PROBABILITY.get(stage, 1.0)
+            for i in participants:
+                if probability >= 1 or self.rng.random() < probability:
+                    self.add_event(stage, 'qualifying_fast_lap',
+                                   stage_lap_description(stage, self.entries[i].driver_name, times[i][-1]),
+                                   self.entries[i])
+
+            is_final_stage = stage == len(self.sizes)
+            advance = len(participants) if is_final_stage else self.sizes[stage]
+            advancing, eliminated = knockout(participants, advance, key=lambda i: times[i][-1])
+            fastest, cutoff = advancing[0], (advancing[-1] if eliminated else None)
+            stages.append(QualifyingStageResult(
+                stage=stage,
+                participants=len(participants),
+                advancing=len(advancing),
+                fastest_time=times[fastest][-1],
+                fastest_driver_id=self.entries[fastest].driver_id,
+                cutoff_time=times[cutoff][-1] if cutoff is not None else None
+            ))
+            self.stage_events(stage, is_final_stage, fastest, cutoff, len(eliminated), times)
+
+            eliminated_by_stage.append(eliminated)
+            participants = advancing
+
+        # Última fase y después los eliminados, de la última fase a la primera
+        order = participants
+        for eliminated in reversed(eliminated_by_stage):
+            order += eliminated
+        results = [
+            QualifyingResult(
+                team_id=self.entries[i].team_id,
+                driver_id=self.entries[i].driver_id,
+                driver_name=self.entries[i].driver_name,
+                team_name=self.entries[i].team_name,
+                tyre_choice=self.entries[i].tyre_choice,
+                final_position=position,
+                stage_times=tuple(times[i])
+            )
+            for position, i in enumerate(order, start=1)
+        ]
+
+        if results:
+            pole = results[0]
+            self.add_event(0, 'qualifying_pole',
+                           f'🏆 {pole.driver_name} CONSIGUE LA POLE POSITION! - {format_lap_time(pole.best_time)}',
+                           pole)
+        return QualifyingOutput(results=results, stages=stages, events=self.events)
+
+    def stage_events(self, stage, is_final_stage, fastest, cutoff, eliminated_count, times):
+        name = self.entries[fastest].driver_name
+        fastest_time = format_lap_time(times[fastest][-1])
+        if is_final_stage:
+            self.add_event(stage, 'qualifying_end',
+                           f'🏁 CLASIFICACIÓN FINALIZADA - {name} consigue la POLE POSITION con {fastest_time}!')
+            return
+        self.add_event(stage, 'qualifying_fast_lap',
+                       f'🏆 {name} MARCA LA VUELTA RÁPIDA DE Q{stage}: {fastest_time}!',
+                       self.entries[fastest])
+        if cutoff is not None:
+            self.add_event(stage, 'qualifying_eliminated',
+                           f'⏰ {self.entries[cutoff].driver_name} ES EL ÚLTIMO EN PASAR A Q{stage + 1}: '
+                           f'{format_lap_time(times[cutoff][-1])}',
+                           self.entries[cutoff])
+            self.add_event(stage, 'qualifying_end', f'🏁 Q{stage} FINALIZADO - {eliminated_count} pilotos eliminados')
@@ -0,0 +1,449 @@
+# sim/race.py
+"""Simulación de carrera vuelta a vuelta con estrategias, clima y fiabilidad.
+
+No toca la base de datos ni duerme: recibe un RaceInput y devuelve un
+RaceOutput con resultados y eventos. Toda la aleatoriedad sale de un único
+random.Random sembrado con `RaceInput.seed`, así que la misma entrada con la
+misma semilla produce la misma carrera.
+"""
+import random
+from operator import attrgetter
+
+from .data import RaceOutput, SimEvent, WEATHER_CONDITIONS
+from .events import EventScheduler
+from .reliability import failed_component, lap_failure_risk, sample_failure_lap
+from .state import CarState
+from .streams import RaceRandomBlocks
+
+FASTEST_LAP_POINT = 1
+WEATHER_CHANGE_PROBABILITY = 0.02  # por coche y vuelta
+LAP_EVENT_PROBABILITY = 0.15  # trompo, salida de pista o vuelta rápida, por vuelta
+MIN_FAILURE_RISK = 0.0002  # por vuelta
+
+# Modelo de intervalos: el orden de carrera es el del tiempo acumulado
+GRID_SLOT_GAP = 0.25  # segundos entre posiciones de parrilla en la salida
+DRS_WINDOW = 1.0  # sólo se pelea la posición a menos de un segundo
+DRS_BONUS = 0.15  # probabilidad extra de adelantar pegado al de delante
+OVERTAKE_TIME_LOSS = 0.3  # el que pierde la posición queda a esta distancia
+SAFETY_CAR_PROBABILITY = 0.4  # por abandono
+SAFETY_CAR_LAPS = 3
+SAFETY_CAR_GAP = 0.5  # separación máxima entre coches tras el safety car
+SAFETY_CAR_LAP_DELTA = 25.0  # segundos más lenta cada vuelta detrás del safety car
+
+
+def default_tyre_for_weather(weather):
+    """Neumático por defecto para coches sin estrategia según las condiciones"""
+    if weather == 'dry':
+        return 'hard'
+    elif weather == 'light_rain':
+        return 'wet'
+    else:  # heavy_rain
+        return 'extreme_wet'
+
+
+def is_tyre_appropriate_for_weather(tyre, weather):
+    """Verifica si un neumático es apropiado para las condiciones climáticas"""
+    if weather == 'dry':
+        return tyre in ['soft', 'medium', 'hard']
+    elif weather == 'light_rain':
+        return tyre in ['wet', 'extreme_wet']
+    else:  # heavy_rain
+        return tyre == 'extreme_wet'
+
+
+def settle_order(cars):
+    """Ordena por tiempo acumulado por inserción.
+
+    De una vuelta a otra el orden apenas cambia, así que cuesta O(n + cambios)
+    en lugar de una ordenación completa.
+    """
+    for i in range(1, len(cars)):
+        car = cars[i]
+        j = i - 1
+        while j >= 0 and cars[j].total_time > car.total_time:
+            cars[j + 1] = cars[j]
+            j -= 1
+        cars[j + 1] = car
+
+
+def simulate_race(race_input):
+    """Simula una carrera completa y devuelve un RaceOutput"""
+    return RaceSimulation(race_input).run()
+
+
+class RaceSimulation:
+    def __init__(self, race_input, rng=None):
+        self.race_input = race_input
+        self.total_laps = race_input.total_laps
+        self.rng = rng or random.Random(race_input.seed)
+        self.events = []
+        starting_tyre = default_tyre_for_weather(race_input.weather_at(0))
+        self.cars = [CarState(car, grid, starting_tyre)
+                     for grid, car in enumerate(race_input.cars, start=1)]
+
+        # Orden de carrera (sólo coches activos); se sale escalonado según la parrilla
+        for car in self.cars:
+            car.total_time = (car.grid_position - 1) * GRID_SLOT_GAP
+        self.order = list(self.cars)
+        self.safety_car_laps = 0
+
+        # Variación de vuelta, desgaste y paradas: bloques pregenerados por (vuelta, coche)
+        self.random_blocks = RaceRandomBlocks(self.rng.getrandbits(64), self.total_laps, len(self.cars))
+        # Contadores de abandonos, mantenidos por retire()
+        self.dnf_count = 0
+        self.team_dnf_count = {}
+        self.field_protection_threshold = len(self.cars) // 2
+        self.team_cars = {}
+        for car in self.cars:
+            self.team_cars.setdefault(car.team_id, []).append(car)
+
+        # Averías: una vuelta de falla sorteada por coche, indexada por vuelta
+        self.failures_due = {}
+        for car in self.cars:
+            self.build_hazard_curve(car)
+            self.schedule_failure(car, 1)
+
+        # Eventos de pista (desde la vuelta 2) y cambios de clima espontáneos por coche
+        self.scheduler = EventScheduler()
+        self.scheduler.schedule_after(self.rng, 1, LAP_EVENT_PROBABILITY, 'lap_event')
+        for car in self.cars:
+            self.scheduler.schedule_after(self.rng, 0, WEATHER_CHANGE_PROBABILITY, 'weather', car)
+
+    def emit(self, lap, event_type, description, car=None):
+        self.events.append(SimEvent(
+            lap=lap,
+            event_type=event_type,
+            description=description,
+            team_id=car.team_id if car else 0,
+            driver_id=car.driver_id if car else 0,
+        ))
+
+    def run(self):
+        self.emit(1, 'race_start', 'LUCES VERDES! LA CARRERA ESTA EN MARCHA!')
+
+        weather = self.race_input.weather_at(0)
+        for lap in range(1, self.total_laps + 1):
+            # Coches activos en orden de carrera
+            active_cars = self.order
+
+            # Cambio de condiciones programado en la línea temporal
+            new_weather = self.race_input.weather_at(lap)
+            if new_weather != weather:
+                for car in active_cars:
+                    self.apply_weather_change_strategy(car, lap, new_weather)
+                weather = new_weather
+
+            weather_due = set()
+            for kind, payload in self.scheduler.pop_due(lap):
+                if kind == 'lap_event':
+                    if active_cars:
+                        self.simulate_lap_event(active_cars, lap)
+                    self.scheduler.schedule_after(self.rng, lap, LAP_EVENT_PROBABILITY, 'lap_event')
+                else:
+                    weather_due.add(payload)
+
+            self.check_mechanical_failures(lap)
+
+            self.manage_race_strategies(active_cars, lap, weather, weather_due)
+            self.update_car_performance(active_cars, lap)
+            self.check_tyre_wear_pit_stops(active_cars, lap)
+            self.resolve_running_order(lap)
+
+            if lap == self.total_laps:
+                for car in active_cars:
+                    car.finished = True
+
+            # Si no quedan coches activos, terminar la carrera anticipadamente
+            if not active_cars:
+                break
+
+        return RaceOutput(results=self.final_results(), events=self.events)
+
+    def final_results(self):
+        finished_cars = sorted((car for car in self.cars if car.finished and not car.dnf),
+                               key=lambda x: x.total_time)
+        dnf_cars = [car for car in self.cars if car.dnf]
+
+        points_table = self.race_input.points
+        results = []
+        for i, car in enumerate(finished_cars + dnf_cars):
+            points = 0
+            fastest_lap = False
+            if car.finished:
+                points = points_table[i] if i < len(points_table) else 0
+                # Vuelta rapida para el ganador (70% probabilidad)
+                if i == 0 and self.rng.random() < 0.7:
+                    fastest_lap = True
+                    points += FASTEST_LAP_POINT
+            results.append(car.to_result(i + 1, points, fastest_lap, self.race_input.division))
+        return results
+
+    def manage_race_strategies(self, active_cars, current_lap, current_weather, weather_due=()):
+        """Gestiona las estrategias de carrera y cambios de neumáticos.
+
+        `weather_due` son los coches con cambio climático espontáneo en esta vuelta.
+        """
+        for car in active_cars:
+            if car.dnf:
+                continue
+
+            car.segment_laps_completed += 1
+
+            # Cambio climático espontáneo para este coche
+            if car in weather_due:
+                new_weather = self.rng.choice(WEATHER_CONDITIONS)
+                if new_weather != current_weather:
+                    self.apply_weather_change_strategy(car, current_lap, new_weather)
+                self.scheduler.schedule_after(self.rng, current_lap, WEATHER_CHANGE_PROBABILITY, 'weather', car)
+
+            # FIN DE SEGMENTO DE ESTRATEGIA
+            if car.has_strategy:
+                current_segment_idx = car.current_segment
+                tyres = car.segment_tyres
+
+                if (car.segment_laps_completed >= car.segment_laps[current_segment_idx]
+                        and current_segment_idx < len(tyres) - 1):
+                    current_tyre, next_tyre = tyres[current_segment_idx], tyres[current_segment_idx + 1]
+                    self.strategy_pit_stop(car, current_lap, next_tyre,
+                                           f"Estrategia programada: {current_tyre} -> {next_tyre}")
+                    car.current_segment = current_segment_idx + 1
+                    car.segment_laps_completed = 0
+
+            # SIN ESTRATEGIA: cambio por desgaste extremo según condiciones
+            elif car.tyre_wear > 85:
+                new_tyre = default_tyre_for_weather(current_weather)
+                if new_tyre != car.current_tyre:
+                    self.strategy_pit_stop(car, current_lap, new_tyre,
+                                           f"Cambio por desgaste: {car.current_tyre} -> {new_tyre}")
+
+    def apply_weather_change_strategy(self, car, current_lap, new_weather):
+        """Aplica la estrategia definida para cambios climáticos"""
+        if is_tyre_appropriate_for_weather(car.current_tyre, new_weather):
+            return
+
+        if new_weather == 'light_rain':
+            strategy_to_apply = car.rain_strategy
+        elif new_weather == 'heavy_rain':
+            strategy_to_apply = car.heavy_rain_strategy
+        else:
+            strategy_to_apply = car.dry_strategy
+
+        if strategy_to_apply == 'pit_wet' and new_weather == 'light_rain':
+            self.strategy_pit_stop(car, current_lap, 'wet',
+                                   f"Cambio por lluvia: {car.current_tyre} -> Wet")
+        elif strategy_to_apply == 'pit_extreme' and new_weather in ['light_rain', 'heavy_rain']:
+            self.strategy_pit_stop(car, current_lap, 'extreme_wet',
+                                   f"Cambio por lluvia intensa: {car.current_tyre} -> Extreme Wet")
+        elif strategy_to_apply == 'immediate_pit':
+            appropriate_tyre = default_tyre_for_weather(new_weather)
+            self.strategy_pit_stop(car, current_lap, appropriate_tyre,
+                                   f"Boxes inmediato: {car.current_tyre} -> {appropriate_tyre}")
+        elif strategy_to_apply in ['pit_soft', 'pit_medium'] and new_weather == 'dry':
+            new_tyre = 'soft' if strategy_to_apply == 'pit_soft' else 'medium'
+            self.strategy_pit_stop(car, current_lap, new_tyre,
+                                   f"Cambio a seco: {car.current_tyre} -> {new_tyre}")
+        # Para 'continue' o 'next_pit', esperar a la parada programada
+
+    def strategy_pit_stop(self, car, lap, new_tyre, reason):
+        """Parada en boxes por estrategia"""
+        pit_time = self.pit_time(car)
+        car.pit_stops += 1
+        car.last_pit_lap = lap
+        car.tyre_wear = 0
+        car.current_tyre = new_tyre
+        car.total_time += pit_time
+        self.emit(lap, 'race_pit_stop',
+                  f'BOXES {car.driver_name} - {reason} - {pit_time:.1f}s', car)
+
+    def build_hazard_curve(self, car):
+        """Curva de riesgo por vuelta del coche (índice = vuelta) sin las protecciones"""
+        car.hazard_curve = [0.0] + [
+            lap_failure_risk(car.static_risk, lap, self.total_laps, car.incidents) * car.luck_factor
+            for lap in range(1, self.total_laps + 1)
+        ]
+
+    def protection_factor(self, car):
+        """Reducción del riesgo por abandonos previos del equipo y de la parrilla"""
+        factor = 1.0
+        # PROTECCIÓN: menos riesgo si ya hay abandonos en el mismo equipo
+        team_abandoned_count = self.team_dnf_count.get(car.team_id, 0)
+        if team_abandoned_count >= 1:
+            factor *= 0.3
+        if team_abandoned_count >= 2:
+            factor *= 0.1
+        # PROTECCIÓN: menos riesgo si la mitad o más ya abandonaron
+        if self.dnf_count >= self.field_protection_threshold:
+            factor *= 0.2
+        return factor
+
+    def schedule_failure(self, car, from_lap):
+        """Sortea la vuelta de avería del coche a partir de `from_lap`.
+
+        Se vuelve a llamar sólo cuando cambia su riesgo (incidentes o abandonos
+        que activan una protección); las entradas viejas de failures_due se
+        descartan al comprobar car.failure_lap.
+        """
+        factor = self.protection_factor(car)
+        # RIESGO MÍNIMO por vuelta (0.02%)
+        hazards = (max(MIN_FAILURE_RISK, hazard * factor) for hazard in car.hazard_curve[from_lap:])
+        car.failure_lap = sample_failure_lap(self.rng, hazards, from_lap)
+        if car.failure_lap is not None:
+            self.failures_due.setdefault(car.failure_lap, []).append(car)
+
+    def check_mechanical_failures(self, current_lap):
+        """Fallas mecánicas programadas para esta vuelta, en orden de carrera"""
+        while current_lap in self.failures_due:
+            due = self.failures_due.pop(current_lap)
+            due.sort(key=attrgetter('current_position'))
+            for car in due:
+                if car.dnf or car.failure_lap != current_lap:
+                    continue
+                component = failed_component(car.components, self.rng)
+                car.mechanical_failures += 1
+                self.retire(car, current_lap, f'FALLA MECANICA EN {component.upper()}')
+
+    def retire(self, car, lap, reason):
+        """Retira un coche, actualiza los contadores de abandonos y vuelve a
+        sortear la avería de los coches cuya protección acaba de cambiar"""
+        car.dnf = True
+        car.dnf_reason = reason
+        self.dnf_count += 1
+        team_count = self.team_dnf_count.get(car.team_id, 0) + 1
+        self.team_dnf_count[car.team_id] = team_count
+        self.emit(lap, 'race_dnf', f'FALLA! {car.driver_name} ABANDONA! - {reason}', car)
+
+        if (self.race_input.safety_car and not self.safety_car_laps
+                and self.rng.random() < SAFETY_CAR_PROBABILITY):
+            self.safety_car_laps = SAFETY_CAR_LAPS
+            self.emit(lap, 'race_safety_car', f'SAFETY CAR EN PISTA tras el abandono de {car.driver_name}')
+
+        if self.dnf_count == self.field_protection_threshold:
+            affected = self.cars
+        elif team_count <= 2:
+            affected = self.team_cars[car.team_id]
+        else:
+            return
+        for other in affected:
+            if not other.dnf:
+                # Los que ya se comprobaron en esta vuelta cambian a partir de la siguiente
+                from_lap = lap + 1 if other.current_position < car.current_position else lap
+                self.schedule_failure(other, from_lap)
+
+    def pit_time(self, car):
+        """Tiempo de parada (2.5 a 3.5 s), del bloque indexado por número de parada"""
+        blocks = self.random_blocks
+        if car.pit_stops >= blocks.pit_slots:
+            return 2.5 + self.rng.random()
+        return 2.5 + blocks.pit_time[blocks.index(car.pit_stops, car.index)]
+
+    def check_tyre_wear_pit_stops(self, cars, lap):
+        """Paradas por desgaste de neumáticos"""
+        wear_block = self.random_blocks.tyre_wear
+        base = self.random_blocks.index(lap, 0)
+        for car in cars:
+            if car.dnf or lap - car.last_pit_lap < 10:
+                continue
+
+            car.tyre_wear += 2 + 4 * wear_block[base + car.index]
+
+            # Parada si desgaste > 80%
+            if car.tyre_wear > 80 and self.rng.random() < 0.3:
+                self.wear_pit_stop(car, lap)
+
+    def wear_pit_stop(self, car, lap):
+        """Parada en boxes por desgaste con neumático de seco aleatorio"""
+        pit_time = self.pit_time(car)
+        car.pit_stops += 1
+        car.last_pit_lap = lap
+        car.tyre_wear = 0
+        new_tyre = self.rng.choice(['soft', 'medium', 'hard'])
+        car.current_tyre = new_tyre
+        car.total_time += pit_time
+        self.emit(lap, 'race_pit_stop',
+                  f'BOXES {car.driver_name} - Parada en boxes - {pit_time:.1f}s - Cambio a {new_tyre.upper()}', car)
+
+    def update_car_performance(self, cars, lap):
+        """Tiempo de vuelta: base + habilidad + desgaste + variación (+ safety car)"""
+        noise_block = self.random_blocks.lap_time
+        base = self.random_blocks.index(lap, 0)
+        for car in cars:
+            if car.dnf:
+                continue
+
+            skill_effect = (100 - car.driver_skill) * 0.04
+            wear_penalty = car.tyre_wear * 0.08
+            lap_time = 80.0 + skill_effect + wear_penalty + (0.4 * noise_block[base + car.index] - 0.2)
+            if self.safety_car_laps:
+                lap_time += SAFETY_CAR_LAP_DELTA
+            car.lap_times.append(lap_time)
+            car.total_time += lap_time
+
+    def resolve_running_order(self, lap):
+        """Reordena por tiempo acumulado y resuelve las peleas dentro de la ventana DRS.
+
+        Las paradas e incidentes mueven a los coches en el orden sólo por tiempo;
+        un adelantamiento en pista sólo se intenta entre coches consecutivos a
+        menos de DRS_WINDOW. Con safety car no se adelanta y las diferencias se
+        comprimen.
+        """
+        order = [car for car in self.order if not car.dnf]
+        settle_order(order)
+
+        if self.safety_car_laps:
+            for i in range(1, len(order)):
+                order[i].total_time = min(order[i].total_time,
+                                          order[i - 1].total_time + SAFETY_CAR_GAP)
+            self.safety_car_laps -= 1
+            if not self.safety_car_laps:
+                self.emit(lap, 'race_safety_car', 'SAFETY CAR SE RETIRA - RELANZAMIENTO!')
+        else:
+            for i in range(1, len(order)):
+                car_ahead = order[i - 1]
+                car_behind = order[i]
+                gap = car_behind.total_time - car_ahead.total_time
+                if gap >= DRS_WINDOW:
+                    continue
+
+                if self.rng.random() < self.overtake_chance(car_ahead, car_behind, gap):
+                    car_ahead.total_time = car_behind.total_time + OVERTAKE_TIME_LOSS
+                    order[i - 1], order[i] = car_behind, car_ahead
+                    # El que pierde la posición puede caer por detrás de alguno más
+                    j = i
+                    while j + 1 < len(order) and order[j].total_time > order[j + 1].total_time:
+                        order[j], order[j + 1] = order[j + 1], order[j]
+                        j += 1
+                    self.emit(lap, 'race_overtake',
+                              f'ADELANTAMIENTO {car_behind.driver_name} ADELANTA A {car_ahead.driver_name}',
+                              car_behind)
+
+        for position, car in enumerate(order, start=1):
+            car.current_position = position
+        self.order = order
+
+    @staticmethod
+    def overtake_chance(car_ahead, car_behind, gap):
+        """Probabilidad de adelantar según habilidad, desgaste y cercanía (DRS)"""
+        skill_diff = (car_behind.driver_skill - car_ahead.driver_skill) / 100
+        tyre_advantage = (car_ahead.tyre_wear - car_behind.tyre_wear) / 100
+        drs_effect = DRS_BONUS * (1 - gap / DRS_WINDOW)
+        return 0.05 + skill_diff * 0.1 + tyre_advantage * 0.15 + drs_effect
+
+    def simulate_lap_event(self, cars, lap):
+        """Evento de pista programado para esta vuelta (como mucho uno, para evitar spam)"""
+        car = self.rng.choice(cars)
+
+        event_types = [
+            ('race_fast_lap', f'VUELTA RAPIDA {car.driver_name} MARCA VUELTA RAPIDA'),
+            ('race_spin', f'TROMPO {car.driver_name} DA UN TROMPO PERO CONTINUA'),
+            ('race_off_track', f'FUERA PISTA {car.driver_name} SE SALE DE LA PISTA')
+        ]
+        event_type, description = self.rng.choice(event_types)
+        self.emit(lap, event_type, description, car)
+
+        if event_type in ('race_spin', 'race_off_track'):
+            car.incidents += 1
+            car.total_time += self.rng.uniform(2, 5)
+            # A partir del tercer incidente sube el riesgo de avería
+            if car.incidents > 2:
+                self.build_hazard_curve(car)
+                self.schedule_failure(car, lap)
@@ -0,0 +1,88 @@
+# sim/reliability.py
+"""Riesgo de fallo mecánico. Antes vivía en race_engine_bridge.py."""
+import math
+
+
+def static_failure_risk(components):
+    """Parte del riesgo por vuelta que sólo depende de los componentes del coche"""
+    # Fiabilidad promedio - asumir que los componentes son buenos por defecto
+    if not components:
+        reliability = 80
+    else:
+        reliability = sum(comp.reliability for comp in components) / len(components)
+
+    # RIESGO BASE MUY BAJO (0-0.02%)
+    risk = (100 - reliability) / 10000
+
+    # COMPONENTES SOLO si son EXTREMADAMENTE malos (fiabilidad < 10)
+    for component in components:
+        if component.reliability < 10:
+            risk += (10 - component.reliability) * 0.0001
+    return risk
+
+
+def lap_failure_risk(static_risk, current_lap, total_laps, incidents):
+    """Riesgo de falla en una vuelta a partir de la parte estática del coche"""
+    risk = static_risk
+
+    # SOLO aumentar riesgo en ÚLTIMAS 3 VUELTAS y muy poco (máximo 0.5% extra)
+    if current_lap > total_laps - 3:
+        risk += ((current_lap - (total_laps - 3)) / 3) * 0.005
+
+    # AUMENTO MUY PEQUEÑO por incidentes (solo después de 2 incidentes)
+    risk += max(0, (incidents - 2)) * 0.0005
+
+    # MÁXIMO ABSOLUTO 1% por vuelta
+    risk = min(0.01, risk)
+
+    # REDUCIR AÚN MÁS en primeras vueltas
+    if current_lap < 10:
+        risk *= 0.5
+    return risk
+
+
+def mechanical_failure_risk(components, current_lap, total_laps, incidents):
+    """Calcula el riesgo de falla mecánica por vuelta - PROBABILIDADES MUY OPTIMISTAS"""
+    return lap_failure_risk(static_failure_risk(components), current_lap, total_laps, incidents)
+
+
+def sample_failure_lap(rng, hazards, first_lap):
+    """Muestrea la vuelta de falla por CDF inversa sobre una curva de riesgo.
+
+    `hazards` da, a partir de `first_lap`, la probabilidad de falla en cada
+    vuelta si se llega viva a ella. Se sortea un único umbral exponencial y se
+    acumula -log(1 - h) vuelta a vuelta: la distribución es la misma que tirar
+    un dado en cada vuelta. Devuelve None si el coche sobrevive a la curva.
+    """
+    budget = -math.log(1.0 - rng.random())
+    for lap, hazard in enumerate(hazards, start=first_lap):
+        budget += math.log1p(-hazard)
+        if budget <= 0:
+            return lap
+    return None
+
+
+def failed_component(components, rng):
+    """Determina qué componente falla - MUY conservador"""
+    if not components:
+        return "motor"
+
+    # 80% de probabilidad de falla genérica
+    if rng.random() < 0.8:
+        return "sistema"
+
+    worst_type = None
+    worst_risk = 0
+    for component in components:
+        # SOLO componentes con fiabilidad < 20 tienen riesgo real
+        if component.reliability < 20:
+            risk = (100 - component.reliability) * (0.3 + 0.7 * rng.random())
+        else:
+            risk = (100 - component.reliability) * 0.005 * rng.random()
+        if worst_type is None or risk > worst_risk:
+            worst_type, worst_risk = component.component_type, risk
+
+    # Si no hay componentes malos, falla genérica
+    if worst_risk <= 5:
+        return "sistema"
+    return worst_type
@@ -0,0 +1,90 @@
+# sim/state.py
+"""Estado mutable de cada coche durante la simulación."""
+from .data import CarResult
+from .reliability import static_failure_risk
+
+
+class CarState:
+    """Estado compacto de un coche en el bucle de vueltas.
+
+    Usa __slots__ y sólo campos primitivos (la estrategia ya viene resuelta en
+    dos tuplas paralelas), así que ocupa poco, se accede por atributo y se puede
+    enviar con pickle a otro proceso.
+    """
+    __slots__ = (
+        'driver_id', 'driver_name', 'team_id', 'team_name',
+        'driver_skill', 'driver_consistency', 'luck_factor', 'components',
+        'index', 'grid_position', 'current_position', 'current_tyre', 'tyre_wear', 'last_pit_lap',
+        'pit_stops', 'incidents', 'mechanical_failures', 'total_time', 'lap_times',
+        'dnf', 'dnf_reason', 'finished', 'static_risk', 'hazard_curve', 'failure_lap',
+        'has_strategy', 'segment_tyres', 'segment_laps', 'current_segment', 'segment_laps_completed',
+        'rain_strategy', 'heavy_rain_strategy', 'dry_strategy',
+    )
+
+    def __init__(self, car, grid_position, starting_tyre):
+        strategy = car.strategy
+        has_strategy = bool(strategy and strategy.segments)
+
+        self.driver_id = car.driver_id
+        self.driver_name = car.driver_name
+        self.team_id = car.team_id
+        self.team_name = car.team_name
+        self.driver_skill = car.driver_skill
+        self.driver_consistency = car.driver_consistency
+        # Pilotos hábiles y constantes tienen menos riesgo de avería (0.3 a 0.8)
+        self.luck_factor = 1.3 - (car.driver_skill + car.driver_consistency) / 200
+        self.components = tuple(car.components)
+
+        # Posición fija en la parrilla (desde 0) para indexar los bloques aleatorios
+        self.index = grid_position - 1
+        self.grid_position = grid_position
+        self.current_position = grid_position
+        self.current_tyre = strategy.starting_tyre if has_strategy else starting_tyre
+        self.tyre_wear = 0.0
+        self.last_pit_lap = 0
+        self.pit_stops = 0
+        self.incidents = 0
+        self.mechanical_failures = 0
+        self.total_time = 0.0
+        self.lap_times = []
+        self.dnf = False
+        self.dnf_reason = None
+        self.finished = False
+
+        # Riesgo de avería: la curva por vuelta y la vuelta de falla las rellena la simulación
+        self.static_risk = static_failure_risk(self.components)
+        self.hazard_curve = ()
+        self.failure_lap = None
+
+        # Segmentos de estrategia ya resueltos: neumático y vueltas planificadas
+        segments = strategy.segments if has_strategy else ()
+        self.has_strategy = has_strategy
+        self.segment_tyres = tuple(segment.tyre_type for segment in segments)
+        self.segment_laps = tuple(segment.laps_planned for segment in segments)
+        self.current_segment = 0
+        self.segment_laps_completed = 0
+
+        self.rain_strategy = strategy.rain_strategy if strategy else 'continue'
+        self.heavy_rain_strategy = strategy.heavy_rain_strategy if strategy else 'continue'
+        self.dry_strategy = strategy.dry_strategy if strategy else 'continue'
+
+    def to_result(self, final_position, points, fastest_lap, division=1):
+        return CarResult(
+            driver_id=self.driver_id,
+            driver_name=self.driver_name,
+            team_id=self.team_id,
+            team_name=self.team_name,
+            grid_position=self.grid_position,
+            final_position=final_position,
+            finished=self.finished,
+            dnf=self.dnf,
+            dnf_reason=self.dnf_reason,
+            total_time=self.total_time,
+            pit_stops=self.pit_stops,
+            points=points,
+            fastest_lap=fastest_lap,
+            incidents=self.incidents,
+            mechanical_failures=self.mechanical_failures,
+            division=division,
+            lap_times=self.lap_times,
+        )
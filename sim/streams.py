@@ -0,0 +1,32 @@
+# sim/streams.py
+"""Números aleatorios de una carrera generados por bloques antes de empezar.
+
+Cada uso (variación del tiempo de vuelta, desgaste, tiempo de parada) tiene su
+propio generador sembrado y un bloque con un valor por (vuelta, coche). El
+bucle de vueltas sólo indexa: no llama al generador y el valor que recibe un
+coche en una vuelta no depende de cuántos eventos se hayan sorteado antes.
+"""
+import random
+from array import array
+
+
+def uniform_block(rng, count):
+    """Array de `count` uniformes en [0, 1) generado de una vez"""
+    draw = rng.random
+    return array('d', [draw() for _ in range(count)])
+
+
+class RaceRandomBlocks:
+    """Bloques de uniformes [0, 1) indexados por (vuelta o parada, coche)"""
+
+    def __init__(self, seed, total_laps, car_count):
+        self.car_count = car_count
+        self.pit_slots = total_laps // 5 + 2
+        size = (total_laps + 1) * car_count
+        self.lap_time = uniform_block(random.Random(f'{seed}:lap_time'), size)
+        self.tyre_wear = uniform_block(random.Random(f'{seed}:tyre_wear'), size)
+        # Indexado por número de parada; más paradas que pit_slots van al generador principal
+        self.pit_time = uniform_block(random.Random(f'{seed}:pit_time'), self.pit_slots * car_count)
+
+    def index(self, slot, car_index):
+        return slot * self.car_count + car_index
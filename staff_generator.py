@@ -1,8 +1,10 @@
 # staff_generator.py
 import random
 from datetime import date, datetime
-from app import db, Driver, Mechanic, Engineer
-from app import calculate_driver_salary, calculate_mechanic_salary, calculate_engineer_salary
+from config import Config
+from models import db, Driver, Mechanic, Engineer
+from models import calculate_driver_salary, calculate_mechanic_salary, calculate_engineer_salary
+from models import calculate_driver_value_score, calculate_mechanic_value_score, calculate_engineer_value_score
 
 def generate_random_name():
     """Genera nombres aleatorios para pilotos, mecánicos e ingenieros"""
@@ -40,142 +42,145 @@ def generate_random_name():
     
     return f"{first_name} {random.choice(last_names)}"
 
-def generate_driver():
-    """Genera un nuevo piloto con atributos aleatorios"""
+def _random_birth_dates(count, min_age, max_age):
+    """Genera en bloque fechas de nacimiento y edades para `count` personas"""
     today = date.today()
-    min_birth_year = today.year - 35
-    max_birth_year = today.year - 18
-    birth_year = random.randint(min_birth_year, max_birth_year)
-    birth_month = random.randint(1, 12)
-    birth_day = random.randint(1, 28)
-    
-    date_of_birth = date(birth_year, birth_month, birth_day)
-    age = today.year - birth_year
-    
-    skill = random.randint(40, 95)
-    experience = random.randint(30, 90)
-    aggression = random.randint(40, 85)
-    consistency = random.randint(45, 95)
-    growth_potential = random.randint(50, 90)
+    birth_years = [random.randint(today.year - max_age, today.year - min_age) for _ in range(count)]
+    birth_months = [random.randint(1, 12) for _ in range(count)]
+    birth_days = [random.randint(1, 28) for _ in range(count)]
     
-    salary = calculate_driver_salary(age, skill, experience, aggression, consistency, growth_potential)
-    
-    driver = Driver(
-        name=generate_random_name(),
-        date_of_birth=date_of_birth,
-        age=age,
-        salary=salary,
-        skill=skill,
-        experience=experience,
-        aggression=aggression,
-        consistency=consistency,
-        growth_potential=growth_potential,
-        market_available=True,
-        team_id=None
-    )
-    
-    return driver
+    dates_of_birth = [date(y, m, d) for y, m, d in zip(birth_years, birth_months, birth_days)]
+    ages = [today.year - y for y in birth_years]
+    return dates_of_birth, ages
+
+def _random_column(count, low, high):
+    """Genera una columna de `count` enteros aleatorios entre low y high"""
+    return [random.randint(low, high) for _ in range(count)]
+
+def generate_driver_rows(count):
+    """Genera `count` pilotos como diccionarios listos para bulk_insert_mappings"""
+    dates_of_birth, ages = _random_birth_dates(count, 18, 35)
+    
+    skill = _random_column(count, 40, 95)
+    experience = _random_column(count, 30, 90)
+    aggression = _random_column(count, 40, 85)
+    consistency = _random_column(count, 45, 95)
+    growth_potential = _random_column(count, 50, 90)
+    
+    # Salarios calculados columna a columna para todo el lote
+    salaries = list(map(calculate_driver_salary, ages, skill, experience, aggression, consistency, growth_potential))
+    value_scores = list(map(calculate_driver_value_score, skill, experience, consistency, salaries))
+    names = [generate_random_name() for _ in range(count)]
+    
+    return [
+        {
+            'name': names[i],
+            'date_of_birth': dates_of_birth[i],
+            'age': ages[i],
+            'salary': salaries[i],
+            'skill': skill[i],
+            'experience': experience[i],
+            'aggression': aggression[i],
+            'consistency': consistency[i],
+            'growth_potential': growth_potential[i],
+            'value_score': value_scores[i],
+            'market_available': True,
+            'team_id': None
+        }
+        for i in range(count)
+    ]
+
+def generate_mechanic_rows(count):
+    """Genera `count` mecánicos como diccionarios listos para bulk_insert_mappings"""
+    dates_of_birth, ages = _random_birth_dates(count, 25, Config.MECHANIC_RETIREMENT_AGE - 1)
+    
+    pit_stop_skill = _random_column(count, 50, 95)
+    reliability_skill = _random_column(count, 50, 90)
+    growth_potential = _random_column(count, 50, 85)
+    
+    salaries = list(map(calculate_mechanic_salary, ages, pit_stop_skill, reliability_skill, growth_potential))
+    value_scores = list(map(calculate_mechanic_value_score, pit_stop_skill, reliability_skill, salaries))
+    names = [generate_random_name() for _ in range(count)]
+    
+    return [
+        {
+            'name': names[i],
+            'date_of_birth': dates_of_birth[i],
+            'age': ages[i],
+            'salary': salaries[i],
+            'pit_stop_skill': pit_stop_skill[i],
+            'reliability_skill': reliability_skill[i],
+            'growth_potential': growth_potential[i],
+            'value_score': value_scores[i],
+            'market_available': True,
+            'team_id': None
+        }
+        for i in range(count)
+    ]
+
+def generate_engineer_rows(count):
+    """Genera `count` ingenieros como diccionarios listos para bulk_insert_mappings"""
+    dates_of_birth, ages = _random_birth_dates(count, 28, Config.ENGINEER_RETIREMENT_AGE - 1)
+    
+    innovation = _random_column(count, 50, 95)
+    development_speed = _random_column(count, 50, 90)
+    growth_potential = _random_column(count, 50, 85)
+    
+    salaries = list(map(calculate_engineer_salary, ages, innovation, development_speed, growth_potential))
+    value_scores = list(map(calculate_engineer_value_score, innovation, development_speed, salaries))
+    names = [generate_random_name() for _ in range(count)]
+    
+    return [
+        {
+            'name': names[i],
+            'date_of_birth': dates_of_birth[i],
+            'age': ages[i],
+            'salary': salaries[i],
+            'innovation': innovation[i],
+            'development_speed': development_speed[i],
+            'growth_potential': growth_potential[i],
+            'value_score': value_scores[i],
+            'market_available': True,
+            'team_id': None
+        }
+        for i in range(count)
+    ]
+
+def generate_driver():
+    """Genera un nuevo piloto con atributos aleatorios"""
+    return Driver(**generate_driver_rows(1)[0])
 
 def generate_mechanic():
     """Genera un nuevo mecánico con atributos aleatorios"""
-    today = date.today()
-    min_birth_year = today.year - 65
-    max_birth_year = today.year - 25
-    birth_year = random.randint(min_birth_year, max_birth_year)
-    birth_month = random.randint(1, 12)
-    birth_day = random.randint(1, 28)
-    
-    date_of_birth = date(birth_year, birth_month, birth_day)
-    age = today.year - birth_year
-    
-    pit_stop_skill = random.randint(50, 95)
-    reliability_skill = random.randint(50, 90)
-    growth_potential = random.randint(50, 85)
-    
-    salary = calculate_mechanic_salary(age, pit_stop_skill, reliability_skill, growth_potential)
-    
-    mechanic = Mechanic(
-        name=generate_random_name(),
-        date_of_birth=date_of_birth,
-        age=age,
-        salary=salary,
-        pit_stop_skill=pit_stop_skill,
-        reliability_skill=reliability_skill,
-        growth_potential=growth_potential,
-        market_available=True,
-        team_id=None
-    )
-    
-    return mechanic
+    return Mechanic(**generate_mechanic_rows(1)[0])
 
 def generate_engineer():
     """Genera un nuevo ingeniero con atributos aleatorios"""
-    today = date.today()
-    min_birth_year = today.year - 70
-    max_birth_year = today.year - 28
-    birth_year = random.randint(min_birth_year, max_birth_year)
-    birth_month = random.randint(1, 12)
-    birth_day = random.randint(1, 28)
-    
-    date_of_birth = date(birth_year, birth_month, birth_day)
-    age = today.year - birth_year
-    
-    innovation = random.randint(50, 95)
-    development_speed = random.randint(50, 90)
-    growth_potential = random.randint(50, 85)
-    
-    salary = calculate_engineer_salary(age, innovation, development_speed, growth_potential)
-    
-    engineer = Engineer(
-        name=generate_random_name(),
-        date_of_birth=date_of_birth,
-        age=age,
-        salary=salary,
-        innovation=innovation,
-        development_speed=development_speed,
-        growth_potential=growth_potential,
-        market_available=True,
-        team_id=None
-    )
-    
-    return engineer
+    return Engineer(**generate_engineer_rows(1)[0])
 
-def generate_staff_batch(drivers_count=4, mechanics_count=8, engineers_count=8):
+def generate_staff_batch(drivers_count=4, mechanics_count=8, engineers_count=8, commit=True):
     """
-    Genera un lote de nuevo personal
+    Genera un lote de nuevo personal con inserciones masivas (executemany)
     
     Args:
         drivers_count: Número de pilotos a generar
         mechanics_count: Número de mecánicos a generar  
         engineers_count: Número de ingenieros a generar
+        commit: Si es False, las inserciones quedan en la transacción del llamador
     """
     staff_created = {
-        'drivers': [],
-        'mechanics': [],
-        'engineers': []
+        'drivers': generate_driver_rows(drivers_count),
+        'mechanics': generate_mechanic_rows(mechanics_count),
+        'engineers': generate_engineer_rows(engineers_count)
     }
     
-    # Generar pilotos
-    for _ in range(drivers_count):
-        driver = generate_driver()
-        db.session.add(driver)
-        staff_created['drivers'].append(driver)
-    
-    # Generar mecánicos
-    for _ in range(mechanics_count):
-        mechanic = generate_mechanic()
-        db.session.add(mechanic)
-        staff_created['mechanics'].append(mechanic)
-    
-    # Generar ingenieros
-    for _ in range(engineers_count):
-        engineer = generate_engineer()
-        db.session.add(engineer)
-        staff_created['engineers'].append(engineer)
-    
-    # Guardar en la base de datos
     try:
-        db.session.commit()
+        db.session.bulk_insert_mappings(Driver, staff_created['drivers'])
+        db.session.bulk_insert_mappings(Mechanic, staff_created['mechanics'])
+        db.session.bulk_insert_mappings(Engineer, staff_created['engineers'])
+        
+        if commit:
+            db.session.commit()
         print(f"Personal generado: {drivers_count} pilotos, {mechanics_count} mecánicos, {engineers_count} ingenieros")
         return staff_created
     except Exception as e:
@@ -187,143 +192,167 @@ def generate_initial_staff():
     """Genera el personal inicial para la base de datos"""
     print("Generando personal inicial...")
     
-    # Generar 20 pilotos iniciales
-    for _ in range(20):
-        driver = generate_driver()
-        db.session.add(driver)
-    
-    # Generar 30 mecánicos iniciales
-    for _ in range(30):
-        mechanic = generate_mechanic()
-        db.session.add(mechanic)
+    # 20 pilotos, 30 mecánicos y 30 ingenieros iniciales
+    staff_created = generate_staff_batch(drivers_count=20, mechanics_count=30, engineers_count=30)
     
-    # Generar 30 ingenieros iniciales
-    for _ in range(30):
-        engineer = generate_engineer()
-        db.session.add(engineer)
+    if staff_created is None:
+        print("Error al generar personal inicial")
+        return False
     
+    print("Personal inicial generado correctamente")
+    return True
+
+def retirement_cutoff(retirement_age, today=None):
+    """Fecha de nacimiento a partir de la cual (inclusive) se alcanza la edad de jubilación"""
+    today = today or date.today()
     try:
-        db.session.commit()
-        print("Personal inicial generado correctamente")
-        return True
-    except Exception as e:
-        db.session.rollback()
-        print(f"Error al generar personal inicial: {e}")
-        return False
-        
-# Añadir al final de staff_generator.py
+        return today.replace(year=today.year - retirement_age)
+    except ValueError:
+        # 29 de febrero en un año no bisiesto
+        return today.replace(year=today.year - retirement_age, day=28)
 
 def handle_retirements():
-    """Maneja las jubilaciones automáticas del personal"""
-    # Jubilar pilotos mayores de 40 años
-    retired_drivers = Driver.query.filter(Driver.team_id.isnot(None)).all()
-    retired_drivers = [driver for driver in retired_drivers if driver.is_retired]
+    """Maneja las jubilaciones automáticas del personal
     
-    for driver in retired_drivers:
-        driver.team_id = None
-        driver.market_available = False  # No disponible en el mercado
-    
-    # Jubilar mecánicos mayores de 65 años
-    retired_mechanics = Mechanic.query.filter(Mechanic.team_id.isnot(None)).all()
-    retired_mechanics = [mechanic for mechanic in retired_mechanics if mechanic.is_retired]
-    
-    for mechanic in retired_mechanics:
-        mechanic.team_id = None
-        mechanic.market_available = False
-    
-    # Jubilar ingenieros mayores de 70 años
-    retired_engineers = Engineer.query.filter(Engineer.team_id.isnot(None)).all()
-    retired_engineers = [engineer for engineer in retired_engineers if engineer.is_retired]
-    
-    for engineer in retired_engineers:
-        engineer.team_id = None
-        engineer.market_available = False
-    
-    db.session.commit()
+    Cada tipo de personal se jubila con un único UPDATE filtrado por fecha de
+    nacimiento, y los reemplazos se insertan en la misma transacción.
+    """
+    retired_counts = {}
+    for model, retirement_age in (
+        (Driver, Config.DRIVER_RETIREMENT_AGE),
+        (Mechanic, Config.MECHANIC_RETIREMENT_AGE),
+        (Engineer, Config.ENGINEER_RETIREMENT_AGE)
+    ):
+        retired_counts[model] = model.query.filter(
+            model.team_id.isnot(None),
+            model.date_of_birth <= retirement_cutoff(retirement_age)
+        ).update(
+            {model.team_id: None, model.market_available: False},  # No disponible en el mercado
+            synchronize_session=False
+        )
+    
+    total_retired = sum(retired_counts.values())
     
     # Generar reemplazos por los jubilados
-    if retired_drivers:
-        replacements_needed = len(retired_drivers) + len(retired_mechanics) + len(retired_engineers)
-        if replacements_needed > 0:
-            generate_staff_batch(
-                drivers_count=len(retired_drivers),
-                mechanics_count=len(retired_mechanics),
-                engineers_count=len(retired_engineers)
-            )
+    if total_retired > 0:
+        replacements = generate_staff_batch(
+            drivers_count=retired_counts[Driver],
+            mechanics_count=retired_counts[Mechanic],
+            engineers_count=retired_counts[Engineer],
+            commit=False
+        )
+        if replacements is None:
+            # generate_staff_batch ya ha hecho rollback de toda la transacción
+            return 0
     
-    return len(retired_drivers) + len(retired_mechanics) + len(retired_engineers)
+    db.session.commit()
+    return total_retired
     
-# Añadir al final de staff_generator.py
-
 def calculate_severance_payment(salary, years_with_team):
     """Calcula la indemnización por despido"""
     base_payment = salary * 2  # 2 carreras de salario base
     seniority_bonus = salary * years_with_team * 0.5  # 0.5 salarios por año
     return base_payment + seniority_bonus
 
-def update_staff_aging():
-    """Actualiza la edad y habilidades del personal cada temporada"""
-    today = date.today()
+def _at_least(expr, floor):
+    """Equivalente SQL portable de max(floor, expr)"""
+    return db.case((expr < floor, floor), else_=expr)
+
+def _at_most(expr, ceiling):
+    """Equivalente SQL portable de min(ceiling, expr)"""
+    return db.case((expr > ceiling, ceiling), else_=expr)
+
+def _seeded_gain(model, seed, low, high, salt=0):
+    """Entero pseudoaleatorio en [low, high] calculado en SQL a partir de (id, semilla)
     
-    # Actualizar pilotos
-    drivers = Driver.query.filter(Driver.team_id.isnot(None)).all()
-    for driver in drivers:
-        driver.age = today.year - driver.date_of_birth.year
-        
-        # Calcular años de experiencia profesional (asumiendo debut a 18 años)
-        career_years = max(0, driver.age - 18)
-        
-        # Aplicar efectos del envejecimiento
-        if career_years > 8:  # Después de 8 años de carrera
-            decline_factor = (career_years - 8) * 0.5  # 0.5% de declive por año
-            
-            # Habilidades que disminuyen con la edad
-            driver.skill = max(40, driver.skill - decline_factor)
-            driver.aggression = max(30, driver.aggression - decline_factor)
-            driver.growth_potential = max(20, driver.growth_potential - decline_factor * 2)
-            
-            # La experiencia sigue aumentando pero más lentamente
-            experience_gain = random.randint(1, 3)
-            driver.experience = min(95, driver.experience + experience_gain)
-        else:
-            # Fase de crecimiento (primeros 8 años)
-            skill_gain = random.randint(2, 5)
-            experience_gain = random.randint(3, 6)
-            
-            driver.skill = min(95, driver.skill + skill_gain)
-            driver.experience = min(95, driver.experience + experience_gain)
+    Sustituye a random.randint por persona: el resultado es determinista para
+    una semilla dada y se evalúa dentro del propio UPDATE.
+    """
+    span = high - low + 1
+    mixed = (model.id * 2654435761 + seed * 40503 + salt) % 2147483647
+    return low + mixed % span
+
+def update_staff_aging(seed=None):
+    """Actualiza la edad y habilidades del personal cada temporada
     
-    # Actualizar mecánicos
-    mechanics = Mechanic.query.filter(Mechanic.team_id.isnot(None)).all()
-    for mechanic in mechanics:
-        mechanic.age = today.year - mechanic.date_of_birth.year
-        career_years = max(0, mechanic.age - 25)  # Carrera desde los 25
-        
-        if career_years > 15:  # Después de 15 años de carrera
-            decline_factor = (career_years - 15) * 0.3
-            
-            mechanic.pit_stop_skill = max(40, mechanic.pit_stop_skill - decline_factor)
-            mechanic.growth_potential = max(10, mechanic.growth_potential - decline_factor * 2)
-        else:
-            skill_gain = random.randint(1, 3)
-            mechanic.pit_stop_skill = min(95, mechanic.pit_stop_skill + skill_gain)
-            mechanic.reliability_skill = min(95, mechanic.reliability_skill + skill_gain)
+    La progresión anual se aplica con un UPDATE por tipo de personal sobre el
+    personal contratado. Devuelve el número de filas actualizadas por tipo.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 31)
+    today = date.today()
     
-    # Actualizar ingenieros
-    engineers = Engineer.query.filter(Engineer.team_id.isnot(None)).all()
-    for engineer in engineers:
-        engineer.age = today.year - engineer.date_of_birth.year
-        career_years = max(0, engineer.age - 30)  # Carrera desde los 30
-        
-        if career_years > 20:  # Después de 20 años de carrera
-            decline_factor = (career_years - 20) * 0.4
-            
-            engineer.innovation = max(45, engineer.innovation - decline_factor)
-            engineer.development_speed = max(40, engineer.development_speed - decline_factor)
-            engineer.growth_potential = max(15, engineer.growth_potential - decline_factor * 2)
-        else:
-            skill_gain = random.randint(1, 4)
-            engineer.innovation = min(95, engineer.innovation + skill_gain)
-            engineer.development_speed = min(95, engineer.development_speed + skill_gain)
+    # Actualizar pilotos (carrera desde los 18; declive tras 8 años)
+    age = today.year - db.extract('year', Driver.date_of_birth)
+    declining = age > 18 + 8
+    decline_factor = (age - 26) * 0.5  # 0.5% de declive por año
+    drivers_updated = Driver.query.filter(Driver.team_id.isnot(None)).update({
+        Driver.age: age,
+        Driver.skill: db.case(
+            (declining, _at_least(Driver.skill - decline_factor, 40)),
+            else_=_at_most(Driver.skill + _seeded_gain(Driver, seed, 2, 5, salt=1), 95)
+        ),
+        Driver.aggression: db.case(
+            (declining, _at_least(Driver.aggression - decline_factor, 30)),
+            else_=Driver.aggression
+        ),
+        Driver.growth_potential: db.case(
+            (declining, _at_least(Driver.growth_potential - decline_factor * 2, 20)),
+            else_=Driver.growth_potential
+        ),
+        # La experiencia sigue aumentando, más lentamente en la fase de declive
+        Driver.experience: db.case(
+            (declining, _at_most(Driver.experience + _seeded_gain(Driver, seed, 1, 3, salt=2), 95)),
+            else_=_at_most(Driver.experience + _seeded_gain(Driver, seed, 3, 6, salt=3), 95)
+        )
+    }, synchronize_session=False)
+    
+    # Actualizar mecánicos (carrera desde los 25; declive tras 15 años)
+    age = today.year - db.extract('year', Mechanic.date_of_birth)
+    declining = age > 25 + 15
+    decline_factor = (age - 40) * 0.3
+    skill_gain = _seeded_gain(Mechanic, seed, 1, 3, salt=4)
+    mechanics_updated = Mechanic.query.filter(Mechanic.team_id.isnot(None)).update({
+        Mechanic.age: age,
+        Mechanic.pit_stop_skill: db.case(
+            (declining, _at_least(Mechanic.pit_stop_skill - decline_factor, 40)),
+            else_=_at_most(Mechanic.pit_stop_skill + skill_gain, 95)
+        ),
+        Mechanic.reliability_skill: db.case(
+            (declining, Mechanic.reliability_skill),
+            else_=_at_most(Mechanic.reliability_skill + skill_gain, 95)
+        ),
+        Mechanic.growth_potential: db.case(
+            (declining, _at_least(Mechanic.growth_potential - decline_factor * 2, 10)),
+            else_=Mechanic.growth_potential
+        )
+    }, synchronize_session=False)
+    
+    # Actualizar ingenieros (carrera desde los 30; declive tras 20 años)
+    age = today.year - db.extract('year', Engineer.date_of_birth)
+    declining = age > 30 + 20
+    decline_factor = (age - 50) * 0.4
+    skill_gain = _seeded_gain(Engineer, seed, 1, 4, salt=5)
+    engineers_updated = Engineer.query.filter(Engineer.team_id.isnot(None)).update({
+        Engineer.age: age,
+        Engineer.innovation: db.case(
+            (declining, _at_least(Engineer.innovation - decline_factor, 45)),
+            else_=_at_most(Engineer.innovation + skill_gain, 95)
+        ),
+        Engineer.development_speed: db.case(
+            (declining, _at_least(Engineer.development_speed - decline_factor, 40)),
+            else_=_at_most(Engineer.development_speed + skill_gain, 95)
+        ),
+        Engineer.growth_potential: db.case(
+            (declining, _at_least(Engineer.growth_potential - decline_factor * 2, 15)),
+            else_=Engineer.growth_potential
+        )
+    }, synchronize_session=False)
     
-    db.session.commit()
\ No newline at end of file
+    db.session.commit()
+    
+    return {
+        'drivers': drivers_updated,
+        'mechanics': mechanics_updated,
+        'engineers': engineers_updated
+    }
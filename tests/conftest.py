@@ -0,0 +1,22 @@
+"""Fixtures comunes: aplicaciones de solo base de datos sobre SQLite temporal"""
+import os
+import sys
+
+import pytest
+
+# Los módulos del proyecto están en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from models import create_db_app
+
+
+@pytest.fixture
+def make_db_app(tmp_path):
+    """Crea aplicaciones de solo base de datos, cada una con su fichero SQLite en tmp_path"""
+    def factory(filename='test.db'):
+        class TestConfig(Config):
+            SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / filename}'
+            TESTING = True
+        return create_db_app(TestConfig)
+    return factory
@@ -0,0 +1,7 @@
+"""Paridad del motor único de clasificación con las implementaciones anteriores"""
+from check_qualifying_parity import run_parity
+
+
+def test_engine_matches_legacy_statistical_profile():
+    # Semilla fija: las mismas parrillas y tiradas en cada ejecución, sin resultados intermitentes
+    assert run_parity(sessions=3000, grid=20, seed=1)
@@ -0,0 +1,80 @@
+"""El envejecimiento anual (update_staff_aging) es reproducible con una semilla"""
+import random
+import shutil
+
+from models import db, User, Driver, Mechanic, Engineer
+from staff_generator import (
+    generate_driver_rows, generate_mechanic_rows, generate_engineer_rows, update_staff_aging
+)
+
+STAFF_COLUMNS = {
+    Driver: ('age', 'skill', 'experience', 'aggression', 'growth_potential'),
+    Mechanic: ('age', 'pit_stop_skill', 'reliability_skill', 'growth_potential'),
+    Engineer: ('age', 'innovation', 'development_speed', 'growth_potential'),
+}
+STAFF_PER_TYPE = 40
+
+
+def build_league(app):
+    """Un equipo con todo el personal contratado y un agente libre de cada tipo"""
+    with app.app_context():
+        db.create_all()
+        random.seed(7)
+        team = User(username='equipo', email='equipo@test', password_hash='x', team_name='Equipo')
+        db.session.add(team)
+        db.session.flush()
+        for model, generate in ((Driver, generate_driver_rows), (Mechanic, generate_mechanic_rows),
+                                (Engineer, generate_engineer_rows)):
+            rows = generate(STAFF_PER_TYPE + 1)
+            for row in rows[:STAFF_PER_TYPE]:
+                row['team_id'] = team.id
+                row['market_available'] = False
+            db.session.bulk_insert_mappings(model, rows)
+        db.session.commit()
+
+
+def staff_state(app):
+    with app.app_context():
+        return {
+            model.__name__: db.session.query(
+                model.id, model.team_id, *[getattr(model, column) for column in columns]
+            ).order_by(model.id).all()
+            for model, columns in STAFF_COLUMNS.items()
+        }
+
+
+def aged_copy(make_db_app, source_path, filename, seed):
+    """Envejece una copia exacta de la liga y devuelve (filas actualizadas, estado final)"""
+    shutil.copy(source_path, source_path.parent / filename)
+    app = make_db_app(filename)
+    with app.app_context():
+        updated = update_staff_aging(seed=seed)
+    return updated, staff_state(app)
+
+
+def test_same_seed_gives_same_progression(make_db_app, tmp_path):
+    build_league(make_db_app('liga.db'))
+
+    first_updated, first = aged_copy(make_db_app, tmp_path / 'liga.db', 'a.db', seed=42)
+    second_updated, second = aged_copy(make_db_app, tmp_path / 'liga.db', 'b.db', seed=42)
+
+    assert first_updated == second_updated == {
+        'drivers': STAFF_PER_TYPE, 'mechanics': STAFF_PER_TYPE, 'engineers': STAFF_PER_TYPE
+    }
+    assert first == second
+
+
+def test_progression_depends_on_seed_and_skips_free_agents(make_db_app, tmp_path):
+    app = make_db_app('liga.db')
+    build_league(app)
+    before = staff_state(app)
+
+    _, with_42 = aged_copy(make_db_app, tmp_path / 'liga.db', 'a.db', seed=42)
+    _, with_43 = aged_copy(make_db_app, tmp_path / 'liga.db', 'b.db', seed=43)
+
+    assert with_42 != with_43
+    for model_name, rows in with_42.items():
+        assert rows != before[model_name]
+        # El agente libre (sin equipo) no envejece
+        free_agents = [row for row in rows if row.team_id is None]
+        assert free_agents == [row for row in before[model_name] if row.team_id is None]
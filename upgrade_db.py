@@ -0,0 +1,231 @@
+# upgrade_db.py
+"""Actualiza una base de datos existente al esquema actual sin perder datos.
+
+init_db.py crea la base de datos desde cero; este script es el camino para
+una liga ya en marcha: crea las tablas nuevas, añade las columnas que falten
+con ALTER TABLE (rellenando las filas existentes) y crea los índices. Cada
+paso comprueba antes el esquema, así que se puede ejecutar las veces que
+haga falta. Funciona con SQLite y PostgreSQL. Conviene ejecutarlo con la
+aplicación parada.
+
+Uso:
+    python upgrade_db.py
+"""
+from models import (
+    create_db_app, db, ChampionshipStandings, Driver, Engineer, Mechanic, QualifyingSession, Race,
+    RaceResult, RaceSettlement, TeamStanding, Training, Upgrade, User
+)
+
+# Solo la base de datos: no hace falta cargar la aplicación web ni el scheduler
+app = create_db_app()
+
+
+def quote(name):
+    return db.engine.dialect.identifier_preparer.quote(name)
+
+def existing_columns(table_name):
+    return {column['name'] for column in db.inspect(db.engine).get_columns(table_name)}
+
+def add_column(column, default=None):
+    """ALTER TABLE ... ADD COLUMN para una columna del modelo que falte en la base de datos.
+
+    `default` es SQL literal: rellena las filas existentes y permite NOT NULL.
+    Devuelve True si la columna se ha añadido.
+    """
+    table_name = column.table.name
+    if column.name in existing_columns(table_name):
+        return False
+    ddl = f'ALTER TABLE {quote(table_name)} ADD COLUMN {quote(column.name)} {column.type.compile(db.engine.dialect)}'
+    if default is not None:
+        ddl += f' DEFAULT {default}'
+        if not column.nullable:
+            ddl += ' NOT NULL'
+    db.session.execute(db.text(ddl))
+    db.session.commit()
+    print(f"   + {table_name}.{column.name}")
+    return True
+
+def ensure_unique(table, name, *column_names):
+    """Clave única sobre columnas existentes, quitando antes los duplicados (se queda con el id más alto).
+
+    SQLite no admite ALTER TABLE ... ADD CONSTRAINT, así que se crea como índice
+    único, que también sirve de destino para ON CONFLICT.
+    """
+    inspector = db.inspect(db.engine)
+    wanted = set(column_names)
+    unique_sets = [set(constraint['column_names']) for constraint in inspector.get_unique_constraints(table.name)]
+    unique_sets += [set(index['column_names']) for index in inspector.get_indexes(table.name) if index['unique']]
+    if wanted in unique_sets:
+        return False
+
+    keep = db.select(db.func.max(table.c.id)).group_by(*[table.c[column] for column in column_names])
+    removed = db.session.execute(table.delete().where(table.c.id.not_in(keep))).rowcount
+    columns = ', '.join(quote(column) for column in column_names)
+    db.session.execute(db.text(f'CREATE UNIQUE INDEX {quote(name)} ON {quote(table.name)} ({columns})'))
+    db.session.commit()
+    print(f"   + {name} ({removed} duplicados eliminados)")
+    return True
+
+
+def create_new_tables():
+    """Tablas que no existían (create_all no toca las existentes)"""
+    db.create_all()
+
+def create_model_indexes():
+    """Índices declarados en los modelos que falten en la base de datos"""
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in db.inspect(db.engine).get_indexes(table.name)}
+        columns = existing_columns(table.name)
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            missing = [column.name for column in index.columns if column.name not in columns]
+            if missing:
+                print(f"   ⚠️ {index.name} pendiente: falta la columna {', '.join(missing)}")
+                continue
+            index.create(db.engine)
+            print(f"   + {index.name}")
+
+def add_division_columns():
+    """División de cada resultado; lo anterior a las divisiones es todo de la división 1"""
+    add_column(ChampionshipStandings.__table__.c.division, default=1)
+    add_column(RaceResult.__table__.c.division, default=1)
+
+def add_qualifying_session_key():
+    """Una elección por piloto y carrera: el upsert de neumáticos usa esta clave en ON CONFLICT"""
+    ensure_unique(QualifyingSession.__table__, 'uq_qualifying_session_race_team_driver',
+                  'race_id', 'team_id', 'driver_id')
+
+def add_result_versions():
+    """Resultados versionados: lo ya guardado pasa a ser la versión 1, publicada.
+
+    Las carreras con resultados apuntan a su versión más alta y las
+    liquidaciones existentes quedan marcadas como de la versión 1, que es la
+    que liquidaron.
+    """
+    standings, results = ChampionshipStandings.__table__, RaceResult.__table__
+    add_column(standings.c.version, default=1)
+    add_column(results.c.version, default=1)
+    ensure_unique(standings, 'uq_championship_standings_race_version_driver', 'race_id', 'version', 'driver_id')
+    ensure_unique(results, 'uq_race_result_race_version_driver', 'race_id', 'version', 'driver_id')
+
+    race = Race.__table__
+    add_column(race.c.results_version)
+    has_results = db.exists().where(standings.c.race_id == race.c.id)
+    published = db.session.execute(race.update().where(race.c.results_version.is_(None), has_results).values(
+        results_version=db.select(db.func.max(standings.c.version)).where(
+            standings.c.race_id == race.c.id
+        ).scalar_subquery()
+    )).rowcount
+    db.session.commit()
+    print(f"   {published} carreras con resultados publicados")
+
+    add_column(RaceSettlement.__table__.c.version, default=1)
+
+def add_team_due_columns():
+    """Marca de agua de vencimientos por equipo, calculada con lo que ya está en curso"""
+    add_column(User.__table__.c.settled_at)
+    add_column(User.__table__.c.next_due_at)
+
+    updated = 0
+    for user in User.query.filter(User.next_due_at.is_(None)).all():
+        pending = [due for due in (
+            db.session.query(db.func.min(Upgrade.end_date)).filter(
+                Upgrade.team_id == user.id, Upgrade.completed == False).scalar(),
+            db.session.query(db.func.min(Training.end_date)).filter(
+                Training.team_id == user.id, Training.completed == False).scalar()
+        ) if due is not None]
+        if pending:
+            user.next_due_at = min(pending)
+            updated += 1
+    db.session.commit()
+    print(f"   {updated} equipos con mejoras o entrenamientos pendientes")
+
+def add_value_scores():
+    """Relación calidad/precio del mercado: columna NOT NULL y valor calculado para todo el personal.
+
+    Es clave del cursor del mercado, así que no puede quedar a NULL. Se
+    recalcula siempre (es función de atributos y salario), lo que además
+    corrige valores desfasados.
+    """
+    updated = 0
+    for model in (Driver, Mechanic, Engineer):
+        add_column(model.__table__.c.value_score, default=0)
+        staff = model.query.all()
+        for member in staff:
+            member.refresh_value_score()
+        db.session.commit()
+        updated += len(staff)
+    print(f"   value_score calculado para {updated} miembros del personal")
+
+def backfill_team_standings():
+    """Suma a TeamStanding las carreras con resultados publicados que nunca se liquidaron.
+
+    Son carreras anteriores a la liquidación post-carrera: sus puntos, victorias
+    y podios cuentan para la clasificación, pero los premios no se pagan con
+    carácter retroactivo. Cada una queda con un RaceSettlement sin premios
+    para que ni este paso ni el barrido de liquidaciones la vuelvan a contar.
+    """
+    published = db.and_(
+        ChampionshipStandings.race_id == Race.id,
+        ChampionshipStandings.version == Race.results_version
+    )
+    unsettled = ~db.exists().where(RaceSettlement.race_id == Race.id)
+    finished = db.and_(ChampionshipStandings.dnf == False, ChampionshipStandings.position.isnot(None))
+
+    races = db.session.query(Race.id, Race.results_version).filter(
+        Race.results_version.isnot(None), unsettled
+    ).all()
+    if not races:
+        print("   Sin carreras pendientes")
+        return
+
+    totals = db.session.query(
+        ChampionshipStandings.team_id,
+        db.func.coalesce(db.func.sum(ChampionshipStandings.points), 0),
+        db.func.count(),
+        db.func.sum(db.case((db.and_(finished, ChampionshipStandings.position == 1), 1), else_=0)),
+        db.func.sum(db.case((db.and_(finished, ChampionshipStandings.position <= 3), 1), else_=0))
+    ).join(Race, published).filter(unsettled).group_by(ChampionshipStandings.team_id).all()
+
+    standings = {standing.team_id: standing for standing in TeamStanding.query.all()}
+    for team_id, points, entries, wins, podiums in totals:
+        standing = standings.get(team_id)
+        if not standing:
+            standing = TeamStanding(team_id=team_id, points=0, races_entered=0,
+                                    wins=0, podiums=0, prize_money=0.0)
+            db.session.add(standing)
+        standing.points += points
+        standing.races_entered += entries
+        standing.wins += wins
+        standing.podiums += podiums
+
+    db.session.add_all([
+        RaceSettlement(race_id=race_id, version=version, teams_paid=0, total_prize=0.0)
+        for race_id, version in races
+    ])
+    db.session.commit()
+    print(f"   {len(races)} carreras sumadas a la clasificación de {len(totals)} equipos")
+
+
+# En orden: primero tablas y columnas, después índices (algunos usan columnas nuevas) y datos
+UPGRADE_STEPS = [
+    ('Tablas nuevas', create_new_tables),
+    ('Vencimientos por equipo', add_team_due_columns),
+    ('Divisiones de carrera', add_division_columns),
+    ('Clave única de clasificación', add_qualifying_session_key),
+    ('Versiones de resultados', add_result_versions),
+    ('Valor de mercado del personal', add_value_scores),
+    ('Índices', create_model_indexes),
+    ('Clasificación acumulada', backfill_team_standings),
+]
+
+def upgrade_database():
+    with app.app_context():
+        for description, step in UPGRADE_STEPS:
+            print(f"🔧 {description}...")
+            step()
+        print("✅ Base de datos actualizada al esquema actual")
+
+if __name__ == '__main__':
+    upgrade_database()